@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Benchmark of the text and compact index formats on a synthetic index page.
+
+The page is written with :func:`~escale.relay.index.write_index` and read with
+:func:`~escale.relay.index.read_index`, as :class:`~escale.relay.index.IndexRelay`
+does, for each format and compression codec. Uncompressed and with bz2, the text
+format is also written and read with a copy of the former implementation
+(``baseline``), prior to the compact format and the single-pass grouping.
+File sizes and best-of-`repeat` times are reported.
+
+On 200k entries, the compact format is read about 2.5 times as fast as the text
+format uncompressed, and about 25% faster with bz2, the decompression taking
+most of the time. Writing is not faster, however: the single-pass grouping makes
+the text format about 5% faster to write than the baseline, the compact format is
+written as fast as the text format uncompressed, and about 30% slower with bz2.
+Uncompressed compact files are also about 2% larger than text files, as each
+record carries a 4-byte group index besides its path and metadata; with bz2, they
+are about 2% smaller. With gzip, the compact format is about 25% faster to write
+and twice as fast to read as the text format.
+
+Example::
+
+    python benchmarks/bench_indexformat.py --entries 200000 --codecs none gzip bz2
+
+"""
+
+
+from __future__ import print_function
+import os
+import sys
+import bz2
+import time
+import random
+import shutil
+import tempfile
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from escale.base.essential import asstr, asbytes
+from escale.relay.info import Metadata
+from escale.relay.index import write_index, read_index, group_begin_breaker, \
+    group_end_breaker, puller_breaker
+
+
+groupby = ['placeholder', 'pusher']
+
+
+def baseline_write_index(filename, metadata, pullers=[], compress=False, groupby=[]):
+    """
+    Former :func:`~escale.relay.index.write_index`, text format only.
+    """
+    if compress:
+        _open = bz2.BZ2File
+    else:
+        _open = open
+    if groupby:
+        _metadata = defaultdict(dict)
+        for resource in metadata:
+            mdata = metadata[resource]
+            if isinstance(mdata, Metadata):
+                mdata = repr(mdata)
+            if not isinstance(mdata, (tuple, list)):
+                mdata = mdata.splitlines()
+            # sort out grouping keys
+            _mdata = []
+            group = {}
+            for line in mdata:
+                _groupby = None
+                for g in groupby:
+                    if line.startswith(g):
+                        _groupby = g
+                        break
+                if _groupby:
+                    group[_groupby] = line
+                else:
+                    _mdata.append(line)
+            # sort grouping keys
+            _group = []
+            for g in groupby:
+                try:
+                    _group.append(group[g])
+                except KeyError:
+                    pass
+            #
+            _metadata[tuple(_group)][resource] = '\n'.join(_mdata)
+    else:
+        for resource in metadata:
+            mdata = metadata[resource]
+            if isinstance(mdata, Metadata):
+                metadata[resource] = repr(mdata)
+        _metadata = dict(default=metadata)
+    with _open(filename, 'w') as f:
+        if compress:
+            def write(s):
+                f.write(asbytes(s))
+        else:
+            write = f.write
+        for group in _metadata:
+            if groupby:
+                write(group_begin_breaker+'\n')
+                for line in group:
+                    write(line+'\n')
+                write(group_end_breaker+'\n')
+            metadata = _metadata[group]
+            for resource in metadata:
+                mdata = metadata[resource]
+                if mdata:
+                    if not mdata.endswith('\n'):
+                        mdata += '\n'
+                else:
+                    mdata = '' # string
+                nchars = len(mdata)
+                write('{} {}\n{}'.format(resource, nchars, mdata))
+        if pullers:
+            write(puller_breaker)
+            for reader in pullers:
+                write('\n'+reader)
+
+
+def baseline_read_index(filename, compress=False, groupby=[]):
+    """
+    Former :func:`~escale.relay.index.read_index`, text format only.
+    """
+    metadata = {}
+    if groupby:
+        read_group_def = False
+    else:
+        group = ''
+    pullers = []
+    if os.stat(filename).st_size == 0:
+        return (metadata, pullers)
+    elif compress:
+        _open = bz2.BZ2File
+    else:
+        _open = open
+    with _open(filename, 'r') as f:
+        while True:
+            line = asstr(f.readline().rstrip()) # asstr is necessary with compression
+            if not line:
+                break
+            if groupby:
+                if line == group_begin_breaker:
+                    read_group_def = True
+                    group = []
+                    continue
+                elif line == group_end_breaker:
+                    read_group_def = False
+                    if group:
+                        group = '\n'.join(group)+'\n'
+                    else:
+                        group = ''
+                    continue
+                elif read_group_def:
+                    group.append(line)
+                    continue
+            has_pullers = line == puller_breaker
+            if has_pullers:
+                break
+            resource, nchars = line.rsplit(None, 1)
+            nchars = int(nchars)
+            if nchars:
+                metadata[resource] = group+asstr(f.read(nchars))
+            else:
+                metadata[resource] = None
+        if has_pullers:
+            while line:
+                line = asstr(f.readline())
+                pullers.append(line.rstrip())
+    return (metadata, pullers)
+
+
+formats = [
+    ('baseline', baseline_write_index, baseline_read_index, {}),
+    ('text', write_index, read_index, dict(compact=False)),
+    ('compact', write_index, read_index, dict(compact=True)),
+    ]
+
+
+def synthetic_index(n, pushers=4, seed=0):
+    """
+    Metadata strings for `n` resources, as found in a loaded page index.
+    """
+    rng = random.Random(seed)
+    index = {}
+    for i in range(n):
+        resource = 'dir{}/sub{}/file{}.dat'.format(i // 10000, i // 100, i)
+        meta = Metadata(target=resource, timestamp=1500000000 + rng.randint(0, 10**8),
+            checksum='%032x' % rng.getrandbits(128),
+            pusher='client{}'.format(rng.randint(1, pushers)))
+        index[resource] = repr(meta)
+    return index
+
+
+def best(repeat, f, *args, **kwargs):
+    t = None
+    for _ in range(repeat):
+        t0 = time.time()
+        result = f(*args, **kwargs)
+        dt = time.time() - t0
+        if t is None or dt < t:
+            t = dt
+    return t, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--entries', type=int, default=200000, help='number of index entries')
+    parser.add_argument('--codecs', nargs='+', default=['none', 'gzip', 'bz2'],
+        choices=['none', 'gzip', 'bz2', 'xz'], help='compression codecs')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per measurement')
+    args = parser.parse_args()
+
+    index = synthetic_index(args.entries)
+    pullers = ['client1', 'client2']
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print('{:>6}  {:>8}  {:>10}  {:>10}  {:>10}'.format('codec', 'format', 'size (MB)',
+            'write (s)', 'read (s)'))
+        for codec in args.codecs:
+            for name, write, read, options in formats:
+                if write is baseline_write_index:
+                    if codec not in ('none', 'bz2'):
+                        continue
+                    compress = codec == 'bz2'
+                else:
+                    compress = codec
+                filename = os.path.join(tmpdir, 'index')
+                t_write, _ = best(args.repeat, write, filename, index, pullers,
+                    compress=compress, groupby=groupby, **options)
+                size = float(os.path.getsize(filename)) / 1048576
+                t_read, (metadata, _pullers) = best(args.repeat, read, filename,
+                    compress=compress, groupby=groupby)
+                # the text format may report an empty puller
+                assert len(metadata) == len(index) and [ p for p in _pullers if p ] == pullers
+                print('{:>6}  {:>8}  {:>10.2f}  {:>10.2f}  {:>10.2f}'.format(codec, name,
+                    size, t_write, t_read))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
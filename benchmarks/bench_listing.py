@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Benchmark of the classification of a remote listing on synthetic listings.
+
+The listing cache (:class:`~escale.relay.listing.ListingCache`) is built and
+classified in a single pass, and the ready and transferred views are read from it.
+The former :meth:`~escale.relay.relay.Relay.listReady` algorithm, which checked
+every regular file against a list of locks, is timed for comparison on the
+smallest listings only, as it is quadratic.
+
+Example::
+
+    python benchmarks/bench_listing.py --sizes 131072 262144 524288 1048576
+
+"""
+
+
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from escale.relay.relay import Relay
+from escale.relay.listing import ListingCache
+
+
+def synthetic_listing(relay, n, locked=.05, placeholders=.3, files_per_directory=150,
+        seed=0):
+    """
+    (path, mtime) pairs for about `n` listed entries.
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    entries = []
+    i = 0
+    while len(entries) < n:
+        dirname = 'd{}/e{}'.format(i // (files_per_directory * 10),
+            i // files_per_directory)
+        filename = 'f{}.dat'.format(i)
+        x = rng.random()
+        if x < placeholders:
+            entries.append(('/'.join((dirname, relay._placeholder(filename))), now))
+        else:
+            entries.append(('/'.join((dirname, filename)), now))
+            if x < placeholders + locked:
+                entries.append(('/'.join((dirname, relay._lock(filename))), now))
+        i += 1
+    rng.shuffle(entries)
+    return entries
+
+
+def former_list_ready(relay, ls):
+    """
+    Former default implementation of :meth:`Relay.listReady`, with no placeholder
+    cache update.
+    """
+    lock_files = []
+    regular_files = []
+    for file, mtime in ls:
+        filedir, filename = os.path.split(file)
+        if relay._isLock(filename):
+            lock_files.append(file)
+        elif relay._isPlaceholder(filename):
+            pass
+        elif not filename.startswith('.'):
+            lock_file = '/'.join((filedir, relay._lock(filename))) if filedir \
+                else relay._lock(filename)
+            regular_files.append((file, lock_file))
+    return [ regular_file
+            for regular_file, lock_file in regular_files
+            if lock_file not in lock_files ]
+
+
+def timeit(f, *args):
+    t0 = time.time()
+    result = f(*args)
+    return time.time() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+        default=[131072, 262144, 524288, 1048576], help='numbers of listed entries')
+    parser.add_argument('--former', type=int, nargs='*',
+        default=[10000, 20000, 40000], help='numbers of listed entries for the former algorithm')
+    parser.add_argument('--locked', type=float, default=.05, help='fraction of locked files')
+    parser.add_argument('--placeholders', type=float, default=.3,
+        help='fraction of placeholders')
+    args = parser.parse_args()
+
+    relay = Relay('bench', 'localhost', 'rep')
+    print('{:>10}  {:>16}  {:>14}  {:>14}'.format('entries', 'classification',
+        'views (x2)', 'ready files'))
+    for n in args.sizes:
+        entries = synthetic_listing(relay, n, args.locked, args.placeholders)
+        t_classify, ls = timeit(ListingCache, entries, relay)
+        relay.listing_cache = ls
+        def views():
+            for _ in range(2):
+                ready = relay.listReady()
+                relay.listTransferred()
+            return ready
+        t_views, ready = timeit(views)
+        print('{:>10}  {:>14.2f} s  {:>12.2f} s  {:>14}'.format(len(entries),
+            t_classify, t_views, len(ready)))
+    if args.former:
+        print('')
+        print('former listReady:')
+        print('{:>10}  {:>16}'.format('entries', 'listReady'))
+        for n in args.former:
+            entries = synthetic_listing(relay, n, args.locked, args.placeholders)
+            t, ready = timeit(former_list_ready, relay, entries)
+            ls = ListingCache(entries, relay)
+            assert sorted(ready) == sorted(ls.ready)
+            print('{:>10}  {:>14.2f} s'.format(len(entries), t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Compression codecs for index files and update archives.
+
+Compressed files are identified by the magic bytes of their codec, so that readers
+do not need to know the codec a file was written with.
+
+*new in 0.7.12*
+"""
+
+
+from .essential import asbytes
+import os
+import io
+import bz2
+import gzip
+import zlib
+import shutil
+import tempfile
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+compression_codecs = ('none', 'gzip', 'bz2', 'xz')
+
+_aliases = dict(no='none', false='none', off='none', gz='gzip', zlib='gzip',
+    bzip2='bz2', lzma='xz')
+
+_bz2_magic = b'BZh'
+_bz2_block_magic = (b'\x31\x41\x59\x26\x53\x59', b'\x17\x72\x45\x38\x50\x90')
+_gzip_magic = b'\x1f\x8b'
+_xz_magic = b'\xfd7zXZ\x00'
+
+magic_length = 10
+
+_tarfile_modes = dict(none='', gzip='gz', bz2='bz2', xz='xz')
+
+# `auto` mode: samples of at most `_sample_size` bytes are taken at the beginning
+# of at most `_sample_files` files; data that cannot be shrunk below `_max_ratio`
+# of its size by a fast compression is not compressed
+_sample_size = 65536
+_sample_files = 32
+_max_ratio = .9
+
+
+def parse_codec(codec, default='bz2'):
+    """
+    Normalize a codec name as found in a configuration file.
+
+    Arguments:
+
+        codec (str or bool or None): codec name, ``'auto'``, or boolean;
+            ``True`` and ``None`` stand for `default`.
+
+        default (str): default codec.
+
+    Returns:
+
+        str: any of :data:`compression_codecs` or ``'auto'``.
+
+    Raises:
+
+        ValueError: if the codec is not supported.
+    """
+    if codec is None or codec is True:
+        return default
+    if codec is False:
+        return 'none'
+    codec = _aliases.get(codec.lower(), codec.lower())
+    if codec == 'auto':
+        return codec
+    if codec not in compression_codecs:
+        raise ValueError("unsupported compression codec: '{}'".format(codec))
+    if codec == 'xz' and lzma is None:
+        raise ValueError("the 'xz' codec requires the lzma module")
+    return codec
+
+
+def detect_codec(head):
+    """
+    Identify the codec of a file from its first :data:`magic_length` bytes.
+
+    Returns:
+
+        str: any of :data:`compression_codecs`.
+    """
+    head = asbytes(head)
+    if head.startswith(_gzip_magic):
+        return 'gzip'
+    if head.startswith(_xz_magic):
+        return 'xz'
+    if head.startswith(_bz2_magic) and head[4:10] in _bz2_block_magic:
+        return 'bz2'
+    return 'none'
+
+
+def open_compressed(filename, mode='rb', codec=None):
+    """
+    Open a file in binary mode with any codec.
+
+    Arguments:
+
+        filename (str): path to file.
+
+        mode (str): either ``'rb'`` or ``'wb'``.
+
+        codec (str): any of :data:`compression_codecs`; if ``None``, the codec is
+            identified from the content of the file (read mode only).
+
+    Returns:
+
+        file object: binary file object.
+    """
+    if codec is None:
+        with open(filename, 'rb') as f:
+            codec = detect_codec(f.read(magic_length))
+    if codec == 'gzip':
+        # compression level 6 is much faster than the default 9, for similar ratios
+        return gzip.GzipFile(filename, mode, compresslevel=6)
+    elif codec == 'bz2':
+        return bz2.BZ2File(filename, mode)
+    elif codec == 'xz':
+        if lzma is None:
+            raise ValueError("the 'xz' codec requires the lzma module")
+        return lzma.LZMAFile(filename, mode)
+    else:
+        return io.open(filename, mode)
+
+
+def compressibility(sample):
+    """
+    Size ratio of `sample` compressed with a fast compression.
+    """
+    if not sample:
+        return 0.
+    return float(len(zlib.compress(sample, 1))) / float(len(sample))
+
+
+def sample_files(paths):
+    """
+    Read the beginning of some of the files in `paths`.
+
+    Returns:
+
+        bytes: concatenated samples.
+    """
+    samples = []
+    for path in paths[:_sample_files]:
+        try:
+            with open(path, 'rb') as f:
+                samples.append(f.read(_sample_size))
+        except (IOError, OSError):
+            # files may disappear
+            pass
+    return b''.join(samples)
+
+
+def resolve_codec(codec, sample=b'', compressed='gzip'):
+    """
+    Choose a codec in `auto` mode.
+
+    Arguments:
+
+        codec (str): codec name, as returned by :func:`parse_codec`.
+
+        sample (bytes): sample of the data to be compressed.
+
+        compressed (str): codec for compressible data.
+
+    Returns:
+
+        str: `codec`, or either ``'none'`` or `compressed` if `codec` is ``'auto'``.
+    """
+    if codec != 'auto':
+        return codec
+    if _max_ratio < compressibility(sample):
+        return 'none'
+    return compressed
+
+
+def compress_file(filename, codec):
+    """
+    Compress a file in place.
+    """
+    if codec == 'none':
+        return
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or None)
+    os.close(fd)
+    try:
+        with open(filename, 'rb') as src:
+            with open_compressed(tmp, 'wb', codec) as dest:
+                shutil.copyfileobj(src, dest)
+        shutil.move(tmp, filename)
+    except:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def tarfile_mode(mode, codec):
+    """
+    :func:`tarfile.open` mode for a codec.
+
+    Arguments:
+
+        mode (str): either ``'r'`` or ``'w'``.
+
+        codec (str): any of :data:`compression_codecs`, or ``None`` in read mode
+            so that the codec is identified from the content of the archive.
+    """
+    if codec is None:
+        return mode + ':*'
+    return ':'.join((mode, _tarfile_modes[codec])).rstrip(':')
+
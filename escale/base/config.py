@@ -93,6 +93,22 @@ default_cache_dirs = { user_cfg_dir: user_cache_dir,
 # 'pulloverwrite' added in version 0.7.6
 # 'verbosity' added in version 0.7.6
 # 'allow_page_deletion' added in version 0.7.7
+# 'transferworkers' added in version 0.7.12
+# 'checksumworkers' added in version 0.7.12
+# 'checksumflushinterval' added in version 0.7.12
+# 'statestore' added in version 0.7.12
+# 'incrementalscan' added in version 0.7.12
+# 'watch' added in version 0.7.12
+# 'incrementallisting' added in version 0.7.12
+# 'changejournal' added in version 0.7.12
+# 'placeholdercache' added in version 0.7.12
+# 'partsize' and 'partworkers' added in version 0.7.12
+# 'resumabletransfers' added in version 0.7.12
+# 'deltatransfer' added in version 0.7.12
+# 'indexformat' added in version 0.7.12
+# 'indexcompression' and 'archivecompression' added in version 0.7.12
+# 'indexjournal' added in version 0.7.12
+# 'etagpropagation' added in version 0.7.12
 fields = dict(path=('path', ['local path', 'path']),
 	address=['host address', 'relay address', 'remote address', 'address'],
 	directory=['host directory', 'relay directory', 'remote directory',
@@ -132,7 +148,25 @@ fields = dict(path=('path', ['local path', 'path']),
 	retryonerror=('list', ['retryonerror', 'retry on error']),
 	pulloverwrite=('bool', ['pull overwrite']),
 	verbosity=('int', ['verbosity', 'verbosity level']),
-	allow_page_deletion=('bool', ['allow page deletion', 'page deletion']))
+	allow_page_deletion=('bool', ['allow page deletion', 'page deletion']),
+	transferworkers=('int', ['transfer workers']),
+	checksumworkers=('int', ['checksum workers']),
+	checksumflushinterval=('int', ['checksum cache flush interval']),
+	statestore=['state store'],
+	incrementalscan=(('bool', 'int'), ['incremental scan']),
+	watch=(('bool', 'int'), ['watch', 'inotify']),
+	incrementallisting=(('bool', 'int'), ['incremental listing']),
+	changejournal=(('bool', 'int'), ['change journal']),
+	placeholdercache=(('bool', 'path'), ['placeholder cache']),
+	partsize=('number_unit', ['part size']),
+	partworkers=('int', ['part workers']),
+	resumabletransfers=(('bool', 'path'), ['resumable transfers']),
+	deltatransfer=('bool', ['delta transfer']),
+	indexformat=['index format'],
+	indexcompression=['index compression'],
+	archivecompression=['archive compression'],
+	indexjournal=(('bool', 'int'), ['index journal']),
+	etagpropagation=('bool', ['etag propagation']))
 
 
 def default_option(field, all_options=False):
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from .essential import asbytes
+import hashlib
+
+
+default_block_size = 1048576 # 1MB
+
+
+def read_blocks(path, block_size=default_block_size):
+    """
+    Read a file block by block.
+
+    A single buffer is reused across reads, so that memory usage does not depend
+    on the file size.
+    As a consequence, a yielded block is valid until the next block is read.
+
+    Arguments:
+
+        path (str): path to file.
+
+        block_size (int): buffer size in bytes.
+
+    Returns:
+
+        iterator of memoryview: blocks of bytes.
+    """
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            yield view[:n]
+
+
+class Hash(object):
+    """
+    Hash function that applies either to strings or to files.
+
+    Files are streamed in fixed-size blocks.
+
+    Example:
+
+    .. code-block:: python
+
+        sha512 = Hash('sha512')
+
+        sha512('test') == sha512.file(path_to_file_that_contains_test)
+
+    Attributes:
+
+        algorithm (str): hash algorithm name as supported by :func:`hashlib.new`.
+
+        block_size (int): read buffer size in bytes.
+
+    """
+    __slots__ = ['algorithm', 'block_size']
+
+    def __init__(self, algorithm, block_size=default_block_size):
+        hashlib.new(algorithm) # raises ValueError if not supported
+        self.algorithm = algorithm
+        self.block_size = block_size
+
+    def __call__(self, data):
+        h = hashlib.new(self.algorithm)
+        h.update(asbytes(data))
+        return h.hexdigest()
+
+    def file(self, path):
+        h = hashlib.new(self.algorithm)
+        for block in read_blocks(path, self.block_size):
+            h.update(block)
+        return h.hexdigest()
+
+
+def hash_file(path, hash_function):
+    """
+    Apply a hash function to the content of a file.
+
+    Arguments:
+
+        path (str): path to file.
+
+        hash_function (Hash or callable): if not a :class:`Hash`, the entire
+            file content is loaded in memory and passed to `hash_function`.
+
+    Returns:
+
+        str: hexadecimal digest.
+    """
+    if isinstance(hash_function, Hash):
+        return hash_function.file(path)
+    else:
+        with open(path, 'rb') as f:
+            return hash_function(f.read())
@@ -28,6 +28,10 @@ from escale.manager.index import IndexManager
 from escale.manager.access import AccessController, access_modifier_prefix
 from escale.manager.history import History, usage_statistics_prefix
 from escale.manager.cache import checksum_cache_prefix
+from escale.manager.state import open_state_store, SQLiteAccessAttributes, SQLiteChecksumCache
+from escale.manager.snapshot import DirectorySnapshot, local_snapshot_prefix
+from escale.relay.placeholder import placeholder_cache_prefix
+from escale.relay.resume import transfer_journal_prefix
 from escale.cli.controller import DirectController, UIController
 
 
@@ -76,12 +80,38 @@ def make_client(config, repository, log_handler=None, ui_connector=None):
 		ui_controller.logger = logger
 	# parse config
 	relay, args = parse_section(config, repository, logger)
+	# persistent state
+	state_store = args.pop('statestore', None)
+	if state_store:
+		state_store = state_store.lower()
+		if state_store == 'sqlite':
+			state_store = open_state_store(config, repository)
+		elif state_store == 'dbm':
+			state_store = None
+		else:
+			msg = "unsupported state store '{}'".format(state_store)
+			logger.error(msg)
+			raise ValueError(msg)
 	# local repository
 	path = args.pop('path', None)
 	mode = args.pop('mode', None)
+	if state_store is None:
+		persistent = get_cache_file(config, repository,
+				prefix=access_modifier_prefix)
+	else:
+		persistent = SQLiteAccessAttributes(state_store)
+	incremental_scan = args.pop('incrementalscan', False)
+	if incremental_scan:
+		if isinstance(incremental_scan, bool):
+			incremental_scan = 3600 # full scan interval in seconds
+		snapshot = DirectorySnapshot(get_cache_file(config, repository,
+				prefix=local_snapshot_prefix),
+			full_scan_interval=incremental_scan)
+	else:
+		snapshot = None
+	watch = args.pop('watch', False)
 	lr_controller = AccessController(repository, path=path, mode=mode,
-			persistent=get_cache_file(config, repository,
-				prefix=access_modifier_prefix),
+			persistent=persistent, snapshot=snapshot, watch=watch,
 			ui_controller=ui_controller, **args)
 	# time and quota control
 	refresh = args.pop('refresh', True)
@@ -93,8 +123,31 @@ def make_client(config, repository, log_handler=None, ui_connector=None):
 	# checksum cache
 	checksum_cache = args.pop('checksumcache', True)
 	if isinstance(checksum_cache, bool) and checksum_cache:
-		checksum_cache = get_cache_file(config, repository,
-				prefix=checksum_cache_prefix)
+		if state_store is None:
+			checksum_cache = get_cache_file(config, repository,
+					prefix=checksum_cache_prefix)
+		else:
+			checksum_cache = SQLiteChecksumCache(state_store)
+	# placeholder cache; new in 0.7.12
+	placeholder_cache = args.pop('placeholdercache', True)
+	if isinstance(placeholder_cache, bool):
+		if placeholder_cache:
+			placeholder_cache = get_cache_file(config, repository,
+					prefix=placeholder_cache_prefix)
+		else:
+			placeholder_cache = None
+	if placeholder_cache:
+		args['placeholdercache'] = placeholder_cache
+	# transfer journal; new in 0.7.12
+	transfer_journal = args.pop('resumabletransfers', False)
+	if isinstance(transfer_journal, bool):
+		if transfer_journal:
+			transfer_journal = get_cache_file(config, repository,
+					prefix=transfer_journal_prefix)
+		else:
+			transfer_journal = None
+	if transfer_journal:
+		args['resumabletransfers'] = transfer_journal
 	# extra UI options
 	ui_controller.maintainer = args.pop('maintainer', None)
 	# ready
@@ -24,11 +24,11 @@ except NameError:
 	py2 = False
 
 
-def _communicate(p, relay_input=False):
+def _communicate(p, relay_input=False, data=None):
 	if relay_input:
 		return p.communicate(input())
 	else:
-		return p.communicate()
+		return p.communicate(data)
 
 
 def with_subprocess(cmd, *args, **kwargs):
@@ -53,7 +53,13 @@ def with_subprocess(cmd, *args, **kwargs):
 		input (bool): call `input` or `raw_input` and relay the user-supplied input to
 			the command. (default: False)
 
-	`input`, `output`, `wait` and `error` can be passed only as keyword arguments.
+		data (bytes): send `data` to the command on *stdin*. (default: None)
+
+		binary (bool): do not decode the command output. (default: True if `data`
+			is defined, False otherwise)
+
+	`input`, `output`, `wait`, `error`, `data` and `binary` can be passed only as
+	keyword arguments.
 
 	The extra keyword arguments are passed to `subprocess.Popen`.
 
@@ -75,9 +81,11 @@ def with_subprocess(cmd, *args, **kwargs):
 	wait_for_completion = kwargs.pop('wait', None)
 	fail_on_error = kwargs.pop('error', None)
 	relay_input = kwargs.pop('input', None)
-	if relay_input and 'stdin' not in kwargs:
+	data = kwargs.pop('data', None)
+	binary = kwargs.pop('binary', data is not None)
+	if (relay_input or data is not None) and 'stdin' not in kwargs:
 		kwargs['stdin'] = subprocess.PIPE
-	if not (py2 or 'encoding' in kwargs):
+	if not (py2 or binary or 'encoding' in kwargs):
 		kwargs['encoding'] = 'utf8'
 	if return_output or fail_on_error:
 		if not (return_output is False or 'stdout' in kwargs):
@@ -85,7 +93,7 @@ def with_subprocess(cmd, *args, **kwargs):
 		if not (fail_on_error is False or 'stderr' in kwargs):
 			kwargs['stderr'] = subprocess.PIPE
 		p = subprocess.Popen(cmd, **kwargs)
-		out, err = _communicate(p, relay_input)
+		out, err = _communicate(p, relay_input, data)
 		if err:
 			if fail_on_error:
 				try:
@@ -99,6 +107,6 @@ def with_subprocess(cmd, *args, **kwargs):
 			return out
 	else:
 		p = subprocess.Popen(cmd, **kwargs)
-		if wait_for_completion or relay_input:
-			_communicate(p, relay_input)
+		if wait_for_completion or relay_input or data is not None:
+			_communicate(p, relay_input, data)
 
@@ -91,9 +91,12 @@ class Clock(object):
         self.count += 1
         return t
 
-    def wait(self, logger=None):
+    def wait(self, logger=None, event=None):
         '''
         Call :meth:`next` and sleep during the returned duration.
+
+        If `event` (:class:`threading.Event`) is defined, the sleep ends as soon as
+        the event is set, and the event is cleared.
         '''
         delay = self.next()
         if self.precision:
@@ -105,5 +108,9 @@ class Clock(object):
             precision = ''
         #if logger is not None:
         #    logger.debug('sleeping %{}f seconds'.format(precision), delay)
-        time.sleep(delay)
+        if event is None:
+            time.sleep(delay)
+        else:
+            event.wait(delay)
+            event.clear()
 
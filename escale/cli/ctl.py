@@ -26,10 +26,12 @@ from escale.base.essential import *
 from escale.base.config import *
 from escale.relay.info import *
 from escale.manager.access import *
+from escale.manager.state import open_state_store, SQLiteAccessAttributes
 from escale.base.launcher import *
 from escale.manager.migration import *
 from escale.manager.backup import *
 from escale.relay.index import *
+from escale.base.compression import detect_codec, magic_length, tarfile_mode
 
 import tarfile
 import shutil
@@ -138,9 +140,12 @@ def access(modifiers=None, resource=None, repository=None):
     ok = False
     for rep in repositories:
         args = parse_fields(cfg, rep, fields)
-        persistent = get_cache_file(config=cfg, section=rep, prefix=access_modifier_prefix)
-        if get_modifiers and not os.path.exists(persistent):
-            continue
+        if args.pop('statestore', '').lower() == 'sqlite':
+            persistent = SQLiteAccessAttributes(open_state_store(cfg, rep))
+        else:
+            persistent = get_cache_file(config=cfg, section=rep, prefix=access_modifier_prefix)
+            if get_modifiers and not os.path.exists(persistent):
+                continue
         ctl = AccessController(rep, persistent=persistent, create=set_modifiers, **args)
         if set_modifiers:
             assert ctl.persistent
@@ -347,8 +352,7 @@ def recover(repository=None, timestamp=None, overwrite=True, update=None, fast=N
                         timestamp = os.path.getmtime(local)
                         content = client.encryption.encrypt(local)
                         try:
-                            with open(content, 'rb') as f:
-                                checksum = client.hash_function(f.read())
+                            checksum = client.hash_function.file(content)
                         finally:
                             client.encryption.finalize(content)
                     if checksum:
@@ -372,6 +376,7 @@ def recover(repository=None, timestamp=None, overwrite=True, update=None, fast=N
             except:
                 print(traceback.format_exc())
             finally:
+                client.flushChecksumCache()
                 client.relay.close()
     finally:
         os.unlink(local_placeholder)
@@ -401,6 +406,8 @@ def rebase(repository=None, extra_path=None):
     client = make_client(cfg, repository)
     if isinstance(client.relay, TopDirectoriesIndex):
         raise NotImplementedError('cannot add upper directories with directory-based indexing')
+    if isinstance(client.relay, HashIndex):
+        raise NotImplementedError('cannot add upper directories with hash-based indexing')
     client.relay.open()
     client.remoteListing()
     fd, tmp = tempfile.mkstemp()
@@ -426,10 +433,13 @@ def rebase(repository=None, extra_path=None):
                             extraction_repository = tempfile.mkdtemp()
                             try:
                                 os.makedirs(join(extraction_repository, extra_path))
-                                with tarfile.open(tmp, mode='r:bz2') as tar:
+                                # keep the compression codec of the archive
+                                with open(tmp, 'rb') as f:
+                                    codec = detect_codec(f.read(magic_length))
+                                with tarfile.open(tmp, mode=tarfile_mode('r', None)) as tar:
                                     tar.extractall(join(extraction_repository, extra_path))
                                 os.unlink(tmp)
-                                with tarfile.open(tmp, mode='w:bz2') as tar:
+                                with tarfile.open(tmp, mode=tarfile_mode('w', codec)) as tar:
                                     tar.add(join(extraction_repository, first_dir), arcname=first_dir,
                                             recursive=True)
                                 encrypted = client.encryption.encrypt(tmp)
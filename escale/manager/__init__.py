@@ -13,12 +13,13 @@
 
 from .config import get_client_name
 from .manager import Manager
-from .access import Accessor, AccessAttributes, AccessController, access_modifier_prefix
+from .access import Accessor, AccessAttributes, AccessController, FileRecord, \
+	access_modifier_prefix
 from .history import TimeQuotaController, History, usage_statistics_prefix
 
 __all__ = ['get_client_name',
 	'Manager',
-	'Accessor', 'AccessAttributes', 'AccessController',
+	'Accessor', 'AccessAttributes', 'AccessController', 'FileRecord',
 	'TimeQuotaController', 'History',
 	'access_modifier_prefix', 'usage_statistics_prefix']
 
@@ -17,8 +17,13 @@
 
 from escale.base.essential import *
 import os
+import binascii
 import itertools
+from collections import namedtuple
 import traceback
+import threading
+import stat
+from .watcher import LocalWatcher, inotify_available
 
 
 if PYTHON_VERSION == 2:
@@ -43,6 +48,39 @@ else:
 
 access_modifier_prefix = 'am'
 
+# key of the token of the last writer in the dbm file; not a valid path
+writer_token_key = b'\x00writer'
+
+
+def _identity(a):
+    return a
+
+
+class FileRecord(namedtuple('FileRecord', ('path', 'size', 'mtime_ns', 'inode'))):
+    """
+    Local file with the attributes read at listing time.
+
+    Attributes:
+
+        path (str): path relative to the repository root.
+
+        size (int): file size in bytes.
+
+        mtime_ns (int): last modification time in nanoseconds.
+
+        inode (int): inode number.
+
+    *new in 0.7.12*
+    """
+    __slots__ = ()
+
+    @property
+    def mtime(self):
+        """
+        Last modification time in seconds, as returned by :func:`os.path.getmtime`.
+        """
+        return self.mtime_ns / 1e9
+
 
 class Accessor(object):
     """
@@ -89,8 +127,23 @@ class TableEntry(object):
 
 
 class AccessAttributes(object):
+    """
+    Persistent access attributes.
+
+    The attributes are read from an in-memory snapshot of the dbm file.
+    The snapshot is reloaded whenever the dbm file is modified by another process,
+    e.g. ``escalectl access``.
+    Changes are written to the dbm file immediately.
 
-    __slots__ = [ '_r', '_w', '_u', '_undefined', '_t', '_f', 'location', '_table' ]
+    Each writer also writes a random token, so that a writer can tell whether
+    the dbm file has been modified by another process since the snapshot was taken
+    or while writing; the snapshot is then reloaded.
+
+    *new in 0.7.12:* in-memory snapshot; :meth:`areReadable` and :meth:`areWritable`
+    """
+
+    __slots__ = [ '_r', '_w', '_u', '_undefined', '_t', '_f', 'location', '_table', '_lock',
+        '_stamp', '_token' ]
 
     def __init__(self, location=None, dbm_mode='c'):
         self._r = 0
@@ -100,7 +153,11 @@ class AccessAttributes(object):
         self._f = b'-'
         self._undefined = b'  '
         self._table = None
+        self._stamp = None
+        self._token = None
         self.location = location
+        # transfer workers may update the table concurrently
+        self._lock = threading.RLock()
         #if self.location:
         #    self._table = dbm.open(self.location, dbm_mode)
 
@@ -130,10 +187,106 @@ class AccessAttributes(object):
     def table(self, resource):
         return TableEntry(self.location, resource, self._undefined)
 
+    def _signature(self):
+        # depending on the dbm implementation, the database may span several files
+        signature = []
+        for ext in ('', '.db', '.dat', '.dir', '.pag'):
+            try:
+                st = os.stat(self.location + ext)
+            except OSError:
+                continue
+            signature.append((ext, st.st_mtime, st.st_size))
+        return tuple(signature)
+
+    def _load(self):
+        table = {}
+        db = dbm.open(self.location, 'c')
+        try:
+            for key in db.keys():
+                table[key] = db[key]
+        finally:
+            db.close()
+        self._token = table.pop(writer_token_key, None)
+        return table
+
+    def _store(self, key, attributes):
+        """
+        Write an entry; `attributes` is ``None`` to delete the entry.
+
+        Returns:
+
+            any: signature of the persistent table after the write, or ``None`` if
+                the table has been modified by another process since the snapshot
+                was taken.
+        """
+        token = binascii.hexlify(os.urandom(8))
+        db = dbm.open(self.location, 'c')
+        try:
+            try:
+                previous = db[writer_token_key]
+            except KeyError:
+                previous = None
+            if attributes is None:
+                try:
+                    del db[key]
+                except KeyError:
+                    pass
+            else:
+                db[key] = attributes
+            db[writer_token_key] = token
+        finally:
+            db.close()
+        stamp = self._signature()
+        # the token is read after the signature, so that the signature cannot
+        # include the changes of a later writer
+        db = dbm.open(self.location, 'r')
+        try:
+            current = db[writer_token_key]
+        finally:
+            db.close()
+        if previous != self._token or current != token:
+            return None
+        self._token = token
+        return stamp
+
+    def _snapshot(self):
+        """
+        Return the attribute table, reloaded if the persistent table has changed.
+        """
+        stamp = self._signature()
+        if self._table is None or stamp != self._stamp:
+            # the signature is taken before loading, so that changes made while
+            # loading trigger another reload
+            if stamp:
+                table = self._load()
+            else:
+                table, self._token = {}, None
+            self._table, self._stamp = table, stamp
+        return self._table
+
+    def _update(self, resource, attributes):
+        key = asbinary(resource)
+        stamp = self._store(key, attributes)
+        if stamp is None:
+            # the table has been modified by another process; reload on next access
+            self._table = None
+            return
+        if attributes is None:
+            self._table.pop(key, None)
+        else:
+            self._table[key] = attributes
+        self._stamp = stamp
+
+    def _get(self, resource, default=None):
+        try:
+            return self._snapshot()[asbinary(resource)]
+        except KeyError:
+            return default
+
     def __contains__(self, resource):
         if self.location:
-            with TableEntry(self.location, resource, None) as e:
-                return e.get() is not None
+            with self._lock:
+                return self._get(resource) is not None
         else:
             return False
 
@@ -141,15 +294,26 @@ class AccessAttributes(object):
         if self.location is None:
             return None
         else:
-            with self.table(resource) as entry:
-                attributes = entry.get()
+            with self._lock:
+                attributes = self._get(resource, self._undefined)
                 value = self._decode(attributes[attr:attr+1])
                 if value is None and explicit:
                     value = explicit
                     attributes = self._encode(value).join((attributes[:attr], attributes[attr+1:]))
-                    entry.set(attributes)
+                    self._update(resource, attributes)
                 return value
 
+    def _abilities(self, attr, resources):
+        if self.location is None:
+            return [ True for _ in resources ]
+        else:
+            with self._lock:
+                table = self._snapshot()
+                undefined = self._undefined
+                f = self._f[0:1]
+                return [ table.get(asbinary(resource), undefined)[attr:attr+1] != f
+                    for resource in resources ]
+
     def _is(self, attr, resource, make_explicit=None):
         if make_explicit is None:
             return self._ability(attr, resource) is not False
@@ -168,6 +332,30 @@ class AccessAttributes(object):
         """
         return self._is(self._w, resource, make_explicit=make_explicit)
 
+    def areReadable(self, resources):
+        """
+        Determine which resources can be uploaded.
+
+        The attribute table is checked for modifications only once.
+
+        Arguments:
+
+            resources (list): relative paths.
+
+        Returns:
+
+            list of bool: one boolean per resource, in the same order.
+        """
+        return self._abilities(self._r, resources)
+
+    def areWritable(self, resources):
+        """
+        Determine which resources can be downloaded.
+
+        See also :meth:`areReadable`.
+        """
+        return self._abilities(self._w, resources)
+
     def getReadability(self, resource):
         return self._ability(self._r, resource)
 
@@ -175,13 +363,12 @@ class AccessAttributes(object):
         return self._ability(self._w, resource)
 
     def _set(self, attr, resource, perm):
-        with self.table(resource) as entry:
-            attributes = entry.get()
+        with self._lock:
+            attributes = self._get(resource, self._undefined)
             attributes = self._encode(perm).join((attributes[:attr], attributes[attr+1:]))
-            if attributes is self._undefined:
-                entry.delete()
-            else:
-                entry.set(attributes)
+            if attributes == self._undefined:
+                attributes = None
+            self._update(resource, attributes)
 
     def setReadable(self, resource):
         self._set(self._r, resource, True)
@@ -255,7 +442,7 @@ class AccessController(Reporter):
 
     Attributes:
 
-        persistent (str): path to persistent data.
+        persistent (str or AccessAttributes): path to persistent data.
 
         repository (str): repository identifier.
 
@@ -269,6 +456,11 @@ class AccessController(Reporter):
 
         verbosity (int): verbosity level; if greater than 2, may cause the OS to freeze.
 
+        snapshot (DirectorySnapshot): persistent listing of the local repository
+            for incremental scans.
+
+        watcher (LocalWatcher): inotify-based change detector.
+
     When `push_only` (resp. `pull_only`) is ``True`` , `mode` is `upload` (resp. `download`).
 
     When `mode` is `download`, `upload` or `shared`, and the persistent attributes do not exist
@@ -280,7 +472,7 @@ class AccessController(Reporter):
             ui_controller=None,
             push_only=False, pull_only=False,
             mode=None, create=False, unsafe=False,
-            verbosity=1,
+            verbosity=1, snapshot=None, watch=False,
             **ignored):
         Reporter.__init__(self, ui_controller=ui_controller)
         self.name = repository
@@ -309,7 +501,9 @@ class AccessController(Reporter):
             self.mode = mode
         # set persistent data
         self.persistent = None #AccessAttributes()
-        if persistent:
+        if isinstance(persistent, AccessAttributes):
+            self.persistent = persistent
+        elif persistent:
             if create or self.mode == 'conservative' or os.path.exists(persistent):
                 if not os.path.exists(persistent):
                     dirname = os.path.dirname(persistent)
@@ -317,6 +511,16 @@ class AccessController(Reporter):
                         os.makedirs(dirname)
                 self.persistent = AccessAttributes(persistent)
         self.verbosity = verbosity
+        self.snapshot = snapshot
+        self.watcher = None
+        if watch:
+            if inotify_available():
+                if isinstance(watch, bool):
+                    watch = 3600 # full scan interval in seconds
+                self.watcher = LocalWatcher(self.path, full_scan_interval=watch,
+                        logger=self.logger)
+            else:
+                self.logger.warning('inotify not available; cannot watch the local repository')
 
     @property
     def mode(self):
@@ -337,6 +541,122 @@ class AccessController(Reporter):
             else:
                 raise ValueError("'{}' mode not supported".format(m))
 
+    def scanFiles(self, path=None, basename=None, dirname=None):
+        """
+        Generate records for all visible files in the local repository.
+
+        Files which name begins with "." are ignored.
+        Directories are crawled iteratively and the file attributes are read from
+        :func:`os.scandir` entries, so that the files are not stat'ed again.
+        If a :class:`~escale.manager.snapshot.DirectorySnapshot` is available, only the
+        directories that have been modified since the last scan are listed again.
+
+        Arguments:
+
+            path (str): relative path to recursively crawl from.
+
+            basename (boolean function): returns True if the input file basename qualifies.
+
+            dirname (boolean function): returns True if the input file directory name qualifies.
+
+        Returns:
+
+            iterator of FileRecord: local files.
+
+        *new in 0.7.12*
+        """
+        if dirname is None:
+            dirname = lambda a: True
+        if basename is None:
+            basename = lambda a: True
+        snapshot = self.snapshot
+        full_scan = not path
+        if snapshot is not None and full_scan:
+            snapshot.begin()
+        directories = [ path if path else '' ]
+        while directories:
+            path = directories.pop()
+            if path:
+                relative_path = lambda a: '/'.join((path, a))
+                full_path = '/'.join((self.path, path))
+            else:
+                relative_path = lambda a: a
+                full_path = self.path
+            try:
+                content = None
+                if snapshot is not None:
+                    directory_mtime = os.stat(full_path).st_mtime_ns
+                    content = snapshot.get(path, directory_mtime)
+                if content is None:
+                    content = self._listDirectory(full_path)
+                    if snapshot is not None:
+                        snapshot.set(path, directory_mtime, *content)
+            except OSError:
+                self.logger.error('%s', traceback.format_exc())
+                continue
+            files, subdirectories = content
+            for name, size, mtime_ns, inode in files:
+                if basename(name):
+                    yield FileRecord(relative_path(name), size, mtime_ns, inode)
+            # crawl the subdirectories in listing order
+            for name in reversed(subdirectories):
+                rp = relative_path(name)
+                if dirname(rp):
+                    directories.append(rp)
+        if snapshot is not None and full_scan:
+            snapshot.end()
+
+    def statFiles(self, resources, basename=None, dirname=None):
+        """
+        Generate records for a set of files in the local repository.
+
+        Missing files and files that :meth:`scanFiles` would not list are skipped.
+
+        Arguments:
+
+            resources (iterable): paths relative to the repository root.
+
+            basename (boolean function): returns True if the input file basename qualifies.
+
+            dirname (boolean function): returns True if the input file directory name qualifies.
+
+        Returns:
+
+            iterator of FileRecord: local files.
+
+        *new in 0.7.12*
+        """
+        for resource in sorted(resources):
+            parts = resource.split('/')
+            if any(part[0] == '.' for part in parts if part):
+                continue
+            if basename is not None and not basename(parts[-1]):
+                continue
+            if dirname is not None and not all(dirname('/'.join(parts[:i]))
+                    for i in range(1, len(parts))):
+                continue
+            try:
+                s = os.stat(self.absolute(resource))
+            except OSError: # deleted file
+                continue
+            if stat.S_ISREG(s.st_mode):
+                yield FileRecord(resource, s.st_size, s.st_mtime_ns, s.st_ino)
+
+    def _listDirectory(self, full_path):
+        files, subdirectories = [], []
+        for f in os.scandir(full_path):
+            if f.name[0] == '.':
+                continue
+            if f.is_dir():
+                subdirectories.append(f.name)
+            elif f.is_file():
+                try:
+                    s = f.stat()
+                except OSError: # file unlinked in the meantime
+                    continue
+                files.append((f.name, s.st_size, s.st_mtime_ns, s.st_ino))
+        return files, subdirectories
+
     def listFiles(self, path=None, basename=None, dirname=None, absolute=False):
         """
         List all visible files in the local repository.
@@ -356,46 +676,14 @@ class AccessController(Reporter):
         Returns:
 
             list of str: list of local files.
+
+        See also :meth:`scanFiles`.
         """
-        # no improvement with os.walk compared to listdir...
-        if dirname is None:
-            dirname = lambda a: True
-        if basename is None:
-            basename = lambda a: True
+        records = self.scanFiles(path, basename=basename, dirname=dirname)
         if absolute:
-            a_or_r = lambda a, b: a
+            return [ '/'.join((self.path, r.path)) for r in records ]
         else:
-            a_or_r = lambda a, b: b
-        #if path is None:
-        #    path = self.path
-        #local = []
-        #for _dirname, _, filenames in os.walk(path):
-        #    local.append([ os.path.join(_dirname, _basename) for _basename in filenames
-        #        if dirname(_dirname) and _basename[0] != '.' and basename(_basename) ])
-        #local = itertools.chain(*local)
-        if path:
-            relative_path = lambda a: '/'.join((path, a))
-            full_path = '/'.join((self.path, path))
-        else:
-            relative_path = lambda a: a
-            full_path = self.path
-
-        try:
-            dirs, files = [], []
-            for f in os.scandir(full_path):
-                if f.name[0] == '.':
-                    continue
-                if f.is_dir():
-                    rp = relative_path(f.name)
-                    if dirname(rp):
-                        dirs.append(self.listFiles(rp, basename=basename, dirname=dirname))
-                elif f.is_file():
-                    if basename(f.name):
-                        files.append(a_or_r(f.path, relative_path(f.name)))
-            return list(itertools.chain(files, *dirs))
-        except OSError:
-            self.logger.error('%s', traceback.format_exc())
-            return []
+            return [ r.path for r in records ]
 
     def readable(self, files, unsafe=False):
         """
@@ -413,13 +701,51 @@ class AccessController(Reporter):
             files = []
         elif self.persistent is not None:
             if unsafe:
-                files = [ f for f in files if self.persistent.isReadable(f) ]
+                resources = files
             else:
                 # assert that all files are in the repository with __safe__ (even
-                # those that are not readable) and filter readable files
-                files = [ f for f in files if self.__safe__(self.persistent.isReadable, f) ]
+                # those that are not readable)
+                resources = [ self.__safe__(_identity, f) for f in files ]
+            # filter readable files
+            files = [ f for f, r in zip(files, self.persistent.areReadable(resources)) if r ]
         return files
 
+    def readableRecords(self, records, batch_size=1000):
+        """
+        Select the records of the files that can be uploaded.
+
+        Access modifiers are checked by batch.
+
+        Arguments:
+
+            records (iterable): :class:`FileRecord` objects, as generated by
+                :meth:`scanFiles`.
+
+            batch_size (int): number of records checked at a time.
+
+        Returns:
+
+            iterator of FileRecord: uploadable files.
+        """
+        if self.mode == 'download': # in principle `download` should not call `readable`
+            return
+        batch = []
+        for record in records:
+            batch.append(record)
+            if batch_size <= len(batch):
+                for record in self._readableBatch(batch):
+                    yield record
+                batch = []
+        for record in self._readableBatch(batch):
+            yield record
+
+    def _readableBatch(self, records):
+        if self.persistent is None:
+            return records
+        else:
+            readable = self.persistent.areReadable([ r.path for r in records ])
+            return [ r for r, ok in zip(records, readable) if ok ]
+
     def writable(self, filename, absolute=True):
         """
         Get the local path corresponding to a remote resource if it can be downloaded.
@@ -17,6 +17,8 @@
 from escale.base.essential import PYTHON_VERSION, asstr
 from .config import *
 from collections import defaultdict
+import time
+import threading
 
 if PYTHON_VERSION == 2:
 	#import gdbm as dbm
@@ -40,33 +42,148 @@ checksum_cache_prefix = 'cc'
 
 
 class ChecksumCache(dict):
+	"""
+	Write-back checksum cache backed by a dbm file.
+
+	The dbm file is loaded once at construction time.
+	Modified entries are kept in memory and written to the dbm file by batch,
+	on :meth:`flush` calls or when more than `flush_interval` seconds have elapsed
+	since the last flush.
+
+	Attributes:
+
+		cache (str): path to dbm file.
+
+		flush_interval (float): maximum number of seconds between two flushes.
+
+		dirty (set): modified keys not written to the dbm file yet.
+
+	Modifications and flushes are serialized, so that the cache can be shared by
+	several threads.
+
+	The block signatures of the last pushed version of the files, if any, are stored
+	in a separate dbm file with suffix *.signatures*, and are not held in memory.
+
+	*new in 0.7.12:* entries are held in memory; `flush_interval`; block signatures
+	"""
 
 	__separator__ = ';'
 
-	def __init__(self, cache):
+	def __init__(self, cache, flush_interval=60):
+		dict.__init__(self)
 		cache = os.path.expanduser(cache)
 		dirname = os.path.dirname(cache)
 		if not os.path.isdir(dirname):
 			os.makedirs(dirname)
 		self.cache = cache
-
-	def __setitem__(self, key, value):
-		timestamp, checksum = value
-		db = dbm.open(self.cache, 'c')
+		self.flush_interval = flush_interval
+		self.dirty = set()
+		self.last_flush = time.time()
+		self._lock = threading.RLock()
+		self._signature_lock = threading.Lock()
+		self.load()
+
+	def load(self):
+		"""
+		Read all the entries from the dbm file.
+		"""
 		try:
-			db[key] = '{}{}{}'.format(timestamp, self.__separator__, checksum)
-		finally:
-			db.close()
-	
-	def __getitem__(self, key):
-		db = dbm.open(self.cache, 'c')
+			db = dbm.open(self.cache, 'r')
+		except dbm.error:
+			# file does not exist yet
+			return
 		try:
-			value = asstr(db[key])
+			for key in db.keys():
+				timestamp, checksum = asstr(db[key]).split(self.__separator__)
+				dict.__setitem__(self, asstr(key), (int(timestamp), checksum))
 		finally:
 			db.close()
-		timestamp, checksum = value.split(self.__separator__)
-		return int(timestamp), checksum
 
+	def __setitem__(self, key, value):
+		timestamp, checksum = value
+		with self._lock:
+			dict.__setitem__(self, key, (int(timestamp), checksum))
+			self.dirty.add(key)
+			self._autoflush()
+
+	def update(self, entries):
+		"""
+		Set several entries at once.
+		"""
+		if isinstance(entries, dict):
+			entries = entries.items()
+		with self._lock:
+			for key, (timestamp, checksum) in entries:
+				dict.__setitem__(self, key, (int(timestamp), checksum))
+				self.dirty.add(key)
+			self._autoflush()
+
+	def _autoflush(self):
+		if self.flush_interval is not None and \
+				self.flush_interval <= time.time() - self.last_flush:
+			self.flush()
+
+	def flush(self):
+		"""
+		Write the modified entries to the dbm file.
+		"""
+		with self._lock:
+			self.last_flush = time.time()
+			if not self.dirty:
+				return
+			dirty, self.dirty = self.dirty, set()
+			try:
+				db = dbm.open(self.cache, 'c')
+				try:
+					for key in dirty:
+						timestamp, checksum = dict.__getitem__(self, key)
+						db[key] = '{}{}{}'.format(timestamp, self.__separator__, checksum)
+				finally:
+					db.close()
+			except:
+				# retry on next flush
+				self.dirty |= dirty
+				raise
+
+
+	def getSignature(self, key):
+		"""
+		Returns:
+
+			bytes or None: serialized block signatures, as set by :meth:`setSignature`.
+
+		*new in 0.7.12*
+		"""
+		with self._signature_lock:
+			try:
+				db = dbm.open(self.cache + '.signatures', 'r')
+			except dbm.error:
+				return None
+			try:
+				return db[key]
+			except KeyError:
+				return None
+			finally:
+				db.close()
+
+	def setSignature(self, key, signature):
+		"""
+		Store or, if `signature` is ``None``, delete the block signatures of a file.
+
+		*new in 0.7.12*
+		"""
+		with self._signature_lock:
+			db = dbm.open(self.cache + '.signatures', 'c')
+			try:
+				if signature is None:
+					try:
+						del db[key]
+					except KeyError:
+						pass
+				else:
+					db[key] = signature
+			finally:
+				db.close()
 
 
 def read_checksum_cache(path, log=None):
@@ -97,6 +214,7 @@ def read_checksum_cache(path, log=None):
 			if log is not None:
 				log(e)
 			pass
+		cache.flush()
 	return cache
 
 
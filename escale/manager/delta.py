@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION, asstr, asbytes
+import os
+import json
+import mmap
+import struct
+import hashlib
+
+if PYTHON_VERSION == 2:
+    def _accumulate(data):
+        total = 0
+        for x in data:
+            total += x
+            yield total
+else:
+    from itertools import accumulate as _accumulate
+
+
+default_delta_block_size = 65536 # 64kB
+
+_delta_header = b'escale-delta%1.0\n'
+_record = struct.Struct('>I16s')
+_length = struct.Struct('>Q')
+
+
+def weak_checksum(block):
+    """
+    Rolling checksum of a block of bytes, as defined by rsync.
+    """
+    data = bytearray(block)
+    a = sum(data) & 0xffff
+    b = sum(_accumulate(data)) & 0xffff
+    return a | (b << 16)
+
+
+def strong_checksum(block):
+    return hashlib.md5(block).digest()
+
+
+class Signature(object):
+    """
+    Block signatures of a version of a file.
+
+    Attributes:
+
+        checksum (str): checksum of the entire file.
+
+        block_size (int): block size in bytes.
+
+        size (int): file size in bytes.
+
+        weak (list of int): rolling checksums of the blocks.
+
+        strong (list of bytes): MD5 digests of the blocks.
+
+    *new in 0.7.12*
+    """
+    __slots__ = [ 'checksum', 'block_size', 'size', 'weak', 'strong' ]
+
+    def __init__(self, checksum, block_size, size, weak=[], strong=[]):
+        self.checksum = asstr(checksum)
+        self.block_size = block_size
+        self.size = size
+        self.weak = list(weak)
+        self.strong = list(strong)
+
+    @classmethod
+    def compute(cls, path, checksum, block_size=default_delta_block_size):
+        signature = cls(checksum, block_size, os.path.getsize(path))
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                signature.weak.append(weak_checksum(block))
+                signature.strong.append(strong_checksum(block))
+        return signature
+
+    def dumps(self):
+        header = json.dumps(dict(checksum=self.checksum, block_size=self.block_size,
+            size=self.size))
+        return b''.join([ asbytes(header), b'\n' ] + [ _record.pack(weak, strong)
+            for weak, strong in zip(self.weak, self.strong) ])
+
+    @classmethod
+    def loads(cls, data):
+        header, _, records = data.partition(b'\n')
+        signature = cls(**json.loads(asstr(header)))
+        for offset in range(0, len(records), _record.size):
+            weak, strong = _record.unpack_from(records, offset)
+            signature.weak.append(weak)
+            signature.strong.append(strong)
+        return signature
+
+
+def make_delta(signature, path, cipher, delta_file, max_ratio=.5, probe_blocks=16):
+    """
+    Make a delta file that turns the version of a file described by `signature`
+    into the current content of file `path`.
+
+    The blocks of the current content are searched for in the previous version at
+    any offset, with the rolling checksum of rsync.
+    The data not found in the previous version is encrypted by chunks of at most
+    one block, independently, with `cipher`. The list of operations (the manifest)
+    is encrypted as well, and written after the data.
+
+    The blocks of the current content at block boundaries are first looked for in
+    the previous version, which is fast. If none is found, the content was either
+    shifted or entirely rewritten, and the byte-by-byte search gives up as soon as
+    `probe_blocks` blocks of data have been scanned with no match.
+
+    Arguments:
+
+        signature (Signature): block signatures of the previous version.
+
+        path (str): path to the current version of the file.
+
+        cipher (Cipher): encryption layer.
+
+        delta_file (str): path to the delta file to be written.
+
+        max_ratio (float): maximum fraction of the file size that can be sent as
+            new data.
+
+        probe_blocks (int): number of blocks scanned before giving up, if no block
+            is found at a block boundary.
+
+    Returns:
+
+        bool: ``False`` if the new data exceeds `max_ratio`; no delta file is written.
+    """
+    size = os.path.getsize(path)
+    L = signature.block_size
+    if size < L:
+        return False
+    max_literal = int(size * max_ratio)
+    table = {}
+    for index, weak in enumerate(signature.weak):
+        table.setdefault(weak, []).append(index)
+    # the last block of the previous version may be short
+    tail = signature.size % L
+    ops, literal = [], 0
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if PYTHON_VERSION == 2:
+                byte = lambda pos: ord(data[pos])
+            else:
+                byte = data.__getitem__
+            strong = signature.strong
+            # amount of new data allowed before a first match is found
+            budget = min(max_literal, probe_blocks * L)
+            known = set(strong)
+            for offset in range(0, size - L + 1, L):
+                if strong_checksum(data[offset:offset+L]) in known:
+                    budget = max_literal
+                    break
+            pos = start = 0
+            expected = None
+            weak = weak_checksum(data[0:L])
+            a, b = weak & 0xffff, weak >> 16
+            while pos + L <= size:
+                candidates = table.get(a | (b << 16))
+                if candidates:
+                    digest = strong_checksum(data[pos:pos+L])
+                    if expected in candidates and strong[expected] == digest:
+                        match = expected
+                    else:
+                        match = None
+                        for index in candidates:
+                            if strong[index] == digest:
+                                match = index
+                                break
+                    if match is not None:
+                        if start < pos:
+                            ops.append((start, pos))
+                            literal += pos - start
+                        if ops and isinstance(ops[-1], list) and \
+                                ops[-1][0] + ops[-1][1] == match:
+                            ops[-1][1] += 1
+                        else:
+                            ops.append([match, 1])
+                        expected = match + 1
+                        budget = max_literal
+                        pos = start = pos + L
+                        if pos + L <= size:
+                            weak = weak_checksum(data[pos:pos+L])
+                            a, b = weak & 0xffff, weak >> 16
+                        continue
+                if pos + L < size:
+                    out, new = byte(pos), byte(pos + L)
+                    a = (a - out + new) & 0xffff
+                    b = (b - L * out + a) & 0xffff
+                pos += 1
+                if budget < literal + pos - start:
+                    return False
+            if tail and size - start >= tail and \
+                    strong_checksum(data[size-tail:size]) == strong[-1]:
+                if start < size - tail:
+                    ops.append((start, size - tail))
+                    literal += size - tail - start
+                ops.append([len(strong) - 1, 1])
+            elif start < size:
+                ops.append((start, size))
+                literal += size - start
+            if max_literal < literal:
+                return False
+            # write the delta file; the manifest comes last, followed by its length
+            manifest = []
+            with open(delta_file, 'wb') as delta:
+                delta.write(_delta_header)
+                for op in ops:
+                    if isinstance(op, list):
+                        manifest.append(['c'] + op)
+                        continue
+                    for offset in range(op[0], op[1], L):
+                        chunk = cipher._encrypt(data[offset:min(offset+L, op[1])])
+                        manifest.append(['d', len(chunk)])
+                        delta.write(chunk)
+                manifest = cipher._encrypt(asbytes(json.dumps(dict(base=signature.checksum,
+                    block_size=L, size=size, ops=manifest))))
+                delta.write(manifest)
+                delta.write(_length.pack(len(manifest)))
+        finally:
+            data.close()
+    return True
+
+
+def apply_delta(base_file, delta_file, cipher, output_file):
+    """
+    Rebuild a file from the previous version and a delta file made by
+    :func:`make_delta`.
+
+    Arguments:
+
+        base_file (str): path to the previous version of the file.
+
+        delta_file (str): path to the delta file.
+
+        cipher (Cipher): encryption layer.
+
+        output_file (str): path to the file to be written.
+    """
+    with open(delta_file, 'rb') as delta:
+        if delta.read(len(_delta_header)) != _delta_header:
+            raise ValueError("not a delta file: '{}'".format(delta_file))
+        delta.seek(-_length.size, os.SEEK_END)
+        length, = _length.unpack(delta.read(_length.size))
+        delta.seek(-_length.size - length, os.SEEK_END)
+        manifest = json.loads(asstr(cipher._decrypt(delta.read(length))))
+        delta.seek(len(_delta_header))
+        L = manifest['block_size']
+        with open(base_file, 'rb') as base:
+            with open(output_file, 'wb') as f:
+                for op in manifest['ops']:
+                    if op[0] == 'c':
+                        _, index, count = op
+                        base.seek(index * L)
+                        remaining = count * L
+                        while 0 < remaining:
+                            block = base.read(min(L, remaining))
+                            if not block:
+                                break
+                            f.write(block)
+                            remaining -= len(block)
+                    else:
+                        f.write(cipher._decrypt(delta.read(op[1])))
+    if os.path.getsize(output_file) != manifest['size']:
+        raise ValueError("wrong size for patched file: '{}'".format(output_file))
+
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import os
+import re
+
+
+# backreferences cannot be renumbered when patterns are merged
+_backreference = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def merge_patterns(expressions):
+    """
+    Combine regular expressions into a single one.
+
+    ``merge_patterns(expressions).match(s)`` is equivalent to
+    ``any(exp.match(s) for exp in expressions)``.
+
+    Arguments:
+
+        expressions (list): compiled regular expressions.
+
+    Returns:
+
+        callable or None: `match`-like function, or ``None`` if `expressions` is empty.
+    """
+    if not expressions:
+        return None
+    if expressions[1:]:
+        if not any(_backreference.search(exp.pattern) for exp in expressions):
+            try:
+                return re.compile('|'.join([ '(?:{})'.format(exp.pattern)
+                    for exp in expressions ])).match
+            except re.error:
+                pass
+        def match(s):
+            for exp in expressions:
+                if exp.match(s):
+                    return True
+            return False
+        return match
+    else:
+        return expressions[0].match
+
+
+class FileFilter(object):
+    """
+    Compiled file selection rules.
+
+    Basename rules (file extensions, include and exclude patterns) are applied
+    in a single pass.
+    Decisions on directories are memoized.
+
+    Attributes:
+
+        filetype (frozenset): file extensions, with leading dot.
+
+        include (callable): `match`-like function for basenames to include.
+
+        exclude (callable): `match`-like function for basenames to exclude.
+
+        include_directory (callable): `match`-like function for directories to include.
+
+        exclude_directory (callable): `match`-like function for directories to exclude.
+
+    *new in 0.7.12*
+    """
+    __slots__ = [ 'filetype', 'include', 'exclude', 'include_directory', 'exclude_directory',
+        '_directories' ]
+
+    def __init__(self, filetype=[], include=None, exclude=None, include_directory=None,
+            exclude_directory=None):
+        self.filetype = frozenset(filetype) if filetype else None
+        self.include = merge_patterns(include)
+        self.exclude = merge_patterns(exclude)
+        self.include_directory = merge_patterns(include_directory)
+        self.exclude_directory = merge_patterns(exclude_directory)
+        self._directories = {}
+
+    def basename(self, f):
+        """
+        Tell if a file is to be selected.
+
+        Arguments:
+
+            f (str): file basename.
+
+        Returns:
+
+            bool: ``True`` if selected, ``False`` if rejected.
+        """
+        if self.filetype is not None and os.path.splitext(f)[1] not in self.filetype:
+            return False
+        if self.include is not None and not self.include(f):
+            return False
+        if self.exclude is not None and self.exclude(f):
+            return False
+        return True
+
+    def directory(self, dirname):
+        """
+        Tell if a directory is to be crawled.
+
+        Arguments:
+
+            dirname (str): directory name (relative path).
+
+        Returns:
+
+            bool: ``True`` if selected, ``False`` if rejected.
+        """
+        try:
+            return self._directories[dirname]
+        except KeyError:
+            ok = (self.include_directory is None or bool(self.include_directory(dirname))) \
+                and (self.exclude_directory is None or not self.exclude_directory(dirname))
+            self._directories[dirname] = ok
+            return ok
+
+    def path(self, f):
+        """
+        Tell if a file is to be selected, given its path.
+
+        Arguments:
+
+            f (str): file path.
+
+        Returns:
+
+            bool: ``True`` if selected, ``False`` if rejected.
+        """
+        dirname, basename = os.path.split(f)
+        return self.basename(basename) and self.directory(dirname)
+
+    def __call__(self, files):
+        """
+        Select file paths.
+
+        Arguments:
+
+            files (iterable): file paths.
+
+        Returns:
+
+            list: selected file paths.
+        """
+        return [ f for f in files if self.path(f) ]
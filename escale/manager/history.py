@@ -16,6 +16,7 @@ from escale.base.timer import Clock
 from escale.base.config import storage_space_unit
 import time
 import os
+import threading
 
 
 class TimeQuotaController(object):
@@ -62,13 +63,17 @@ class TimeQuotaController(object):
 			self.quota_read_callback = quota_read_callback
 		#self._max_space = None # attribute will be dynamically created
 		self._used_space = None
+		# threading.Event that interrupts `wait`
+		self.wakeup = None
+		# `push` may be called by several transfer workers; new in 0.7.12
+		self._lock = threading.Lock()
 
 	def wait(self):
 		if self.clock is None:
 			return False
 		else:
 			try:
-				self.clock.wait(self.logger)
+				self.clock.wait(self.logger, event=self.wakeup)
 			except StopIteration:
 				return False
 			else:
@@ -78,6 +83,10 @@ class TimeQuotaController(object):
 		return self
 
 	def push(self, local_file, callback=None):
+		with self._lock:
+			return self._push(local_file, callback)
+
+	def _push(self, local_file, callback=None):
 		# check disk usage
 		read_storage_space = True
 		if self.quota_read_interval:
@@ -97,11 +106,15 @@ class TimeQuotaController(object):
 			else:
 				quota = self.quota
 			if quota:
-				try: # if os.DirEntry
-					s = local_file.stat()
+				try: # if escale.manager.access.FileRecord
+					size = local_file.size
 				except AttributeError:
-					s = os.stat(local_file)
-				additional_space = float(s.st_size)
+					try: # if os.DirEntry
+						s = local_file.stat()
+					except AttributeError:
+						s = os.stat(local_file)
+					size = s.st_size
+				additional_space = float(size)
 				additional_space /= 1048576 # in MB
 				expected = self._used_space + additional_space
 				ok = expected < quota
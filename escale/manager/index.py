@@ -19,6 +19,7 @@
 from escale.base import *
 from .manager import Manager
 from ..base.config import storage_space_unit
+from ..base.compression import parse_codec, resolve_codec, sample_files, tarfile_mode
 from ..relay.info import Metadata, parse_metadata
 from ..relay.index import AbstractIndexRelay
 import os
@@ -43,7 +44,22 @@ class IndexManager(Manager):
             upload_max_wait = kwargs['config']['upload max wait']
         except KeyError:
             upload_max_wait = 600
+        archive_compression = kwargs.pop('archivecompression', None)
         Manager.__init__(self, relay, *args, **kwargs)
+        try:
+            self.archive_compression = parse_codec(archive_compression)
+        except ValueError as e:
+            self.logger.warning('%s; compressing archives with bz2', e)
+            self.archive_compression = 'bz2'
+        if self.transfer_pool is not None:
+            # pages are processed concurrently by the transfer workers,
+            # whose relays share the indices of the main relay; new in 0.7.12
+            make_relay = self.transfer_pool.make_relay
+            def make_index_relay():
+                _relay = make_relay()
+                self.relay.shareIndex(_relay)
+                return _relay
+            self.transfer_pool.make_relay = make_index_relay
         self.priority = None
         try:
             priority = kwargs['priority'].lower()
@@ -89,241 +105,223 @@ class IndexManager(Manager):
     def download(self):
         trust = self.pull_overwrite or (not self.timestamp and self.checksum is None)
         lookup_missing = self.download_idle
-        new = False
+        # pages are processed concurrently if there are transfer workers; new in 0.7.12
+        updated = []
         for page in self.shuffle(self.relay.listPages()):
-            index_loaded = self.relay.loaded(page)
-            # the first `getUpdate` call for a page returns a full index
-            # instead of an index update
-            try:
-                with self.relay.getUpdate(page, self.terminate, lookup_missing) as update:
-                    get_files = []
-                    for remote_file in update:
-                        dirname, basename = os.path.split(remote_file)
-                        if not self._filter(basename):
-                            if 'exclude' in self.onetime_log:
-                                self.onetime_log.add('exclude')
-                                self.logger.warn('incoming file ignored by basename')
-                            continue
-                        if dirname and not self._filter_directory(dirname):
-                            if 'exclude directory' in self.onetime_log:
-                                self.onetime_log.add('exclude directory')
-                                self.logger.warn('incoming file ignored by directory name')
+            self.transfer(self._downloadPage, page, trust, lookup_missing, updated)
+        self.transferred()
+        new = bool(updated)
+        new |= Manager.download(self)
+        # if the client is idle, then check for missing files at the next download phase
+        self.download_idle = not new
+        return new
+
+    def _downloadPage(self, relay, page, trust, lookup_missing, updated):
+        """
+        Download the update of a page, if any.
+
+        Arguments:
+
+            relay (IndexRelay): either the main relay or a transfer worker's relay.
+
+            page (str): page key/name.
+
+            trust (bool): whether remote files can overwrite local files with no checks.
+
+            lookup_missing (bool): whether to check for missing files.
+
+            updated (list): `page` is appended if files have been downloaded
+                or requested.
+
+        *new in 0.7.12*
+        """
+        # a worker's relay lists the relay repository at least as often
+        # as the main relay
+        relay.catchUpListing(self.relay)
+        index_loaded = relay.loaded(page)
+        # the first `getUpdate` call for a page returns a full index
+        # instead of an index update
+        try:
+            with relay.getUpdate(page, self.terminate, lookup_missing) as update:
+                get_files = []
+                select_file, select_directory = \
+                    self.file_filter.basename, self.file_filter.directory
+                for remote_file in update:
+                    dirname, basename = os.path.split(remote_file)
+                    if not select_file(basename):
+                        if 'exclude' in self.onetime_log:
+                            self.onetime_log.add('exclude')
+                            self.logger.warn('incoming file ignored by basename')
+                        continue
+                    if dirname and not select_directory(dirname):
+                        if 'exclude directory' in self.onetime_log:
+                            self.onetime_log.add('exclude directory')
+                            self.logger.warn('incoming file ignored by directory name')
+                        continue
+                    resource = remote_file
+                    local_file = self.repository.writable(resource, absolute=True)
+                    if not local_file:
+                        # update not allowed
+                        continue
+                    metadata = parse_metadata(update[remote_file])
+                    last_modified = None
+                    if metadata and metadata.timestamp:
+                        last_modified = metadata.timestamp
+                    elif self.timestamp:
+                        # if `timestamp` is `True` or is a format string,
+                        # then metadata should be defined
+                        self.logger.warning("corrupt meta information for file '%s'", remote_file)
+                    if (not trust or lookup_missing) and os.path.isfile(local_file):
+                        if trust and lookup_missing:
                             continue
-                        resource = remote_file
-                        local_file = self.repository.writable(resource, absolute=True)
-                        if not local_file:
-                            # update not allowed
+                        if not metadata:
+                            self.logger.warning("missing meta information for file '%s'", remote_file)
                             continue
-                        metadata = parse_metadata(update[remote_file])
-                        last_modified = None
-                        if metadata and metadata.timestamp:
-                            last_modified = metadata.timestamp
-                        elif self.timestamp:
-                            # if `timestamp` is `True` or is a format string,
-                            # then metadata should be defined
-                            self.logger.warning("corrupt meta information for file '%s'", remote_file)
-                        if (not trust or lookup_missing) and os.path.isfile(local_file):
-                            if trust and lookup_missing:
-                                continue
-                            if not metadata:
-                                self.logger.warning("missing meta information for file '%s'", remote_file)
-                                continue
-                            # calculate a checksum for the local file that corresponds to `resource`
-                            checksum, mtime = self.checksum(resource, True)
-                            # check for modifications
-                            if not metadata.fileModified(local_file, mtime, checksum, remote=True, debug=self.logger.debug):
-                                if index_loaded and not lookup_missing:
-                                    extracted_file = join(self.extraction_repository, remote_file)
-                                    self.logger.info("deleting duplicate or outdated file '%s'", remote_file)
-                                    try:
-                                        os.unlink(extracted_file)
-                                    except (IOError, OSError) as e:#FileNotFoundError:
-                                        # catch FileNotFoundError (does not exist in Python2)
-                                        if e.errno == errno.ENOENT:
-                                            self.logger.debug("file '%s' not found", extracted_file)
-                                        else:
-                                            raise
-                                continue
-
-                        get_files.append((remote_file, local_file, last_modified, metadata))
-                    if get_files:
-                        missing = []
-                        if self.relay.hasUpdate(page):
-                            new = True
-                            fd, archive = tempfile.mkstemp()
-                            try:
-                                os.close(fd)
-                                encrypted = self.encryption.prepare(archive)
-                                with self.tq_controller.pull(encrypted):
-                                    self.logger.debug("downloading update data for page '%s'", page)
-                                    self.relay.getUpdateData(page, encrypted)
-                                while not os.path.exists(encrypted):
-                                    pass
-                                self.encryption.decrypt(encrypted, archive)
-                                try:
-                                    with tarfile.open(archive, mode='r:bz2') as tar:
-                                        tar.extractall(self.extraction_repository)
-                                except Exception as e: # ReadError: not a bzip2 file
-                                    self.logger.error("%s", e)
-                                    missing = [ m for m, _, _, _ in get_files ]
-                                    get_files = []
-                            finally:
-                                os.unlink(archive)
-                        else:
-                            if trust and not index_loaded:
-                                missing = [ r for r, l, _, _ in get_files
-                                    if not os.path.exists(l) ]
-                            else:
-                                missing = [ m for m, _, _, _ in get_files ]
-                            get_files = []
-                        successful = []
-                        try:
-                            for remote, local, mtime, metadata in get_files:
-                                dirname = os.path.dirname(local)
-                                if dirname and not os.path.isdir(dirname):
-                                    os.makedirs(dirname)
-                                extracted = join(self.extraction_repository, remote)
+                        # calculate a checksum for the local file that corresponds to `resource`
+                        checksum, mtime = self.checksum(resource, True)
+                        # check for modifications
+                        if not metadata.fileModified(local_file, mtime, checksum, remote=True, debug=self.logger.debug):
+                            if index_loaded and not lookup_missing:
+                                extracted_file = join(self.extraction_repository, remote_file)
+                                self.logger.info("deleting duplicate or outdated file '%s'", remote_file)
                                 try:
-                                    shutil.move(extracted, local)
-                                except IOError as e:#FileNotFoundError:
+                                    os.unlink(extracted_file)
+                                except (IOError, OSError) as e:#FileNotFoundError:
                                     # catch FileNotFoundError (does not exist in Python2)
                                     if e.errno == errno.ENOENT:
-                                        self.logger.debug("file '%s' not found", extracted)
-                                        #self.logger.info("failed to download file '%s'", remote)
-                                        missing.append(remote)
+                                        self.logger.debug("file '%s' not found", extracted_file)
                                     else:
                                         raise
-                                else:
-                                    #self.logger.info("file '%s' successfully downloaded", remote)
-                                    successful.append(remote)
-                                    if mtime:
-                                        if self.checksum_cache is not None \
-                                            and metadata and metadata.checksum:
-                                            resource = remote
-                                            self.checksum_cache[resource] = (mtime, metadata.checksum)
-                                        # set last modification time
-                                        os.utime(local, (time.time(), mtime))
+                            continue
+
+                    get_files.append((remote_file, local_file, last_modified, metadata))
+                if get_files:
+                    missing = []
+                    if relay.hasUpdate(page):
+                        updated.append(page)
+                        fd, archive = tempfile.mkstemp()
+                        try:
+                            os.close(fd)
+                            encrypted = self.encryption.prepare(archive)
+                            with self.tq_controller.pull(encrypted):
+                                self.logger.debug("downloading update data for page '%s'", page)
+                                relay.getUpdateData(page, encrypted)
+                            while not os.path.exists(encrypted):
+                                pass
+                            self.encryption.decrypt(encrypted, archive)
+                            try:
+                                # the compression codec is identified by tarfile
+                                with tarfile.open(archive, mode=tarfile_mode('r', None)) as tar:
+                                    tar.extractall(self.extraction_repository)
+                            except Exception as e: # ReadError: not a tar file
+                                self.logger.error("%s", e)
+                                missing = [ m for m, _, _, _ in get_files ]
+                                get_files = []
                         finally:
-                            self.reportTransferred('download', successful)
-                        if missing:
-                            new = True # do not consider the local repository up-to-date
-                            self.relay.requestMissing(page, missing)
-            except (PostponeRequest, MissingResource) as e:
-                if e.args:
-                    self.logger.debug(*e.args)
-        new |= Manager.download(self)
-        # if the client is idle, then check for missing files at the next download phase
-        self.download_idle = not new
-        return new
+                            os.unlink(archive)
+                    else:
+                        if trust and not index_loaded:
+                            missing = [ r for r, l, _, _ in get_files
+                                if not os.path.exists(l) ]
+                        else:
+                            missing = [ m for m, _, _, _ in get_files ]
+                        get_files = []
+                    successful = []
+                    try:
+                        for remote, local, mtime, metadata in get_files:
+                            dirname = os.path.dirname(local)
+                            if dirname and not os.path.isdir(dirname):
+                                os.makedirs(dirname)
+                            extracted = join(self.extraction_repository, remote)
+                            try:
+                                shutil.move(extracted, local)
+                            except IOError as e:#FileNotFoundError:
+                                # catch FileNotFoundError (does not exist in Python2)
+                                if e.errno == errno.ENOENT:
+                                    self.logger.debug("file '%s' not found", extracted)
+                                    #self.logger.info("failed to download file '%s'", remote)
+                                    missing.append(remote)
+                                else:
+                                    raise
+                            else:
+                                #self.logger.info("file '%s' successfully downloaded", remote)
+                                successful.append(remote)
+                                if mtime:
+                                    if self.checksum_cache is not None \
+                                        and metadata and metadata.checksum:
+                                        resource = remote
+                                        self.checksum_cache[resource] = (mtime, metadata.checksum)
+                                    # set last modification time
+                                    os.utime(local, (time.time(), mtime))
+                    finally:
+                        self.reportTransferred('download', successful)
+                    if missing:
+                        # do not consider the local repository up-to-date
+                        updated.append(page)
+                        relay.requestMissing(page, missing)
+        except (PostponeRequest, MissingResource) as e:
+            if e.args:
+                self.logger.debug(*e.args)
+
+    def archiveCompression(self, files):
+        """
+        Compression codec for an update archive.
+
+        In `auto` mode, the files are sampled and the archive is compressed with
+        gzip only if the samples are found compressible, e.g. not images or archives.
+
+        Arguments:
+
+            files (list): paths to the files to be archived.
+
+        Returns:
+
+            str: codec name.
+
+        *new in 0.7.12*
+        """
+        codec = resolve_codec(self.archive_compression, sample_files(files))
+        if self.archive_compression == 'auto' and 1 < self.verbosity:
+            self.logger.debug("compressing archive with codec '%s'", codec)
+        return codec
+
+    def regroup(self, indexed):
+        """
+        Group the records to be uploaded by page again.
+
+        *new in 0.7.12*
+        """
+        regrouped = defaultdict(list)
+        for page in indexed:
+            for record in indexed[page]:
+                regrouped[self.relay.page(record.path)].append(record)
+        return regrouped
 
     def upload(self):
         new = False
         indexed = defaultdict(list)
         not_indexed = []
-        for resource in self.localFiles():
-            remote_file = resource
+        for record in self.localFileRecords():
+            remote_file = record.path
             if self.relay.indexed(remote_file):
-                indexed[self.relay.page(remote_file)].append(resource)
+                indexed[self.relay.page(remote_file)].append(record)
             else:
-                not_indexed.append(resource)
+                not_indexed.append(record)
+        self.precomputeChecksums([ r for p in indexed for r in indexed[p] ] + not_indexed)
         local_file_count = {p: len(indexed[p]) for p in indexed}
         if 1 < self.verbosity:
             self.logger.debug('upload has listed %s local files', sum(local_file_count.values()))
         #
         t0 = None
         while True:
-            any_page_update, any_postponed = False, False
+            outcome = {}
             for page in indexed:
-                #self.logger.debug("page '%s'", page)
-                pushed = []
-                fd, archive = tempfile.mkstemp()
-                os.close(fd)
-                tmpdir = tempfile.mkdtemp()
-                try:
-                    with self.relay.setUpdate(page) as update:
-                        try:
-                            page_index = self.relay.getPageIndex(page)
-                        except MissingResource:
-                            self.logger.error('missing page index')
-                            self.relay.remoteListing()
-                            update = {}
-                            page_index = {}
-                        if 0 < self.verbosity:
-                            self.logger.debug("page '%s' has %s entries (locally: %s)",
-                                page, len(page_index), len(indexed[page]))
-                        size = 0
-                        for n, resource in enumerate(indexed[page]):
-                            remote_file = resource
-                            local_file = self.repository.absolute(resource)
-                            try:
-                                checksum, last_modified = self.checksum(resource, return_mtime=True)
-                            except OSError as e: # file unlinked since last call to localFiles?
-                                self.logger.debug('%s', e)
-                                continue
-                            try:
-                                page_metadata = parse_metadata(page_index[remote_file])
-                            except KeyError:
-                                pass
-                            else:
-                                if (self.timestamp or self.hash_function) and \
-                                        not page_metadata.fileModified(local_file, last_modified, \
-                                            checksum, remote=False, debug=self.logger.debug):
-                                    continue
-                            metadata = Metadata(target=remote_file, timestamp=last_modified, checksum=checksum, pusher=self.relay.client)
-                            # add to the archive
-                            new = True
-                            dirname = os.path.dirname(resource)
-                            if dirname:
-                                dirname = '/'.join((tmpdir, dirname))
-                            else:
-                                dirname = tmpdir
-                            if not os.path.exists(dirname):
-                                os.makedirs(dirname)
-                            local_copy = '/'.join((tmpdir, resource))
-                            shutil.copy2(local_file, local_copy)
-                            # add to the update index
-                            update[remote_file] = metadata
-                            pushed.append(remote_file)
-                            # check the update data size
-                            size += float(os.stat(local_copy).st_size) / 1048576.
-                            if self.max_page_size < size:
-                                if 1 < self.verbosity:
-                                    self.logger.debug('the update cannot be larger (%s < %s)', \
-                                        self.max_page_size, size)
-                                break
-                        if update:
-                            with tarfile.open(archive, mode='w:bz2') as tar:
-                                for f in os.listdir(tmpdir):
-                                    tar.add('/'.join((tmpdir, f)), arcname=f, recursive=True)
-                            final_file = self.encryption.encrypt(archive)
-                            while True:
-                                try:
-                                    with self.tq_controller.push(archive):
-                                        self.logger.debug("uploading update data for page '%s'", page)
-                                        self.relay.setUpdateData(page, final_file)
-                                except QuotaExceeded as e:
-                                    self.logger.info("%s; no more files can be sent", e)
-                                    if not self.tq_controller.wait():
-                                        raise
-                                else:
-                                    break
-                            self.encryption.finalize(final_file)
-                        indexed[page] = indexed[page][n+1:]
-                    any_page_update = bool(pushed)
-                except PostponeRequest:
-                    any_postponed = True
-                    pushed = []
-                    continue
-                except: # new in 0.9.10
-                    pushed = []
-                    raise
-                finally:
-                    if pushed:
-                        self.reportTransferred('upload', pushed)
-                        #for resource in pushed:
-                        #    self.logger.info("file '%s' successfully uploaded", resource)
-                    shutil.rmtree(tmpdir)
-                    os.unlink(archive)
+                self.transfer(self._uploadPage, page, indexed, outcome)
+            self.transferred()
+            if any( new for _, new in outcome.values() ):
+                new = True
+            any_page_update = any( o == 'updated' for o, _ in outcome.values() )
+            any_postponed = any( o == 'postponed' for o, _ in outcome.values() )
 
             if self.mode == 'upload' or self.priority == 'upload':
                 indexed = { page: files for page, files in indexed.items() if files }
@@ -371,17 +369,26 @@ class IndexManager(Manager):
                 #for page in indexed:
                 #    self.relay.loaded(page)
                 self.remoteListing()
+                # pages may have been split in the meantime; new in 0.7.12
+                indexed = self.regroup(indexed)
+                for p in indexed:
+                    local_file_count.setdefault(p, len(indexed[p]))
+        # files from pages that could not be updated yet
+        for page in indexed:
+            for record in indexed[page]:
+                self.retryLater(record.path)
         #
         if not_indexed:
             remote = self.relay.listTransferred('', end2end=False)
-        for resource in not_indexed:
+        for record in not_indexed:
+            resource = record.path
             remote_file = resource
             local_file = self.repository.absolute(resource)
             if PYTHON_VERSION == 2 and isinstance(remote_file, unicode) and \
                 remote and isinstance(remote[0], str):
                 remote_file = remote_file.encode('utf-8')
             exists = remote_file in remote
-            checksum = self.checksum(resource)
+            checksum = self.checksum(record)
             modified = False # if no remote copy, this is ignored
             if (self.timestamp or self.hash_function) and exists:
                 # check file last modification time and checksum
@@ -395,28 +402,131 @@ class IndexManager(Manager):
                     # this may not be true, but this will update the meta
                     # information with a valid content.
             if not exists or modified:
-                with self.repository.confirmPush(resource):
-                    new = True
+                new = True
+                try:
+                    last_modified, _ = self.checksum_cache[resource]
+                except (TypeError, KeyError):
+                    last_modified = record.mtime
+                self.pushFile(resource, remote_file, local_file, checksum, last_modified,
+                        record=record)
+        self.transferred()
+        return new
+
+    def _uploadPage(self, relay, page, indexed, outcome):
+        """
+        Push the pending files of a page as an update, within the page size limit.
+
+        Arguments:
+
+            relay (IndexRelay): either the main relay or a transfer worker's relay.
+
+            page (str): page key/name.
+
+            indexed (dict): pending records by page; ``indexed[page]`` is replaced
+                by the records that remain to be checked.
+
+            outcome (dict): (status, new) pair for `page`, where status is any of
+                *'updated'*, *'postponed'* or ``None``, and new is ``True`` if files
+                have been pushed.
+
+        *new in 0.7.12*
+        """
+        relay.catchUpListing(self.relay)
+        new = False
+        outcome[page] = (None, new)
+        pushed = []
+        fd, archive = tempfile.mkstemp()
+        os.close(fd)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with relay.setUpdate(page) as update:
+                try:
+                    page_index = relay.getPageIndex(page)
+                except MissingResource:
+                    self.logger.error('missing page index')
+                    relay.remoteListing()
+                    update = {}
+                    page_index = {}
+                if 0 < self.verbosity:
+                    self.logger.debug("page '%s' has %s entries (locally: %s)",
+                        page, len(page_index), len(indexed[page]))
+                size = 0
+                local_copies = []
+                for n, record in enumerate(indexed[page]):
+                    resource = record.path
+                    remote_file = resource
+                    local_file = self.repository.absolute(resource)
                     try:
-                        last_modified, _ = self.checksum_cache[resource]
-                    except (TypeError, KeyError):
-                        last_modified = os.path.getmtime(local_file)
-                    temp_file = self.encryption.encrypt(local_file)
-                    self.logger.info("uploading file '%s'", remote_file)
+                        checksum, last_modified = self.checksum(record, return_mtime=True)
+                    except OSError as e: # file unlinked since last call to localFiles?
+                        self.logger.debug('%s', e)
+                        continue
                     try:
-                        with self.tq_controller.push(local_file):
-                            ok = self.relay.push(temp_file, remote_file, blocking=False,
-                                last_modified=last_modified, checksum=checksum)
-                    except QuotaExceeded as e:
-                        self.logger.info("%s; no more files can be sent", e)
-                        ok = False
-                    finally:
-                        self.encryption.finalize(temp_file)
-                    if ok:
-                        self.logger.debug("file '%s' successfully uploaded", remote_file)
-                    elif ok is not None:
-                        self.logger.warning("failed to upload '%s'", remote_file)
-        return new
+                        page_metadata = parse_metadata(page_index[remote_file])
+                    except KeyError:
+                        pass
+                    else:
+                        if (self.timestamp or self.hash_function) and \
+                                not page_metadata.fileModified(local_file, last_modified, \
+                                    checksum, remote=False, debug=self.logger.debug):
+                            continue
+                    metadata = Metadata(target=remote_file, timestamp=last_modified, checksum=checksum, pusher=relay.client)
+                    # add to the archive
+                    new = True
+                    dirname = os.path.dirname(resource)
+                    if dirname:
+                        dirname = '/'.join((tmpdir, dirname))
+                    else:
+                        dirname = tmpdir
+                    if not os.path.exists(dirname):
+                        os.makedirs(dirname)
+                    local_copy = '/'.join((tmpdir, resource))
+                    shutil.copy2(local_file, local_copy)
+                    local_copies.append(local_copy)
+                    # add to the update index
+                    update[remote_file] = metadata
+                    pushed.append(remote_file)
+                    # check the update data size
+                    size += float(os.stat(local_copy).st_size) / 1048576.
+                    if self.max_page_size < size:
+                        if 1 < self.verbosity:
+                            self.logger.debug('the update cannot be larger (%s < %s)', \
+                                self.max_page_size, size)
+                        break
+                if update:
+                    codec = self.archiveCompression(local_copies)
+                    with tarfile.open(archive, mode=tarfile_mode('w', codec)) as tar:
+                        for f in os.listdir(tmpdir):
+                            tar.add('/'.join((tmpdir, f)), arcname=f, recursive=True)
+                    final_file = self.encryption.encrypt(archive)
+                    while True:
+                        try:
+                            with self.tq_controller.push(archive):
+                                self.logger.debug("uploading update data for page '%s'", page)
+                                relay.setUpdateData(page, final_file)
+                        except QuotaExceeded as e:
+                            self.logger.info("%s; no more files can be sent", e)
+                            if not self.tq_controller.wait():
+                                raise
+                        else:
+                            break
+                    self.encryption.finalize(final_file)
+                indexed[page] = indexed[page][n+1:]
+            if pushed:
+                outcome[page] = ('updated', new)
+        except PostponeRequest:
+            outcome[page] = ('postponed', new)
+            pushed = []
+        except: # new in 0.9.10
+            pushed = []
+            raise
+        finally:
+            if pushed:
+                self.reportTransferred('upload', pushed)
+                #for resource in pushed:
+                #    self.logger.info("file '%s' successfully uploaded", resource)
+            shutil.rmtree(tmpdir)
+            os.unlink(archive)
 
     def localFiles(self, path=None):
         return Manager.localFiles(self, path)
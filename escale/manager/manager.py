@@ -25,12 +25,23 @@ import os
 import sys
 import traceback
 import re
+import shutil
+import tempfile
 from escale.base import *
 from escale.base.config import storage_space_unit
 from escale.encryption.encryption import Plain
 from .history import TimeQuotaController
 from .cache import *
-import hashlib
+from .access import FileRecord
+from .filters import FileFilter
+from .delta import Signature, make_delta, apply_delta, default_delta_block_size
+from .transfer import TransferPool
+from escale.relay.multipart import PartPool
+from escale.base.hashing import Hash
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError: # Python 2 without the `futures` backport
+    ProcessPoolExecutor = None
 
 
 class Manager(Reporter):
@@ -81,19 +92,35 @@ class Manager(Reporter):
 
         verbosity (int): 2 or higher makes Escale so verbose that it can make the entire OS freeze.
 
+        transfer_workers (int): number of concurrent file transfers;
+            each transfer worker opens its own connection to the relay host.
+
+        checksum_workers (int): number of processes that compute the checksums
+            of the local files missing in the checksum cache, before upload.
+
+        part_pool (PartPool): extra relay connections for the concurrent transfer
+            of the parts of large files.
+
+        delta_transfer (bool): if ``True``, modified files are sent as deltas
+            against the previous version; requires a checksum cache file.
+
         relay_args (dict): extra keyword arguments for
             :meth:`~escale.relay.AbstractRelay.pop`.
 
     *new in 0.7.1:* `checksum_cache`
     *new in 0.7.4:* `wait_on_error`
     *new in 0.7.6:* `verbosity`
+    *new in 0.7.12:* `transfer_workers`, `checksum_workers`, `part_pool`,
+    `delta_transfer`; the checksum cache is written to disk at the end of each download
+    and upload phase
 
     """
     def __init__(self, relay, repository=None, address=None, directory=None, \
         encryption=Plain(None), timestamp=True, refresh=True, clientname=None, \
         filetype=[], include=None, exclude=None, tq_controller=None, count=None, \
         checksum=True, checksum_cache=None, includedirectory=None, excludedirectory=None, \
-        waitonerror=[], verbosity=1, **relay_args):
+        waitonerror=[], verbosity=1, transferworkers=None, checksumworkers=None, \
+        checksumflushinterval=None, deltatransfer=False, **relay_args):
         Reporter.__init__(self, **relay_args)
         self.repository = repository
         if directory:
@@ -107,12 +134,8 @@ class Manager(Reporter):
             if isinstance(checksum, (bool, int)):
                 # poor default algorithm for compatibility with Python<3.6 clients
                 checksum = 'sha512'
-            def hash_function(data):
-                h = hashlib.new(checksum)
-                h.update(asbytes(data))
-                return h.hexdigest()
             try:
-                hashlib.new(checksum)
+                hash_function = Hash(checksum)
             except ValueError:
                 self.logger.warning("unsupported hash algorithm: '%s'", checksum)
                 self.logger.warning('checksum support deactivated')
@@ -125,7 +148,7 @@ class Manager(Reporter):
         else:
             self.hash_function = None
         if self.hash_function:
-            if checksum_cache:
+            if checksum_cache or isinstance(checksum_cache, dict): # may be empty
                 if isinstance(checksum_cache, bool):
                     self.logger.debug("Warning! The checksum cache will be loaded following Escale's default configuration file")
                     checksum_cache = find_checksum_cache(self.repository.name)
@@ -133,10 +156,21 @@ class Manager(Reporter):
                     self.checksum_cache = read_checksum_cache(checksum_cache)#ChecksumCache(checksum_cache)
                 else:
                     self.checksum_cache = checksum_cache
+                if checksumflushinterval is not None \
+                        and hasattr(self.checksum_cache, 'flush_interval'):
+                    self.checksum_cache.flush_interval = checksumflushinterval
             else:
                 self.checksum_cache = {}
         else:
             self.checksum_cache = None
+        self.delta_transfer = False
+        if deltatransfer:
+            if hasattr(self.checksum_cache, 'getSignature'):
+                self.delta_transfer = True
+            else:
+                self.logger.warning('delta transfer requires a checksum cache file; deactivated')
+        self.checksum_workers = checksumworkers
+        self.checksum_batch_size = 1000
         self.tq_controller = tq_controller
         if filetype:
             self.filetype = [ f if f[0] == '.' else '.' + f
@@ -219,14 +253,63 @@ class Manager(Reporter):
                 except:
                     self.logger.error("wrong directory name pattern '%s'", exp)
                     self.logger.debug(traceback.format_exc())
+        self.file_filter = FileFilter(self.filetype, self.include, self.exclude,
+                self.include_directory, self.exclude_directory)
         self.pop_args = {}
         arg_map = [('locktimeout', 'lock_timeout'),
-            ('maxpendingtransfers', 'max_pending_transfers')]
+            ('maxpendingtransfers', 'max_pending_transfers'),
+            ('incrementallisting', 'incremental_listing'),
+            ('etagpropagation', 'etag_propagation'),
+            ('changejournal', 'change_journal'),
+            ('placeholdercache', 'placeholder_cache'),
+            ('resumabletransfers', 'transfer_journal'),
+            ('indexformat', 'index_format'),
+            ('indexcompression', 'index_compression'),
+            ('indexjournal', 'index_journal')]
         for cfg_arg, rel_arg in arg_map:
             if cfg_arg in relay_args:
                 relay_args[rel_arg] = relay_args.pop(cfg_arg)
         self.max_pending_transfers = relay_args.pop('max_pending_transfers', None)
-        self.relay = relay(clientname, address, directory, **relay_args)
+        part_size = relay_args.pop('partsize', None)
+        if isinstance(part_size, tuple):
+            part_size, part_size_unit = part_size
+            if part_size_unit:
+                part_size = part_size * storage_space_unit[part_size_unit] * 1048576
+        if part_size:
+            relay_args['part_size'] = int(part_size)
+        part_workers = relay_args.pop('partworkers', None)
+        # the transfer journal is opened once and shared
+        transfer_journal = relay_args.pop('transfer_journal', None)
+        self.relay = relay(clientname, address, directory,
+                transfer_journal=transfer_journal, **relay_args)
+        change_journal = getattr(self.relay, 'change_journal', None)
+        placeholder_cache = getattr(self.relay, 'placeholder_cache', None)
+        transfer_journal = getattr(self.relay, 'transfer_journal', None)
+        def make_relay():
+            _relay = relay(clientname, address, directory, **relay_args)
+            if change_journal is not None:
+                # all the transfers are recorded in a single stream
+                _relay.change_journal = change_journal
+            if placeholder_cache is not None:
+                _relay.placeholder_cache = placeholder_cache
+            if transfer_journal is not None:
+                _relay.transfer_journal = transfer_journal
+            if self.part_pool is not None:
+                _relay.part_pool = self.part_pool
+            return _relay
+        self.part_pool = None
+        if part_workers and 1 < part_workers:
+            # the parts of large files are transferred by extra connections,
+            # shared by the main relay and the transfer workers
+            self.part_pool = PartPool(part_workers,
+                    lambda: relay(clientname, address, directory, **relay_args),
+                    logger=self.logger)
+            self.relay.part_pool = self.part_pool
+        self.transfer_workers = transferworkers
+        self.transfer_pool = None
+        if transferworkers and 1 < transferworkers:
+            self.transfer_pool = TransferPool(transferworkers, make_relay,
+                    logger=self.logger)
         if tq_controller is None:
             self.tq_controller = TimeQuotaController(refresh, logger=self.logger)
         self.tq_controller.quota_read_callback = self.relay.storageSpace
@@ -291,6 +374,18 @@ class Manager(Reporter):
             raise
         else:
             self.logger.debug('connected')
+        watcher = self.repository.watcher
+        if watcher is not None and self.mode != 'download':
+            try:
+                watcher.start()
+            except OSError as e:
+                self.logger.warning('cannot watch the local repository: %s', e)
+                watcher = None
+            else:
+                self.logger.debug('watching the local repository')
+                self.tq_controller.wakeup = watcher.changed
+        else:
+            watcher = None
         # initial state
         _check_sanity = True
         _fresh_start = True
@@ -306,8 +401,14 @@ class Manager(Reporter):
                     _check_sanity = False
                 if self.mode != 'upload':
                     new |= self.download()
+                    self.flushChecksumCache()
+                    self.flushChanges()
+                    self.flushPlaceholderCache()
                 if self.mode != 'download':
                     new |= self.upload()
+                    self.flushChecksumCache()
+                    self.flushChanges()
+                    self.flushPlaceholderCache()
                 if _fresh_start:
                     if not new:
                         self.logger.info('repository is up to date')
@@ -318,12 +419,20 @@ class Manager(Reporter):
                 if not self.tq_controller.wait():
                     break
             except ExpressInterrupt:
+                self.flushChecksumCache()
+                self.flushChanges()
+                self.flushPlaceholderCache()
                 raise
             except PostponeRequest as e:
                 if e.args:
                     self.logger.debug(*e.args)
+                if watcher is not None:
+                    # some dirty files may not have been processed
+                    watcher.requestFullScan()
                 self.tq_controller.wait()
             except Exception as e:
+                if watcher is not None:
+                    watcher.requestFullScan()
                 t = time.time()
                 wait = False
                 # break on fast self-repeating errors
@@ -365,6 +474,16 @@ class Manager(Reporter):
                 else:
                     self.logger.critical(traceback.format_exc())
         # close and clear everything
+        if watcher is not None:
+            watcher.stop()
+            self.tq_controller.wakeup = None
+        if self.transfer_pool is not None:
+            self.transfer_pool.close()
+        if self.part_pool is not None:
+            self.part_pool.close()
+        self.flushChecksumCache()
+        self.flushChanges()
+        self.flushPlaceholderCache()
         try:
             self.relay.close()
         except:
@@ -392,17 +511,7 @@ class Manager(Reporter):
 
             list: list of selected file paths from ``files``.
         """
-        if self.filetype:
-            files = [ f for f in files if os.path.splitext(f)[1] in self.filetype ]
-        if self.include:
-            files = [ f for f in files if any([ exp.match(os.path.basename(f)) for exp in self.include ]) ]
-        if self.exclude:
-            files = [ f for f in files if not any([ exp.match(os.path.basename(f)) for exp in self.exclude ]) ]
-        if self.include_directory:
-            files = [ f for f in files if any([ exp.match(os.path.dirname(f)) for exp in self.include_directory ]) ]
-        if self.exclude_directory:
-            files = [ f for f in files if not any([ exp.match(os.path.dirname(f)) for exp in self.exclude_directory ]) ]
-        return files
+        return self.file_filter(files)
 
     def _filter(self, f):
         """
@@ -416,14 +525,7 @@ class Manager(Reporter):
 
             bool: ``True`` if selected, ``False`` if rejected.
         """
-        ok = True
-        if self.filetype:
-            ok = os.path.splitext(f)[1] in self.filetype
-        if ok and self.include:
-            ok = any([ exp.match(f) for exp in self.include ])
-        if ok and self.exclude:
-            ok = not any([ exp.match(f) for exp in self.exclude ])
-        return ok
+        return self.file_filter.basename(f)
 
     def _filter_directory(self, dirname):
         """
@@ -437,12 +539,7 @@ class Manager(Reporter):
 
             bool: ``True`` if selected, ``False`` if rejected.
         """
-        ok = True
-        if ok and self.include_directory:
-            ok = any([ exp.match(dirname) for exp in self.include_directory ])
-        if ok and self.exclude_directory:
-            ok = not any([ exp.match(dirname) for exp in self.exclude_directory ])
-        return ok
+        return self.file_filter.directory(dirname)
 
     def sanityChecks(self):
         """
@@ -461,6 +558,7 @@ class Manager(Reporter):
         Finds out which files are to be downloaded and download them.
         """
         remote = self.filter(self.relay.listReady())
+        self.prefetchMetadata(remote)
         new = False
         for remote_file in remote:
             resource = remote_file
@@ -469,6 +567,7 @@ class Manager(Reporter):
                 # update not allowed
                 continue
             meta = self.relay.getMetadata(remote_file, timestamp_format=self.timestamp)
+            checksum = None
             last_modified = None
             if self.timestamp:
                 if meta and meta.timestamp:
@@ -497,32 +596,19 @@ class Manager(Reporter):
                 msg = "updating local file '%s'"
             else:
                 msg = "downloading file '%s'"
-            with self.repository.confirmPull(resource):
-                new = True
-                temp_file = self.encryption.prepare(local_file)
-                self.logger.info(msg, resource)
-                try:
-                    with self.tq_controller.pull(temp_file):
-                        ok = self.relay.pop(remote_file, temp_file, blocking=False, **self.pop_args)
-                    if not ok:
-                        raise RuntimeError
-                except RuntimeError: # TODO: define specific exceptions
-                    ok = False
-                if ok:
-                    self.logger.debug("file '%s' successfully downloaded", resource)
-                elif ok is not None:
-                    self.logger.error("failed to download '%s'", resource)
+            if meta and meta.delta:
+                if not checksum or asstr(checksum) != asstr(meta.delta):
+                    # the delta does not apply to the local copy
+                    self.logger.info("requesting the full content of file '%s'", remote_file)
+                    self.relay.rejectDelta(remote_file)
                     continue
-                self.encryption.decrypt(temp_file, local_file)
-                if last_modified:
-                    # handle delay on file creation
-                    first_time = True
-                    while not os.path.exists(local_file):
-                        if first_time:
-                            self.logger.debug('local file not ready: %s', local_file)
-                            first_time = False
-                    # set last modification time
-                    os.utime(local_file, (time.time(), last_modified))
+                msg = "updating local file '%s' from delta"
+            else:
+                meta = None
+            new = True
+            self.transfer(self._downloadFile, resource, remote_file, local_file,
+                    last_modified, msg, meta)
+        self.transferred()
         return new
 
     def upload(self):
@@ -533,16 +619,20 @@ class Manager(Reporter):
         if self.max_pending_transfers:
             if self.max_pending_transfers <= self.relay.listReady():
                 return new
-        local = self.localFiles()
+        local = list(self.localFileRecords())
+        self.precomputeChecksums(local)
         remote = self.relay.listTransferred('', end2end=False)
-        for resource in local:
+        if self.timestamp or self.hash_function:
+            self.prefetchMetadata([ record.path for record in local ])
+        for record in local:
+            resource = record.path
             remote_file = resource
             local_file = self.repository.absolute(resource)
             if PYTHON_VERSION == 2 and isinstance(remote_file, unicode) and \
                 remote and isinstance(remote[0], str):
                 remote_file = remote_file.encode('utf-8')
             try:
-                checksum = self.checksum(resource)
+                checksum = self.checksum(record)
             except OSError as e: # file unlinked since last call to localFiles?
                 self.logger.warning('%s', e)
                 continue
@@ -559,44 +649,456 @@ class Manager(Reporter):
                     # this may not be true, but this will update the meta
                     # information with a valid content.
             if not exists or modified:
-                with self.repository.confirmPush(resource):
-                    new = True
-                    last_modified = os.path.getmtime(local_file)
-                    temp_file = self.encryption.encrypt(local_file)
-                    self.logger.info("uploading file '%s'", resource)
-                    try:
-                        with self.tq_controller.push(local_file):
-                            ok = self.relay.push(temp_file, remote_file, blocking=False,
-                                last_modified=last_modified, checksum=checksum)
-                    except QuotaExceeded as e:
-                        self.logger.info("%s; no more files can be sent", e)
-                        ok = False
-                    finally:
-                        self.encryption.finalize(temp_file)
-                    if ok:
-                        self.logger.debug("file '%s' successfully uploaded", resource)
-                    elif ok is not None:
-                        self.logger.warning("failed to upload '%s'", resource)
+                new = True
+                last_modified = record.mtime
+                self.pushFile(resource, remote_file, local_file, checksum, last_modified,
+                        record=record)
+        self.transferred()
         return new
 
+    def prefetchMetadata(self, remote_files):
+        """
+        Download in parallel the placeholders that are missing in the placeholder
+        cache, before the files are considered one at a time.
+
+        This is a no-op unless `transfer_workers` is greater than 1.
+        The placeholders are downloaded by the transfer workers, which share
+        the placeholder cache of the main relay.
+
+        Arguments:
+
+            remote_files (list): paths to regular files on the remote host.
+
+        *new in 0.7.12*
+        """
+        if self.transfer_pool is None:
+            return
+        try:
+            stale = self.relay.stalePlaceholders(remote_files)
+        except AttributeError:
+            return
+        if not stale:
+            return
+        self.logger.debug('prefetching %s placeholders', len(stale))
+        for remote_file in stale:
+            self.transfer_pool.submit(self._prefetchMetadata, remote_file)
+        self.transferred()
+
+    def _prefetchMetadata(self, relay, remote_file):
+        try:
+            relay.fetchMetadata(remote_file, timestamp_format=self.timestamp)
+        except ExpressInterrupt:
+            raise
+        except Exception as e:
+            # `getMetadata` will try again
+            self.logger.debug("cannot prefetch the placeholder for '%s': %s", remote_file, e)
+
+    def transfer(self, func, *args):
+        """
+        Run a file transfer, either immediately with the main relay connection or
+        in a transfer worker with the worker's relay connection.
+
+        Arguments:
+
+            func (callable): takes a relay object as first input argument,
+                followed by `args`.
+        """
+        if self.transfer_pool is None:
+            func(self.relay, *args)
+        else:
+            self.transfer_pool.submit(func, *args)
+
+    def transferred(self):
+        """
+        Wait for the pending transfers to complete.
+        """
+        if self.transfer_pool is not None:
+            self.transfer_pool.join()
+
+    def _downloadFile(self, relay, resource, remote_file, local_file, last_modified, msg,
+            delta=None):
+        if delta is not None:
+            self._downloadDelta(relay, resource, remote_file, local_file, last_modified,
+                    msg, delta)
+            return
+        with self.repository.confirmPull(resource):
+            temp_file = self.encryption.prepare(local_file)
+            self.logger.info(msg, resource)
+            try:
+                with self.tq_controller.pull(temp_file):
+                    ok = relay.pop(remote_file, temp_file, blocking=False, **self.pop_args)
+                if not ok:
+                    raise RuntimeError
+            except RuntimeError: # TODO: define specific exceptions
+                ok = False
+            if ok:
+                self.logger.debug("file '%s' successfully downloaded", resource)
+            elif ok is not None:
+                self.logger.error("failed to download '%s'", resource)
+                return
+            self.encryption.decrypt(temp_file, local_file)
+            if last_modified:
+                # handle delay on file creation
+                first_time = True
+                while not os.path.exists(local_file):
+                    if first_time:
+                        self.logger.debug('local file not ready: %s', local_file)
+                        first_time = False
+                # set last modification time
+                os.utime(local_file, (time.time(), last_modified))
+
+    def _downloadDelta(self, relay, resource, remote_file, local_file, last_modified, msg,
+            meta):
+        """
+        Download a delta file and apply it to the local copy.
+
+        If the patched file does not match the checksum of the new version, the
+        pusher is requested to send the full file again.
+
+        *new in 0.7.12*
+        """
+        with self.repository.confirmPull(resource):
+            self.logger.info(msg, resource)
+            fd, delta_file = tempfile.mkstemp()
+            os.close(fd)
+            fd, patched_file = tempfile.mkstemp(dir=os.path.dirname(local_file), prefix='.')
+            os.close(fd)
+            try:
+                try:
+                    with self.tq_controller.pull(delta_file):
+                        ok = relay.pop(remote_file, delta_file, blocking=False, **self.pop_args)
+                except RuntimeError:
+                    ok = False
+                if not ok:
+                    if ok is not None:
+                        self.logger.error("failed to download '%s'", resource)
+                    return
+                try:
+                    apply_delta(local_file, delta_file, self.encryption, patched_file)
+                    ok = asstr(self.hash_function.file(patched_file)) == asstr(meta.checksum)
+                except ExpressInterrupt:
+                    raise
+                except Exception:
+                    self.logger.debug(traceback.format_exc())
+                    ok = False
+                if not ok:
+                    self.logger.warning("failed to apply delta to '%s'", resource)
+                    relay.rejectDelta(remote_file)
+                    return
+                shutil.move(patched_file, local_file)
+                if last_modified:
+                    os.utime(local_file, (time.time(), last_modified))
+                self.logger.debug("file '%s' successfully updated", resource)
+            finally:
+                for f in (delta_file, patched_file):
+                    if os.path.exists(f):
+                        os.unlink(f)
+
+    def pushFile(self, resource, remote_file, local_file, checksum, last_modified,
+            record=None):
+        """
+        Upload a local file.
+
+        Disk quota is checked before the transfer is scheduled, so that concurrent
+        transfers do not exceed the quota.
+        If available, the :class:`~escale.manager.access.FileRecord` `record` provides
+        the file size.
+        """
+        try:
+            tq_controller = self.tq_controller.push(local_file if record is None else record)
+        except QuotaExceeded as e:
+            with self.repository.confirmPush(resource):
+                self.logger.info("%s; no more files can be sent", e)
+                self.logger.warning("failed to upload '%s'", resource)
+            self.retryLater(resource)
+            return
+        self.transfer(self._uploadFile, resource, remote_file, local_file,
+                checksum, last_modified, tq_controller)
+
+    def _uploadFile(self, relay, resource, remote_file, local_file, checksum, last_modified,
+            tq_controller):
+        with self.repository.confirmPush(resource):
+            delta = None
+            if self.delta_transfer and checksum:
+                temp_file, delta = self.makeDelta(relay, resource, remote_file, local_file)
+            staged = None
+            if delta:
+                self.logger.info("uploading delta for file '%s'", resource)
+            else:
+                staged = self.stageEncrypted(relay, remote_file, local_file, checksum,
+                        last_modified)
+                if staged:
+                    temp_file = staged
+                else:
+                    temp_file = self.encryption.encrypt(local_file)
+                self.logger.info("uploading file '%s'", resource)
+            try:
+                with tq_controller:
+                    ok = relay.push(temp_file, remote_file, blocking=False,
+                        last_modified=last_modified, checksum=checksum, delta=delta)
+            except QuotaExceeded as e:
+                self.logger.info("%s; no more files can be sent", e)
+                ok = False
+            finally:
+                if delta:
+                    os.unlink(temp_file)
+                elif not staged:
+                    self.encryption.finalize(temp_file)
+            if staged and ok:
+                relay.transfer_journal.remove('stage:' + remote_file)
+            if ok:
+                self.logger.debug("file '%s' successfully uploaded", resource)
+                if self.delta_transfer and checksum:
+                    self.updateSignature(resource, local_file, checksum)
+            else:
+                if ok is not None:
+                    self.logger.warning("failed to upload '%s'", resource)
+                self.retryLater(resource)
+
+    def stageEncrypted(self, relay, remote_file, local_file, checksum, last_modified):
+        """
+        Encrypt a local file that will be split into parts into a staging file of
+        the transfer journal, so that an interrupted upload can be resumed.
+
+        The encrypted content differs on every encryption, so that the parts already
+        sent would not match the parts of a new encrypted copy.
+        The staging file is reused as long as the local file is not modified.
+
+        Returns:
+
+            str or None: path to the staging file, or ``None`` if the file is not
+                encrypted, not split or if the transfers are not resumable.
+
+        *new in 0.7.12*
+        """
+        journal = getattr(relay, 'transfer_journal', None)
+        part_size = getattr(relay, 'part_size', None)
+        if journal is None or isinstance(self.encryption, Plain) or \
+                not part_size or not last_modified:
+            return None
+        size = os.path.getsize(local_file)
+        if size <= part_size:
+            return None
+        version = [last_modified, asstr(checksum) if checksum else None, size]
+        def encrypt(staging):
+            if not self.encryption.encrypt(local_file, staging):
+                raise IOError("cannot encrypt file '{}'".format(local_file))
+        return journal.stage('stage:' + remote_file, version, encrypt)
+
+    def makeDelta(self, relay, resource, remote_file, local_file):
+        """
+        Make a delta file against the last pushed version of a file, if this version
+        is the current version on the relay host and all the pullers have got it.
+
+        Returns:
+
+            (str, str) or (None, None): path to the delta file and checksum of the
+                version the delta applies to.
+
+        *new in 0.7.12*
+        """
+        signature = self.checksum_cache.getSignature(resource)
+        if signature is None:
+            return None, None
+        signature = Signature.loads(signature)
+        ls = getattr(self.relay, 'listing_cache', None)
+        if ls is not None and (remote_file in ls.regular or remote_file in ls.contents):
+            # the previous version is still pending
+            return None, None
+        meta = relay.getMetadata(remote_file, timestamp_format=self.timestamp)
+        if not meta or not meta.checksum or asstr(meta.checksum) != signature.checksum:
+            return None, None
+        fd, delta_file = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            ok = make_delta(signature, local_file, self.encryption, delta_file)
+        except ExpressInterrupt:
+            os.unlink(delta_file)
+            raise
+        except Exception:
+            self.logger.debug(traceback.format_exc())
+            ok = False
+        if not ok:
+            os.unlink(delta_file)
+            return None, None
+        self.logger.debug("delta for file '%s': %s bytes", resource,
+                os.path.getsize(delta_file))
+        return delta_file, signature.checksum
+
+    def updateSignature(self, resource, local_file, checksum):
+        """
+        Compute and store the block signatures of a pushed file.
+
+        *new in 0.7.12*
+        """
+        try:
+            if os.path.getsize(local_file) < default_delta_block_size:
+                signature = None
+            else:
+                signature = Signature.compute(local_file, checksum).dumps()
+            self.checksum_cache.setSignature(resource, signature)
+        except ExpressInterrupt:
+            raise
+        except Exception:
+            self.logger.debug(traceback.format_exc())
+
+    def retryLater(self, resource):
+        """
+        Make sure a local file that could not be uploaded is considered again
+        in the next upload phase.
+        """
+        if self.repository.watcher is not None:
+            self.repository.watcher.mark(resource)
+
     def localFiles(self, path=None):
         """
         Transitional method.
 
         Use ``self.repository.readableFiles`` instead.
         """
-        ls0 = self.repository.listFiles(path, \
-            dirname=self._filter_directory, basename=self._filter)
-        ls1 = self.repository.readable(ls0, unsafe=True)
-        self.logger.debug('number of local files: (total) %s  (readable) %s', len(ls0), len(ls1))
-        return ls1
+        return [ record.path for record in self.localFileRecords(path) ]
+
+    def localFileRecords(self, path=None):
+        """
+        Generate records for the local files that pass the filters and can be uploaded.
+
+        If the local repository is watched, only the files that have changed since the
+        last call are considered, except when the watcher requests a full scan.
+
+        Returns:
+
+            iterator of FileRecord: local files.
+
+        *new in 0.7.12*
+        """
+        count = [0]
+        dirty = None
+        if self.repository.watcher is not None and not path:
+            dirty = self.repository.watcher.collect()
+        if dirty is None:
+            records = self.repository.scanFiles(path, \
+                    dirname=self._filter_directory, basename=self._filter)
+        else:
+            # only the files reported by the watcher
+            records = self.repository.statFiles(dirty, \
+                    dirname=self._filter_directory, basename=self._filter)
+        def scan():
+            for record in records:
+                count[0] += 1
+                yield record
+        n = 0
+        for record in self.repository.readableRecords(scan()):
+            n += 1
+            yield record
+        self.logger.debug('number of local files: (total) %s  (readable) %s', count[0], n)
+
+    def precomputeChecksums(self, resources):
+        """
+        Compute in parallel the checksums of the local files that are missing in the
+        checksum cache.
+
+        This is a no-op unless `checksum_workers` is greater than 1.
+        Checksums are written to the cache in batches of `checksum_batch_size` entries.
+
+        Arguments:
+
+            resources (list): local files as :class:`~escale.manager.access.FileRecord`
+                objects.
+        """
+        if not (self.checksum_workers and 1 < self.checksum_workers) \
+                or self.checksum_cache is None or not self.hash_function:
+            return
+        if ProcessPoolExecutor is None:
+            self.logger.debug("'concurrent.futures' not available; cannot compute checksums in parallel")
+            return
+        jobs = []
+        for record in resources:
+            try:
+                self.checksum_cache[record.path]
+            except KeyError:
+                jobs.append((record.path, self.repository.absolute(record.path),
+                    record.mtime_ns // 1000000000, self.hash_function.algorithm))
+        if not jobs[1:]:
+            return
+        self.logger.debug('computing checksums for %s local files with %s workers',
+                len(jobs), self.checksum_workers)
+        batch = {}
+        chunksize = max(1, min(100, len(jobs) // (4 * self.checksum_workers)))
+        with ProcessPoolExecutor(self.checksum_workers) as executor:
+            for resource, mtime, checksum in executor.map(_checksum_job, jobs,
+                    chunksize=chunksize):
+                if checksum is None:
+                    continue
+                batch[resource] = (mtime, checksum)
+                if self.checksum_batch_size <= len(batch):
+                    self.checksum_cache.update(batch)
+                    batch = {}
+        if batch:
+            self.checksum_cache.update(batch)
+
+    def flushChecksumCache(self):
+        """
+        Write the pending checksum cache entries to disk, if the cache supports it.
+        """
+        try:
+            flush = self.checksum_cache.flush
+        except AttributeError:
+            return
+        try:
+            flush()
+        except ExpressInterrupt:
+            raise
+        except Exception as e:
+            self.logger.warning('cannot write the checksum cache: %s', e)
+            self.logger.debug(traceback.format_exc())
+
+    def flushChanges(self):
+        """
+        Write the changes made to the relay repository down to the change journal,
+        if the relay maintains one.
+        """
+        try:
+            flush = self.relay.flushChanges
+        except AttributeError:
+            return
+        try:
+            flush()
+        except ExpressInterrupt:
+            raise
+        except Exception as e:
+            self.logger.warning('cannot write the change journal: %s', e)
+            self.logger.debug(traceback.format_exc())
+
+    def flushPlaceholderCache(self):
+        """
+        Write the placeholder cache down, if persistent.
+
+        *new in 0.7.12*
+        """
+        try:
+            flush = self.relay.placeholder_cache.flush
+        except AttributeError:
+            return
+        try:
+            flush()
+        except ExpressInterrupt:
+            raise
+        except Exception as e:
+            self.logger.warning('cannot write the placeholder cache: %s', e)
+            self.logger.debug(traceback.format_exc())
 
     def checksum(self, resource, return_mtime=False):
-        # `resource` should be a relative path!
+        # `resource` should be a relative path or a FileRecord!
+        if isinstance(resource, FileRecord):
+            mtime = resource.mtime_ns // 1000000000
+            resource = resource.path
+        else:
+            mtime = None
         local_file = self.repository.absolute(resource)
         checksum, modified = None, False
         if self.checksum_cache is not None:
-            mtime = int(os.path.getmtime(local_file))
+            if mtime is None:
+                mtime = int(os.path.getmtime(local_file))
             try:
                 previous_mtime, checksum = self.checksum_cache[resource]
             except KeyError:
@@ -611,18 +1113,13 @@ class Manager(Reporter):
                     # the last modification time has been fixed in relay.info.Metadata.fileModified;
                     # update `mtime` instead of `checksum` in the cache
                     self.checksum_cache[resource] = (mtime, checksum)
-        elif return_mtime:
+        elif return_mtime and mtime is None:
             mtime = int(os.path.getmtime(local_file))
         if not checksum and self.hash_function:
             if not modified and 1 < self.verbosity:
                 self.logger.debug('new local file: {}'.format(resource))
             try:
-                with open(local_file, 'rb') as f:
-                    content = f.read()
-                    #import struct
-                    #cs = sum(struct.unpack('<'+'B'*len(content), content))
-                    checksum = self.hash_function(content)
-                    #print((resource, cs, checksum))
+                checksum = self.hash_function.file(local_file)
             except ExpressInterrupt:
                 raise
             except:
@@ -648,3 +1145,25 @@ class Manager(Reporter):
             msg = 'remote repository crawled in {:.0f} seconds'.format(dur)
             self.logger.debug(msg)
 
+
+def _checksum_job(job):
+    """
+    Compute the checksum of a local file in a separate process.
+
+    Arguments:
+
+        job (tuple): (relative path, absolute path, last modification time,
+            hash algorithm).
+
+    Returns:
+
+        tuple: (relative path, last modification time, checksum);
+            last modification time and checksum are ``None`` on error.
+    """
+    resource, local_file, mtime, algorithm = job
+    try:
+        checksum = Hash(algorithm).file(local_file)
+    except (IOError, OSError):
+        # file unlinked since last call to localFiles?
+        return (resource, None, None)
+    return (resource, mtime, checksum)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION, asstr
+import os
+import time
+import json
+
+if PYTHON_VERSION == 2:
+    import anydbm as dbm
+else:
+    import dbm
+
+
+local_snapshot_prefix = 'ls'
+
+
+class DirectorySnapshot(object):
+    """
+    Persistent listing of the local repository, directory by directory.
+
+    Each directory is recorded with its last modification time, its visible files
+    (name, size, modification time in nanoseconds, inode number) and its visible
+    subdirectories.
+    A directory which modification time has not changed since it was recorded
+    does not need to be listed again.
+
+    Note that modifying a file does not modify its parent directory, unless the file
+    is replaced (e.g. renamed over). Such in-place modifications are detected on
+    the next full scan.
+    Every `full_scan_interval` seconds, all the directories are listed again.
+
+    Attributes:
+
+        location (str): path to dbm file.
+
+        full_scan_interval (float): minimum number of seconds between two full scans.
+
+        racy_delay (float): directories modified less than `racy_delay` seconds before
+            they are listed will be listed again on the next scan, as later changes
+            within the same modification time tick would not be noticed.
+
+    *new in 0.7.12*
+    """
+    __slots__ = [ 'location', 'full_scan_interval', 'racy_delay', '_entries',
+        '_dirty', '_visited', '_full', '_start', '_last_full_scan' ]
+
+    def __init__(self, location, full_scan_interval=3600, racy_delay=2):
+        location = os.path.expanduser(location)
+        dirname = os.path.dirname(location)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.location = location
+        self.full_scan_interval = full_scan_interval
+        self.racy_delay = racy_delay
+        self._entries = None
+        self._dirty = set()
+        self._visited = None
+        self._full = True
+        self._start = None
+        self._last_full_scan = 0
+
+    def _load(self):
+        self._entries = {}
+        try:
+            db = dbm.open(self.location, 'r')
+        except dbm.error:
+            # file does not exist yet
+            return
+        try:
+            for key in db.keys():
+                value = json.loads(asstr(db[key]))
+                key = asstr(key)
+                if key == 'last full scan':
+                    self._last_full_scan = value
+                else:
+                    self._entries[key[1:]] = value
+        finally:
+            db.close()
+
+    def begin(self):
+        """
+        Start a scan of the entire repository.
+
+        Returns:
+
+            bool: ``True`` if the scan is a full scan.
+        """
+        if self._entries is None:
+            self._load()
+        self._start = time.time()
+        self._full = self.full_scan_interval is not None and \
+            self.full_scan_interval <= self._start - self._last_full_scan
+        self._visited = set()
+        return self._full
+
+    def get(self, path, mtime_ns):
+        """
+        Get the recorded content of a directory.
+
+        Arguments:
+
+            path (str): path of the directory, relative to the repository root.
+
+            mtime_ns (int): current modification time of the directory.
+
+        Returns:
+
+            tuple or None: (files, subdirectories) if the directory has not been
+                modified since it was recorded, ``None`` otherwise.
+        """
+        if self._entries is None:
+            self._load()
+        if self._visited is not None:
+            self._visited.add(path)
+        if self._full:
+            return None
+        try:
+            recorded_mtime, files, subdirectories = self._entries[path]
+        except KeyError:
+            return None
+        if recorded_mtime != mtime_ns:
+            return None
+        return files, subdirectories
+
+    def set(self, path, mtime_ns, files, subdirectories):
+        """
+        Record the content of a directory.
+
+        Arguments:
+
+            path (str): path of the directory, relative to the repository root.
+
+            mtime_ns (int): modification time of the directory before it was listed.
+
+            files (list): (name, size, mtime_ns, inode) tuples.
+
+            subdirectories (list): subdirectory names.
+        """
+        if self._entries is None:
+            self._load()
+        if self._visited is not None:
+            self._visited.add(path)
+        start = time.time() if self._start is None else self._start
+        if start - self.racy_delay < mtime_ns * 1e-9:
+            # racily clean; list again next time
+            mtime_ns = None
+        self._entries[path] = [ mtime_ns, files, subdirectories ]
+        self._dirty.add(path)
+
+    def end(self):
+        """
+        Complete a scan started with :meth:`begin` and write the changes down.
+        """
+        if self._visited is not None:
+            # forget about deleted or excluded directories
+            for path in set(self._entries) - self._visited:
+                del self._entries[path]
+                self._dirty.add(path)
+            if self._full:
+                self._last_full_scan = self._start
+        self._visited = None
+        self._start = None
+        self.flush()
+
+    def flush(self):
+        """
+        Write the modified directory records to the dbm file.
+        """
+        db = dbm.open(self.location, 'c')
+        try:
+            for path in self._dirty:
+                key = '/' + path
+                try:
+                    db[key] = json.dumps(self._entries[path])
+                except KeyError:
+                    try:
+                        del db[key]
+                    except KeyError:
+                        pass
+            db['last full scan'] = json.dumps(self._last_full_scan)
+        finally:
+            db.close()
+        self._dirty = set()
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION, asstr
+from .config import *
+from .access import AccessAttributes, access_modifier_prefix, asbinary, writer_token_key
+from .cache import ChecksumCache, checksum_cache_prefix
+import sqlite3
+import threading
+import time
+
+if PYTHON_VERSION == 2:
+	import anydbm as dbm
+else:
+	import dbm
+
+
+state_store_prefix = 'st'
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS access (
+	resource TEXT PRIMARY KEY,
+	attributes BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS checksum (
+	resource TEXT PRIMARY KEY,
+	mtime INTEGER NOT NULL,
+	checksum TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS signature (
+	resource TEXT PRIMARY KEY,
+	signature BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (
+	key TEXT PRIMARY KEY,
+	value TEXT);
+"""
+
+
+class StateStore(object):
+	"""
+	SQLite database that holds the access modifiers and the checksum cache of
+	a repository.
+
+	The database is in WAL mode so that readers (e.g. ``escalectl``) do not
+	block the client.
+	Both tables are read at once into in-memory snapshots (see
+	:class:`SQLiteAccessAttributes` and :class:`SQLiteChecksumCache`).
+	The block signatures of the pushed files are read on demand instead.
+
+	Attributes:
+
+		path (str): path to database file.
+
+		connection (sqlite3.Connection): database connection, shared across threads.
+
+	*new in 0.7.12*
+	"""
+	def __init__(self, path, timeout=30):
+		path = os.path.expanduser(path)
+		dirname = os.path.dirname(path)
+		if dirname and not os.path.isdir(dirname):
+			os.makedirs(dirname)
+		self.path = path
+		self._lock = threading.RLock()
+		self.connection = sqlite3.connect(path, timeout=timeout,
+				check_same_thread=False)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		self.connection.executescript(_schema)
+		self.connection.commit()
+
+	def close(self):
+		with self._lock:
+			self.connection.close()
+
+	def execute(self, query, args=()):
+		"""
+		Run a read-only query and return all the resulting rows.
+		"""
+		with self._lock:
+			return self.connection.execute(query, args).fetchall()
+
+	def transaction(self, query, rows):
+		"""
+		Run a query for each row in a single transaction.
+		"""
+		with self._lock:
+			with self.connection:
+				self.connection.executemany(query, rows)
+
+	def version(self):
+		"""
+		Number that changes whenever another connection commits a transaction.
+		"""
+		return self.execute('PRAGMA data_version')[0][0]
+
+	def accessAttributes(self):
+		"""
+		Get the access modifiers.
+
+		Returns:
+
+			dict: raw attributes (bytes) for relative paths as keys.
+		"""
+		return { resource: bytes(attributes)
+			for resource, attributes in self.execute('SELECT resource, attributes FROM access') }
+
+	def setAccessAttributes(self, entries):
+		"""
+		Set or delete access modifiers.
+
+		Arguments:
+
+			entries (iterable): (relative path, raw attributes) pairs;
+				entries with ``None`` attributes are deleted.
+		"""
+		delete, insert = [], []
+		for resource, attributes in entries:
+			if attributes is None:
+				delete.append((resource,))
+			else:
+				insert.append((resource, sqlite3.Binary(attributes)))
+		with self._lock:
+			with self.connection:
+				if delete:
+					self.connection.executemany('DELETE FROM access WHERE resource = ?',
+						delete)
+				if insert:
+					self.connection.executemany('INSERT OR REPLACE INTO access VALUES (?, ?)',
+						insert)
+
+	def checksums(self):
+		"""
+		Get the cached checksums.
+
+		Returns:
+
+			dict: (last modification time, checksum) pairs for relative paths as keys.
+		"""
+		return { resource: (mtime, checksum)
+			for resource, mtime, checksum in self.execute('SELECT resource, mtime, checksum FROM checksum') }
+
+	def setChecksums(self, entries):
+		"""
+		Arguments:
+
+			entries (iterable): (relative path, (last modification time, checksum)) pairs.
+		"""
+		self.transaction('INSERT OR REPLACE INTO checksum VALUES (?, ?, ?)',
+			[ (resource, mtime, checksum) for resource, (mtime, checksum) in entries ])
+
+	def signature(self, resource):
+		"""
+		Returns:
+
+			bytes or None: serialized block signatures of a file.
+		"""
+		rows = self.execute('SELECT signature FROM signature WHERE resource = ?',
+			(resource,))
+		if rows:
+			return bytes(rows[0][0])
+		return None
+
+	def setSignatures(self, entries):
+		"""
+		Set or delete block signatures.
+
+		Arguments:
+
+			entries (iterable): (relative path, serialized block signatures) pairs;
+				entries with ``None`` signatures are deleted.
+		"""
+		delete, insert = [], []
+		for resource, signature in entries:
+			if signature is None:
+				delete.append((resource,))
+			else:
+				insert.append((resource, sqlite3.Binary(signature)))
+		with self._lock:
+			with self.connection:
+				if delete:
+					self.connection.executemany('DELETE FROM signature WHERE resource = ?',
+						delete)
+				if insert:
+					self.connection.executemany('INSERT OR REPLACE INTO signature VALUES (?, ?)',
+						insert)
+
+	def migrate(self, access=None, checksums=None):
+		"""
+		Import the content of the former dbm files, once.
+
+		The dbm files are left in place.
+
+		Arguments:
+
+			access (str): path to access modifier dbm file.
+
+			checksums (str): path to checksum cache dbm file; the block signatures
+				are read from the dbm file with suffix *.signatures*.
+
+		Returns:
+
+			bool: ``True`` if data were imported.
+		"""
+		if self.execute("SELECT value FROM meta WHERE key = 'migrated'"):
+			return False
+		imported = False
+		if access:
+			entries = _read_dbm(access)
+			if entries:
+				self.setAccessAttributes([ (asstr(k), v) for k, v in entries
+					if k != writer_token_key ])
+				imported = True
+		if checksums:
+			entries = []
+			for key, value in _read_dbm(checksums):
+				mtime, checksum = asstr(value).split(ChecksumCache.__separator__)
+				entries.append((asstr(key), (int(mtime), checksum)))
+			if entries:
+				self.setChecksums(entries)
+				imported = True
+			entries = _read_dbm(checksums + '.signatures')
+			if entries:
+				self.setSignatures([ (asstr(k), v) for k, v in entries ])
+				imported = True
+		self.transaction('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+			[('migrated', str(int(time.time())))])
+		return imported
+
+
+def _read_dbm(path):
+	try:
+		db = dbm.open(path, 'r')
+	except dbm.error:
+		# file does not exist
+		return []
+	try:
+		return [ (key, db[key]) for key in db.keys() ]
+	finally:
+		db.close()
+
+
+class SQLiteAccessAttributes(AccessAttributes):
+	"""
+	Access attributes stored in a :class:`StateStore`.
+
+	The in-memory snapshot is reloaded when another process commits changes
+	to the database.
+	"""
+
+	__slots__ = [ 'store' ]
+
+	def __init__(self, store):
+		AccessAttributes.__init__(self, store.path)
+		self.store = store
+
+	def _signature(self):
+		return ('data_version', self.store.version())
+
+	def _load(self):
+		return { asbinary(resource): attributes
+			for resource, attributes in self.store.accessAttributes().items() }
+
+	def _store(self, key, attributes):
+		self.store.setAccessAttributes([(asstr(key), attributes)])
+		# the commits of this connection do not change the data version
+		stamp = self._signature()
+		if stamp != self._stamp:
+			return None
+		return stamp
+
+
+class SQLiteChecksumCache(ChecksumCache):
+	"""
+	Write-back checksum cache stored in a :class:`StateStore`.
+
+	Each flush is a single transaction.
+	The block signatures are stored in the same database, and are written at once.
+	"""
+
+	def __init__(self, store, flush_interval=60):
+		self.store = store
+		ChecksumCache.__init__(self, store.path, flush_interval=flush_interval)
+
+	def load(self):
+		for resource, entry in self.store.checksums().items():
+			dict.__setitem__(self, resource, entry)
+
+	def flush(self):
+		with self._lock:
+			self.last_flush = time.time()
+			if not self.dirty:
+				return
+			dirty, self.dirty = self.dirty, set()
+			try:
+				self.store.setChecksums([ (key, dict.__getitem__(self, key)) for key in dirty ])
+			except:
+				# retry on next flush
+				self.dirty |= dirty
+				raise
+
+	def getSignature(self, key):
+		return self.store.signature(asstr(key))
+
+	def setSignature(self, key, signature):
+		self.store.setSignatures([(asstr(key), signature)])
+
+
+def open_state_store(config=None, section=None, migrate=True):
+	"""
+	Open the SQLite state store of a repository.
+
+	Arguments:
+
+		config (ConfigParser): configuration object or filepath.
+
+		section (str): section/repository name.
+
+		migrate (bool): import the existing dbm files on first use.
+
+	Returns:
+
+		StateStore: state store.
+	"""
+	store = StateStore(get_cache_file(config, section, prefix=state_store_prefix) + '.sqlite')
+	if migrate:
+		store.migrate(
+			access=get_cache_file(config, section, prefix=access_modifier_prefix),
+			checksums=get_cache_file(config, section, prefix=checksum_cache_prefix))
+	return store
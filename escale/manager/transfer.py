@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION
+from escale.base.exceptions import ExpressInterrupt
+import threading
+import traceback
+
+if PYTHON_VERSION == 2:
+    import Queue as queue
+else:
+    import queue
+
+
+class TransferPool(object):
+    """
+    Bounded pool of transfer workers.
+
+    Each worker owns a separate relay connection, made by calling `make_relay`
+    and opened in the worker thread.
+    Jobs are callables that take the worker's relay as first input argument.
+
+    Attributes:
+
+        size (int): number of workers.
+
+        make_relay (callable): relay factory.
+
+        logger (Logger): logger.
+
+    """
+    def __init__(self, size, make_relay, logger=None):
+        self.size = size
+        self.make_relay = make_relay
+        self.logger = logger
+        # bounded queue; `submit` blocks when all the workers are busy
+        self.jobs = queue.Queue(2 * size)
+        self.workers = []
+        self.relays = []
+        self.error = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        for _ in range(self.size):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _work(self):
+        relay = None
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    break
+                if relay is None:
+                    relay = self.make_relay()
+                    relay.open()
+                    with self._lock:
+                        self.relays.append(relay)
+                func, args, kwargs = job
+                func(relay, *args, **kwargs)
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.debug(traceback.format_exc())
+                with self._lock:
+                    if self.error is None:
+                        self.error = e
+            finally:
+                self.jobs.task_done()
+        if relay is not None:
+            try:
+                relay.close()
+            except ExpressInterrupt:
+                raise
+            except:
+                if self.logger is not None:
+                    self.logger.debug(traceback.format_exc())
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedule ``func(relay, *args, **kwargs)``.
+        """
+        if not self.workers:
+            self.start()
+        self.jobs.put((func, args, kwargs))
+
+    def join(self):
+        """
+        Wait for all the scheduled jobs to complete.
+
+        The first exception raised by a job, if any, is raised again.
+        """
+        self.jobs.join()
+        with self._lock:
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        self.relays = []
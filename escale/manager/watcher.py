@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import os
+import sys
+import errno
+import select
+import struct
+import threading
+import time
+import traceback
+import ctypes
+import ctypes.util
+
+
+# see inotify(7)
+IN_MODIFY       = 0x00000002
+IN_ATTRIB       = 0x00000004
+IN_CLOSE_WRITE  = 0x00000008
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_MOVE_SELF    = 0x00000800
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_ONLYDIR      = 0x01000000
+IN_ISDIR        = 0x40000000
+IN_NONBLOCK     = 0o4000
+IN_CLOEXEC      = 0o2000000
+
+_watch_mask = IN_CLOSE_WRITE | IN_ATTRIB | IN_CREATE | IN_DELETE | IN_MOVED_FROM | \
+    IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_event_header = struct.Struct('iIII')
+
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def inotify_available():
+    """
+    Tell whether inotify can be used on this system.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        libc = _load_libc()
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return False
+    return True
+
+
+class LocalWatcher(object):
+    """
+    Collect the paths of the modified files in a local repository, using inotify.
+
+    All the visible directories are watched.
+    Files which name begins with "." are ignored.
+
+    The paths of the created, modified, moved or deleted files are accumulated
+    in a dirty set until :meth:`collect` is called.
+    When inotify events are lost (queue overflow, watch limit reached), the next call
+    to :meth:`collect` requests a full scan instead.
+    A full scan is also requested every `full_scan_interval` seconds, as a safety net.
+
+    Attributes:
+
+        path (str): path to repository root.
+
+        full_scan_interval (float): maximum number of seconds between two full scans.
+
+        changed (threading.Event): set whenever the dirty set grows.
+
+        logger (Logger): logger.
+
+    *new in 0.7.12*
+    """
+    def __init__(self, path, full_scan_interval=3600, logger=None):
+        self.path = path
+        self.full_scan_interval = full_scan_interval
+        self.logger = logger
+        self.changed = threading.Event()
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._full_scan = True
+        self._last_full_scan = 0
+        self._fd = None
+        self._watches = {}
+        self._thread = None
+        self._stop = False
+
+    def start(self):
+        """
+        Start watching the repository in a background thread.
+        """
+        if self._thread is not None:
+            return
+        libc = _load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self._fd = fd
+        self._stop = False
+        self._watchTree('')
+        with self._lock:
+            # events may have been missed before the watches were set
+            self._full_scan = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching.
+        """
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches = {}
+
+    def collect(self):
+        """
+        Get and reset the dirty set.
+
+        Returns:
+
+            set or None: relative paths of the files that may have changed since the last
+                call, or ``None`` if a full scan is required.
+        """
+        with self._lock:
+            t = time.time()
+            full_scan = self._full_scan or (self.full_scan_interval is not None and
+                self.full_scan_interval <= t - self._last_full_scan)
+            if full_scan:
+                self._full_scan = False
+                self._last_full_scan = t
+                dirty = None
+            else:
+                dirty = self._dirty
+            self._dirty = set()
+            self.changed.clear()
+        return dirty
+
+    def mark(self, resource):
+        """
+        Add a file to the dirty set, e.g. after a failed upload.
+        """
+        with self._lock:
+            self._dirty.add(resource)
+
+    def _markDirty(self, resource):
+        with self._lock:
+            self._dirty.add(resource)
+        self.changed.set()
+
+    def requestFullScan(self, wakeup=False):
+        """
+        Make the next call to :meth:`collect` request a full scan.
+        """
+        with self._lock:
+            self._full_scan = True
+        if wakeup:
+            self.changed.set()
+
+    def _absolute(self, relpath):
+        if relpath:
+            return '/'.join((self.path, relpath))
+        else:
+            return self.path
+
+    def _watchTree(self, relpath):
+        """
+        Watch a directory and its visible subdirectories.
+
+        Returns:
+
+            list: relative paths of the files found in the directory tree.
+        """
+        files = []
+        directories = [ relpath ]
+        while directories:
+            relpath = directories.pop()
+            path = self._absolute(relpath)
+            wd = _load_libc().inotify_add_watch(self._fd, path.encode('utf-8'), _watch_mask)
+            if wd < 0:
+                e = ctypes.get_errno()
+                if e == errno.ENOSPC:
+                    if self.logger is not None:
+                        self.logger.warning('inotify watch limit reached; see fs.inotify.max_user_watches')
+                    # the directory tree is not fully watched; always scan
+                    self.full_scan_interval = 0
+                    self.requestFullScan(wakeup=True)
+                # else directory deleted in the meantime
+                continue
+            self._watches[wd] = relpath
+            try:
+                for f in os.listdir(path):
+                    if f[0] == '.':
+                        continue
+                    rp = '/'.join((relpath, f)) if relpath else f
+                    if os.path.isdir(self._absolute(rp)):
+                        directories.append(rp)
+                    else:
+                        files.append(rp)
+            except OSError:
+                pass
+        return files
+
+    def _run(self):
+        buf = b''
+        while not self._stop:
+            try:
+                ready, _, _ = select.select([self._fd], [], [], .5)
+                if not ready:
+                    continue
+                try:
+                    buf += os.read(self._fd, 65536)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                buf = self._parse(buf)
+            except Exception:
+                if self.logger is not None:
+                    self.logger.error('inotify watcher failed; falling back to full scans')
+                    self.logger.debug(traceback.format_exc())
+                self.full_scan_interval = 0
+                self.requestFullScan(wakeup=True)
+                break
+
+    def _parse(self, buf):
+        offset = 0
+        while _event_header.size <= len(buf) - offset:
+            wd, mask, _, length = _event_header.unpack_from(buf, offset)
+            end = offset + _event_header.size + length
+            if len(buf) < end:
+                break
+            name = buf[offset + _event_header.size:end].rstrip(b'\0').decode('utf-8', 'replace')
+            offset = end
+            self._handle(wd, mask, name)
+        return buf[offset:]
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            if self.logger is not None:
+                self.logger.debug('inotify queue overflow; requesting a full scan')
+            self.requestFullScan(wakeup=True)
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+        try:
+            relpath = self._watches[wd]
+        except KeyError:
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            return
+        if not name or name[0] == '.':
+            return
+        rp = '/'.join((relpath, name)) if relpath else name
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # files may have been created before the watch was set
+                for f in self._watchTree(rp):
+                    self._markDirty(f)
+        else:
+            self._markDirty(rp)
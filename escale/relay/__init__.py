@@ -18,7 +18,7 @@
 from .info import *
 from .relay import AbstractRelay, Relay
 from escale.base.exceptions import MissingSetupFeature
-from .index import IndexRelay, TopDirectoriesIndex
+from .index import IndexRelay, TopDirectoriesIndex, HashIndex
 
 __all__ = ['LockInfo', 'parse_lock_file', 'AbstractRelay', 'Relay']
 
@@ -121,6 +121,13 @@ def by_protocol(protocol, index=False, **ignored):
 				except IndexError:
 					pass
 				index_relay = TopDirectoriesIndex
+			elif index.startswith('hash'):
+				# new in 0.7.12
+				try:
+					_kwargs['max_page_entries'] = int(index.split(':')[1])
+				except IndexError:
+					pass
+				index_relay = HashIndex
 			else:
 				raise ValueError('wrong `index` value: {}'.format(index))
 			for p in ps:
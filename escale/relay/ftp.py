@@ -15,9 +15,11 @@ from escale.base import *
 from escale.base.ssl import *
 from escale.cli.auth import *
 from .relay import Relay
+from .multipart import FileSlice
 import ftplib
 import ssl
 import os
+import io
 import itertools
 import traceback
 
@@ -449,8 +451,13 @@ class FTP(Relay):
 			return Relay.exists(self, remote_file, dirname=dirname)
 
 
-	def _push(self, local_file, remote_dest, makedirs=True):
-		dirname, basename = os.path.split(remote_dest)
+	def _chdir(self, dirname):
+		"""
+		Change the working directory to `dirname` in the repository, and make it
+		if missing.
+
+		*new in 0.7.12*
+		"""
 		fullpath = os.path.join(self.repository, dirname)
 		try:
 			self._request(self.ftp.cwd, fullpath)
@@ -473,6 +480,11 @@ class FTP(Relay):
 							self.ftp.cwd(part)
 			else:
 				raise
+
+
+	def _push(self, local_file, remote_dest, makedirs=True):
+		dirname, basename = os.path.split(remote_dest)
+		self._chdir(dirname)
 		self.ftp.storbinary('STOR ' + basename, open(local_file, 'rb'))
 
 
@@ -485,6 +497,38 @@ class FTP(Relay):
 				open(local_file, 'wb').write)
 
 
+	def _push_bytes(self, data, remote_dest, makedirs=True):
+		dirname, basename = os.path.split(remote_dest)
+		self._chdir(dirname)
+		self.ftp.storbinary('STOR ' + basename, io.BytesIO(data))
+
+
+	def _pushPart(self, local_file, offset, size, remote_dest, makedirs=True):
+		dirname, basename = os.path.split(remote_dest)
+		self._chdir(dirname)
+		with FileSlice(local_file, offset, size) as part:
+			self.ftp.storbinary('STOR ' + basename, part)
+
+
+	def _getPart(self, remote_file, local_file, offset):
+		with open(local_file, 'r+b') as f:
+			f.seek(offset)
+			self._request(self.ftp.retrbinary, 'RETR ' + join(self.repository, remote_file),
+					f.write)
+
+
+	def _getRange(self, remote_file, f, offset):
+		self._request(self.ftp.retrbinary, 'RETR ' + join(self.repository, remote_file),
+				f.write, rest=offset or None)
+
+
+	def _get_bytes(self, remote_file):
+		buf = io.BytesIO()
+		self._request(self.ftp.retrbinary, 'RETR ' + join(self.repository, remote_file),
+				buf.write)
+		return buf.getvalue()
+
+
 	def unlink(self, remote_file):
 		self._request(self.ftp.delete, join(self.repository, remote_file))
 
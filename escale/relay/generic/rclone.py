@@ -18,6 +18,7 @@ from ..relay import Relay
 from escale.base.subprocess import *
 import os
 import time
+import json
 
 
 
@@ -50,6 +51,20 @@ def rclone_binary(name=None):
 	return None
 
 
+def _parse_lsl(line):
+	"""
+	Parse a line of ``rclone lsl`` output.
+
+	Returns:
+
+		(str, str, time.struct_time): path, size and modification time.
+	"""
+	line = asstr(line) # mod
+	record = line.split(None, 3)
+	mtime = record[1] + ' ' + record[2].split('.')[0]
+	return record[3], record[0], time.strptime(mtime, '%Y-%m-%d %H:%M:%S')
+
+
 _supported_protocols = [ 'amazoncloud', 'b2', 'dropbox', 'googlecloud', 'hubic', 'onedrive', 'sftp', 'swift', 's3' ]
 
 
@@ -108,13 +123,13 @@ class RClone(Relay):
 		else:
 			relay_dir = self.repository
 		cmd = 'ls'
-		if not recursive:
-			raise NotImplementedError
 		if stats:
 			cmd = 'lsl'
+		args = ['{}:{}'.format(self.remote, relay_dir)]
+		if not recursive:
+			args = ['--max-depth', '1'] + args
 		try:
-			ls = with_subprocess(self.rclone_bin, cmd,
-				'{}:{}'.format(self.remote, relay_dir),
+			ls = with_subprocess(self.rclone_bin, cmd, *args,
 				error=IOError) #'--fast-list', 
 		except IOError as e:
 			err = asstr(e.args[0].rstrip()) # mod [required]
@@ -129,12 +144,10 @@ class RClone(Relay):
 			sizes = []
 			mtimes = []
 			for line in ls.splitlines():
-				line = asstr(line) # mod
-				record = line.split(None, 3)
-				size = record[0]
-				path = record[3]
-				mtime = record[1] + ' ' + record[2].split('.')[0]
-				mtime = time.strptime(mtime, '%Y-%m-%d %H:%M:%S')
+				path, size, mtime = _parse_lsl(line)
+				if remote_dir:
+					# paths are relative to the listed directory
+					path = '/'.join((asstr(remote_dir), path))
 				files.append(path)
 				sizes.append(size)
 				mtimes.append(mtime)
@@ -148,6 +161,39 @@ class RClone(Relay):
 		else:
 			return [ line.split(None, 1)[2] for line in ls.splitlines() ]
 
+	def _listChanges(self, tokens):
+		"""
+		Change tokens are the modification times of the directories, as reported
+		by ``rclone lsjson --dirs-only``.
+
+		Note that bucket-based storages (e.g. S3) have no actual directories;
+		directories without modification time are listed again at each pass.
+		"""
+		ls = with_subprocess(self.rclone_bin, 'lsjson', '-R', '--dirs-only',
+			'{}:{}'.format(self.remote, self.repository),
+			error=IOError)
+		new_tokens = {'': None}
+		for entry in json.loads(asstr(ls) or '[]'):
+			new_tokens[entry['Path']] = entry.get('ModTime') or None
+		listings = {}
+		for dirname, token in new_tokens.items():
+			if token is None or tokens.get(dirname) != token:
+				if dirname:
+					relay_dir = os.path.join(self.repository, dirname)
+				else:
+					relay_dir = self.repository
+				ls = with_subprocess(self.rclone_bin, 'lsl', '--max-depth', '1',
+					'{}:{}'.format(self.remote, relay_dir),
+					error=IOError)
+				files = []
+				for line in ls.splitlines():
+					path, _, mtime = _parse_lsl(line)
+					if dirname:
+						path = '/'.join((dirname, path))
+					files.append((path, mtime))
+				listings[dirname] = files
+		return new_tokens, listings
+
 	def exists(self, remote_file, dirname=None):
 		remote_file = asstr(remote_file)
 		if dirname:
@@ -220,6 +266,31 @@ class RClone(Relay):
 			else:
 				raise IOError(error)
 
+	def _push_bytes(self, data, remote_file, makedirs=True):
+		"""
+		`makedirs` is ignored (always True).
+		"""
+		relay_file = os.path.join(self.repository, asstr(remote_file))
+		output = with_subprocess(self.rclone_bin, 'rcat',
+				'{}:{}'.format(self.remote, relay_file),
+				output=True, data=data)
+		if isinstance(output, tuple):
+			_, error = output
+			raise IOError(asstr(error))
+
+	def _get_bytes(self, remote_file):
+		relay_file = os.path.join(self.repository, asstr(remote_file))
+		output = with_subprocess(self.rclone_bin, 'cat',
+				'{}:{}'.format(self.remote, relay_file),
+				output=True, binary=True)
+		if isinstance(output, tuple):
+			_, error = output
+			error = asstr(error)
+			if 'Failed to create file system for "' in error or 'not found' in error:
+				raise MissingResource
+			raise IOError(error)
+		return output
+
 	def unlink(self, remote_file):
 		relay_file = '{}:{}'.format(self.remote, os.path.join(self.repository, asstr(remote_file)))
 		output = with_subprocess(self.rclone_bin, 'delete', relay_file, output=True)
@@ -23,6 +23,10 @@
 from escale.base import *
 from .relay import *
 from .info import *
+from .indexformat import is_compact_index, compact_index_magic, \
+    write_compact_index, read_compact_index
+from escale.base.compression import parse_codec, detect_codec, open_compressed, \
+    resolve_codec, compress_file, magic_length
 import time
 import calendar
 import itertools
@@ -30,7 +34,7 @@ import traceback
 import tarfile
 import tempfile
 import shutil
-import bz2
+import hashlib
 import os
 from collections import defaultdict, MutableMapping
 
@@ -55,6 +59,9 @@ class AbstractIndexRelay(AbstractRelay):
     def hasUpdate(self, page):
         raise NotImplementedError('abstract method')
 
+    def journalPending(self, page):
+        raise NotImplementedError('abstract method')
+
     def getUpdate(self, page, terminate=None, full_index=False):
         return UpdateRead(self, page, terminate, full_index)
 
@@ -142,7 +149,8 @@ class UpdateRead(IndexUpdate):
         self.full_index = full_index
 
     def __enter__(self):
-        if not self.relay.loaded(self.page) or self.relay.hasUpdate(self.page) or self.full_index:
+        if not self.relay.loaded(self.page) or self.relay.hasUpdate(self.page) or \
+                self.relay.journalPending(self.page) or self.full_index:
             IndexUpdate.__enter__(self)
             if self.full_index:
                 self.content = self.relay.getPageIndex(self.page)
@@ -189,16 +197,24 @@ group_end_breaker = '-----------'
 puller_breaker = '---pullers---'
 
 
-def write_index(filename, metadata, pullers=[], compress=False, groupby=[]):
+def write_index(filename, metadata, pullers=[], compress=False, groupby=[], compact=False):
     """
     Write index to file.
+
+    `compress` can be a boolean (``True`` stands for bz2) or any codec name
+    supported by :func:`~escale.base.compression.parse_codec`.
+    In `auto` mode, the index is written uncompressed first, and compressed with
+    gzip if a sample of it is found compressible.
+
+    *new in 0.7.12:* compact, codec names
     """
-    if compress:
-        _open = bz2.BZ2File
-    else:
-        _open = open
+    codec = parse_codec(compress)
+    auto = codec == 'auto'
+    if auto:
+        codec = 'none'
     if groupby:
         _metadata = defaultdict(dict)
+        prefixes = tuple(groupby)
         for resource in metadata:
             mdata = metadata[resource]
             if isinstance(mdata, Metadata):
@@ -209,60 +225,77 @@ def write_index(filename, metadata, pullers=[], compress=False, groupby=[]):
             _mdata = []
             group = {}
             for line in mdata:
-                _groupby = None
-                for g in groupby:
-                    if line.startswith(g):
-                        _groupby = g
-                        break
-                if _groupby:
-                    group[_groupby] = line
+                if line.startswith(prefixes):
+                    for g in groupby:
+                        if line.startswith(g):
+                            group[g] = line
+                            break
                 else:
                     _mdata.append(line)
             # sort grouping keys
-            _group = []
-            for g in groupby:
-                try:
-                    _group.append(group[g])
-                except KeyError:
-                    pass
+            _group = tuple([ group[g] for g in groupby if g in group ])
             #
-            _metadata[tuple(_group)][resource] = '\n'.join(_mdata)
+            _metadata[_group][resource] = '\n'.join(_mdata)
     else:
         for resource in metadata:
             mdata = metadata[resource]
             if isinstance(mdata, Metadata):
                 metadata[resource] = repr(mdata)
         _metadata = dict(default=metadata)
-    with _open(filename, 'w') as f:
-        if compress:
+    if compact:
+        groups = []
+        for group in _metadata:
+            if groupby and group:
+                lines = '\n'.join(group)+'\n'
+            else:
+                lines = ''
+            groups.append((lines, _metadata[group]))
+        with open_compressed(filename, 'wb', codec) as f:
+            write_compact_index(f, groups, pullers)
+    else:
+        if codec == 'none':
+            f = open(filename, 'w')
+            write = f.write
+        else:
+            f = open_compressed(filename, 'wb', codec)
             def write(s):
                 f.write(asbytes(s))
-        else:
-            write = f.write
-        for group in _metadata:
-            if groupby:
-                write(group_begin_breaker+'\n')
-                for line in group:
-                    write(line+'\n')
-                write(group_end_breaker+'\n')
-            metadata = _metadata[group]
-            for resource in metadata:
-                mdata = metadata[resource]
-                if mdata:
-                    if not mdata.endswith('\n'):
-                        mdata += '\n'
-                else:
-                    mdata = '' # string
-                nchars = len(mdata)
-                write('{} {}\n{}'.format(resource, nchars, mdata))
-        if pullers:
-            write(puller_breaker)
-            for reader in pullers:
-                write('\n'+reader)
+        with f:
+            for group in _metadata:
+                if groupby:
+                    write(group_begin_breaker+'\n')
+                    for line in group:
+                        write(line+'\n')
+                    write(group_end_breaker+'\n')
+                metadata = _metadata[group]
+                for resource in metadata:
+                    mdata = metadata[resource]
+                    if mdata:
+                        if not mdata.endswith('\n'):
+                            mdata += '\n'
+                    else:
+                        mdata = '' # string
+                    nchars = len(mdata)
+                    write('{} {}\n{}'.format(resource, nchars, mdata))
+            if pullers:
+                write(puller_breaker)
+                for reader in pullers:
+                    write('\n'+reader)
+    if auto:
+        with open(filename, 'rb') as f:
+            sample = f.read(1048576)
+        compress_file(filename, resolve_codec('auto', sample))
 
 def read_index(filename, compress=False, groupby=[], debug=None):
     """
     Read index from file.
+
+    Both the text and compact formats are supported; the compact format is
+    identified by its header.
+    The compression codec, if any, is identified by the first bytes of the file;
+    `compress` is ignored.
+
+    *new in 0.7.12:* compact format, compression codec detection
     """
     metadata = {}
     if groupby:
@@ -274,10 +307,16 @@ def read_index(filename, compress=False, groupby=[], debug=None):
         if compress and debug is not None:
             debug('uncompressed empty index')
         return (metadata, pullers)
-    elif compress:
-        _open = bz2.BZ2File
-    else:
+    with open(filename, 'rb') as f:
+        codec = detect_codec(f.read(magic_length))
+    if codec == 'none':
         _open = open
+    else:
+        _open = lambda filename, mode: open_compressed(filename, 'rb', codec)
+    with _open(filename, 'rb') as f:
+        if is_compact_index(f.read(len(compact_index_magic))):
+            f.seek(0)
+            return read_compact_index(f)
     with _open(filename, 'r') as f:
         while True:
             line = asstr(f.readline().rstrip()) # asstr is necessary with compression
@@ -315,6 +354,20 @@ def read_index(filename, compress=False, groupby=[], debug=None):
 
 
 
+def _strip(filename, prefix, suffix):
+    if prefix:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+        else:
+            return None
+    if suffix:
+        if filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+        else:
+            return None
+    return filename
+
+
 class IndexRelay(AbstractIndexRelay):
     """
     Index-based relay.
@@ -330,12 +383,56 @@ class IndexRelay(AbstractIndexRelay):
     The total archive is encrypted instead of the individual files.
 
     Indexing potentially supports paging. See also the :meth:`page` method.
+
+    If `compact_index` is ``True``, the indices are written in the compact binary
+    format (see :mod:`~escale.relay.indexformat`); both formats are read anyway.
+
+    Persistent indices are compressed with the `index_compression` codec
+    (see :mod:`~escale.base.compression`); update indices are not compressed.
+    Any codec is read anyway.
+
+    If `max_journal_segments` is defined, the persistent index of a page is a snapshot
+    followed by a journal of numbered segments.
+    Each update is appended to the journal as a new segment, instead of the entire
+    index being uploaded again.
+    Readers replay the segments they have not read yet on top of the snapshot.
+    Once the number of segments reaches `max_journal_segments` or their total size
+    exceeds `max_journal_ratio` times the size of the snapshot, the writer
+    compacts the journal, i.e. uploads a new snapshot and deletes the segments,
+    while it holds the page lock.
+    An empty segment is left after compaction so that segment numbers keep
+    increasing.
+    Journal segments are read anyway.
+
+    *new in 0.7.12:* `compact_index`, set with keyword argument `index_format`;
+    `index_compression`; `max_journal_segments`, set with keyword argument
+    `index_journal`, and `max_journal_ratio`
     """
 
     def __init__(self, *args, **kwargs):
         base = kwargs.pop('base', Relay)
+        # index updates are not recorded in the change journal,
+        # index files have no placeholders, are not split into parts
+        # and are not resumed; new 0.7.12
+        kwargs.pop('change_journal', None)
+        kwargs.pop('placeholder_cache', None)
+        kwargs.pop('part_size', None)
+        kwargs.pop('transfer_journal', None)
+        # new 0.7.12
+        self.compact_index = kwargs.pop('index_format', None) == 'compact'
+        index_compression = kwargs.pop('index_compression', None)
+        index_journal = kwargs.pop('index_journal', None)
+        if index_journal is True:
+            index_journal = 16
+        self.max_journal_segments = index_journal or None
+        self.max_journal_ratio = .5
         #lock_args = kwargs.pop('lock_args', {})
         self.base_relay = base(*args, **kwargs)
+        try:
+            self.index_compression = parse_codec(index_compression)
+        except ValueError as e:
+            self.logger.warning('%s; compressing indices with bz2', e)
+            self.index_compression = 'bz2'
         #self.lock_args = lock_args
         self.lock_args = {}
         self.locked = {}
@@ -347,6 +444,10 @@ class IndexRelay(AbstractIndexRelay):
         self.listing_time = None
         self.listing_cache = None
         self.listing_cooldown = 5
+        # journal state per page; new in 0.7.12
+        self.journal_seq = {}
+        self.journal_size = {}
+        self.snapshot_size = {}
         #
         self._persistent_index_prefix = '.'
         self._persistent_index_suffix = '.index'
@@ -361,6 +462,9 @@ class IndexRelay(AbstractIndexRelay):
         self._update_data_prefix = '.'
         self._update_data_suffix = '.data'
         self._timestamp_data = True
+        # journal segments; new in 0.7.12
+        self._journal_prefix = '.'
+        self._journal_suffix = '.journal'
         # compress index
         self.metadata_group_by = ['placeholder', 'pusher']
         # new 0.7.7
@@ -431,6 +535,12 @@ class IndexRelay(AbstractIndexRelay):
             ts = ''
         return '{}{}{}{}'.format(self._update_data_prefix, page, ts, self._update_data_suffix)
 
+    def journalSegment(self, page, number):
+        """
+        *new in 0.7.12*
+        """
+        return '{}{}.{}{}'.format(self._journal_prefix, page, number, self._journal_suffix)
+
     def updateTimestamp(self, page, mode=None):
         timestamp = None
         if self._timestamp_index:
@@ -439,28 +549,10 @@ class IndexRelay(AbstractIndexRelay):
                     self.transaction_timestamp = int(round(time.time()))
                 timestamp = self.transaction_timestamp
             elif mode is None or mode == 'r':
-                raw_ls = self.listing_cache # should be up-to-date
-                prefixes = (
-                    '{}{}.'.format(self._update_index_prefix, page),
-                    '{}{}.'.format(self._update_data_prefix, page),
-                    )
-                suffixes = (self._update_index_suffix, self._update_data_suffix)
-                ls, ts = [], []
-                for _prefix, _suffix in zip(prefixes, suffixes):
-                    for l, _ in raw_ls:
-                        if not l.startswith(_prefix):
-                            continue
-                        t = l[len(_prefix):]
-                        if _suffix:
-                            if not t.endswith(_suffix):
-                                continue
-                            t = t[:-len(_suffix)]
-                        try:
-                            t = int(t)
-                        except ValueError:
-                            continue
-                        ts.append(t)
-                        ls.append(l)
+                # listing cache should be up-to-date
+                _, updates = self.pageFiles(page)
+                ts = [ t for t, _ in updates ]
+                ls = [ l for _, l in updates ]
                 if ts:
                     if 1 < len(set(ts)):
                         msg = "multiple update indices for page '{}'".format(page)
@@ -477,12 +569,109 @@ class IndexRelay(AbstractIndexRelay):
                 raise NotImplementedError(msg)
         else:
             reffile = self.persistentIndex(page)
-            for filename, mtime in self.listing_cache:
-                if filename == reffile:
-                    timestamp = int(round(calendar.timegm(mtime)))
-                    break
+            if reffile in self.listing_cache:
+                mtime = self.listing_cache.mtime(reffile)
+                timestamp = int(round(calendar.timegm(mtime)))
         return timestamp
 
+    def _indexFile(self, filename):
+        """
+        Classify a file in the repository root as persistent index, update index,
+        update data or journal segment.
+
+        Returns:
+
+            (str, str, int or None) or None: page, kind (*'index'*, *'update'* or
+                *'journal'*) and update timestamp or segment number (``None`` for
+                persistent indices), or ``None`` if `filename` is not index-related.
+        """
+        page = _strip(filename, self._persistent_index_prefix, self._persistent_index_suffix)
+        if page and '.' not in page:
+            return page, 'index', None
+        page = _strip(filename, self._journal_prefix, self._journal_suffix)
+        if page and '.' in page:
+            page, n = page.rsplit('.', 1)
+            try:
+                return page, 'journal', int(n)
+            except ValueError:
+                pass
+        if self._timestamp_index:
+            for prefix, suffix in ((self._update_index_prefix, self._update_index_suffix),
+                    (self._update_data_prefix, self._update_data_suffix)):
+                page = _strip(filename, prefix, suffix)
+                if page and '.' in page:
+                    page, t = page.rsplit('.', 1)
+                    try:
+                        return page, 'update', int(t)
+                    except ValueError:
+                        pass
+        return None
+
+    def pageFiles(self, page):
+        """
+        Index-related files of a page, as found in the listing cache.
+
+        Files in the repository root are classified once per listing.
+
+        Arguments:
+
+            page (str): page key/name.
+
+        Returns:
+
+            (str or None, list): path to the persistent index if any, and
+                (timestamp, path) pairs for the update indices and data.
+
+        *new in 0.7.12*
+        """
+        files = self._pageTable().get(page)
+        if files is None:
+            return None, []
+        else:
+            return files[0], list(files[1])
+
+    def journalSegments(self, page):
+        """
+        Journal segments of a page, as found in the listing cache.
+
+        Returns:
+
+            list: (number, path) pairs in increasing order.
+
+        *new in 0.7.12*
+        """
+        files = self._pageTable().get(page)
+        if files is None:
+            return []
+        else:
+            return sorted(files[2])
+
+    def _pageTable(self):
+        ls = self.listing_cache
+        if ls is None:
+            return {}
+        if ls.pages is None:
+            pages = {}
+            for filename in ls.directories.get('', ()):
+                if filename not in ls.hidden:
+                    continue
+                entry = self._indexFile(filename)
+                if entry is None:
+                    continue
+                _page, kind, n = entry
+                try:
+                    files = pages[_page]
+                except KeyError:
+                    files = pages[_page] = [None, [], []]
+                if kind == 'index':
+                    files[0] = filename
+                elif kind == 'update':
+                    files[1].append((n, filename))
+                else:
+                    files[2].append((n, filename))
+            ls.pages = pages
+        return ls.pages
+
     @property
     def listing_cache(self):
         return self.base_relay.listing_cache
@@ -492,14 +681,53 @@ class IndexRelay(AbstractIndexRelay):
         self.base_relay.listing_cache = cache
 
     def remoteListing(self):
+        now = time.time()
         self.base_relay.remoteListing()
+        # new in 0.7.12
+        self.listing_time = now
 
     def refreshListing(self, remote_dir='', force=False):
         now = time.time()
         if force or not (self.listing_time and now - self.listing_time < self.listing_cooldown):
             #self.listing_cache = list(self.base_relay._list(remote_dir, recursive=False, stats=('mtime',)))
             self.remoteListing()
-            self.listing_time = now
+
+    def shareIndex(self, relay):
+        """
+        Make another relay use the same loaded indices and journal state.
+
+        The relays can then process distinct pages concurrently, e.g. in transfer
+        workers. Each relay keeps its own connection, listing and page locks;
+        see also :meth:`catchUpListing`.
+
+        Arguments:
+
+            relay (IndexRelay): relay of the same type and for the same repository.
+
+        *new in 0.7.12*
+        """
+        relay.index = self.index
+        relay.index_mtime = self.index_mtime
+        relay.last_update = self.last_update
+        relay.last_update_cache = self.last_update_cache
+        relay.journal_seq = self.journal_seq
+        relay.journal_size = self.journal_size
+        relay.snapshot_size = self.snapshot_size
+
+    def catchUpListing(self, relay):
+        """
+        List the relay repository again if the listing is older than that of
+        another relay, typically the relay that shares its indices with this one.
+
+        Arguments:
+
+            relay (IndexRelay): reference relay.
+
+        *new in 0.7.12*
+        """
+        if self.listing_cache is None or self.listing_time is None or \
+                (relay.listing_time and self.listing_time < relay.listing_time):
+            self.remoteListing()
 
     def clearIndex(self, page=None):
         if page is None:
@@ -537,10 +765,7 @@ class IndexRelay(AbstractIndexRelay):
             if self.base_relay.exists(persistent_index):
                 assert self.index_mtime[page] is not None
                 if not mtime:
-                    mtime = [ mtime for name, mtime in self.listing_cache \
-                            if name == persistent_index ]
-                    if mtime:
-                        mtime = mtime[0]
+                    mtime = self.listing_cache.mtime(persistent_index)
                 if mtime:
                     t1 = mtime
                     t2 = self.index_mtime[page]
@@ -629,8 +854,14 @@ class IndexRelay(AbstractIndexRelay):
         except Exception as e:
             self.logger.debug("cannot delete file '%s': %s", remote_file, e)
         try:
-            self.listing_cache = [ (l,s) for l,s in self.listing_cache if l != remote_file ]
-        except TypeError:
+            self.listing_cache.remove(remote_file)
+        except AttributeError:
+            pass
+
+    def _listed(self, remote_file):
+        try:
+            self.listing_cache.add(remote_file)
+        except AttributeError:
             pass
 
     def setUpdateData(self, page, datafile):
@@ -679,21 +910,7 @@ class IndexRelay(AbstractIndexRelay):
 
     def listPages(self, remote_dir=''):
         self.refreshListing(remote_dir)
-        files = []
-        for filename, _ in self.listing_cache:
-            if self._persistent_index_prefix:
-                if filename.startswith(self._persistent_index_prefix):
-                    filename = filename[len(self._persistent_index_prefix):]
-                else:
-                    continue
-            if self._persistent_index_suffix:
-                if filename.endswith(self._persistent_index_suffix):
-                    filename = filename[:-len(self._persistent_index_suffix)]
-                else:
-                    continue
-            if filename and '.' not in filename:
-                files.append(filename)
-        return files
+        return [ page for page, files in self._pageTable().items() if files[0] ]
 
     def listReady(self, remote_dir='', recursive=True):
         return self.base_relay.listReady(remote_dir, recursive)
@@ -750,11 +967,11 @@ class IndexRelay(AbstractIndexRelay):
     def repairUpdates(self):
         self.refreshListing()
         for page in self.allPages():
-            if self.base_relay.lock(page) in [ l for l,_ in self.listing_cache ]:
+            if self.base_relay.lock(page) in self.listing_cache:
                 lock = self.base_relay.getLockInfo(page)
                 if not lock or not lock.owner or lock.owner == self.client:
                     if not lock or not lock.mode or lock.mode == 'w':
-                        for f,_ in self.listing_cache:
+                        for f in list(self.listing_cache.hidden):
                             if self.updateRelated(page, f):
                                 self.logger.debug("releasing remnant update file '%s'", f)
                                 self.unlink(f)
@@ -770,6 +987,7 @@ class IndexRelay(AbstractIndexRelay):
         try:
             self.base_relay._get(remote_index, tmp)
             self.index[page], _ = read_index(tmp, groupby=self.metadata_group_by, compress=True, debug=self.logger.debug)
+            self.replayJournal(page, self.index[page])
             index_copy = dict(self.index[page]) # in the case the request is rejected
             reported_missing = []
             for remote_file in remote_files:
@@ -790,16 +1008,21 @@ class IndexRelay(AbstractIndexRelay):
                 self.index[page] = index_copy
                 return
             if self.index[page]:
-                write_index(tmp, self.index[page], groupby=self.metadata_group_by, compress=True)
+                write_index(tmp, self.index[page], groupby=self.metadata_group_by,
+                        compress=self.index_compression, compact=self.compact_index)
                 self.logger.debug("updating index for page '%s'", page)
                 self.base_relay._push(tmp, remote_index)
-                self.index_mtime[page] = [ mtime for name, mtime in self.listing_cache if name == remote_index ][0]
+                # the removed files should not be found again in the journal
+                self.resetJournal(page, tmp)
+                self.index_mtime[page] = self.listing_cache.files[remote_index]
             elif self.allow_page_deletion:
                 for remote_file in reported_missing:
                     self.logger.info("file '%s' reported missing", remote_file)
                 self.logger.warning("removing index page '%s'", page)
                 ## new in 0.7.6: write an empty index instead of deleting it
                 self.unlink(remote_index)
+                for _, segment in self.journalSegments(page):
+                    self.unlink(segment)
                 #self.base_relay.touch(remote_index)
                 backup = '{}.backup'.format(page)
                 self.logger.info("dumping existing index in '%s'", backup)
@@ -811,14 +1034,16 @@ class IndexRelay(AbstractIndexRelay):
 
     def getIndexChanges(self, page, sync=True, check_mtime=False):
         index = {}
+        changes = None
         location = self.persistentIndex(page)
-        index_mtime = [ mtime for name, mtime in self.listing_cache if name == location ]
-        if index_mtime:
-            index_mtime = index_mtime[0]
+        if location in self.listing_cache:
+            index_mtime = self.listing_cache.mtime(location)
             timestamp = self.updateTimestamp(page, mode='r') # read last update timestamp on the relay
             if self.loaded(page, index_mtime, check_mtime):
+                # read the journal segments pushed since the last call
+                changes = self.replayJournal(page, self.index[page], self.journal_seq.get(page, 0))
                 if not timestamp:
-                    return index
+                    return changes
                 if page not in self.last_update or self.last_update[page] < timestamp:
                     location = self.updateIndex(page, mode='r')
                     self.logger.debug("downloading index update '%s' for page '%s'", timestamp, page)
@@ -842,13 +1067,125 @@ class IndexRelay(AbstractIndexRelay):
                 tmp = self.base_relay.newTemporaryFile()
                 self.base_relay._get(location, tmp)
                 index, _ = read_index(tmp, groupby=self.metadata_group_by, compress=True, debug=self.logger.debug)
+                self.snapshot_size[page] = os.path.getsize(tmp)
+                self.journal_size[page] = 0
+                self.journal_seq[page] = 0
+                self.base_relay.delTemporaryFile(tmp)
+                self.replayJournal(page, index)
                 self.index[page] = index
                 self.index_mtime[page] = index_mtime
-                self.base_relay.delTemporaryFile(tmp)
             if timestamp:
                 self.last_update[page] = timestamp
+            if changes:
+                changes.update(index)
+                index = changes
         return index
 
+    def replayJournal(self, page, index, since=0):
+        """
+        Download the journal segments of a page numbered after `since`, and apply
+        them to `index`.
+
+        Arguments:
+
+            page (str): page key/name.
+
+            index (dict): page index; modified in place.
+
+            since (int): number of the last segment already applied.
+
+        Returns:
+
+            dict: entries found in the segments.
+
+        *new in 0.7.12*
+        """
+        changes = {}
+        segments = [ (n, segment) for n, segment in self.journalSegments(page) if since < n ]
+        if not segments:
+            return changes
+        tmp = self.base_relay.newTemporaryFile()
+        try:
+            for n, segment in segments:
+                self.logger.debug("downloading index journal segment '%s' for page '%s'", n, page)
+                self.base_relay._get(segment, tmp)
+                entries, _ = read_index(tmp, groupby=self.metadata_group_by, debug=self.logger.debug)
+                changes.update(entries)
+                self.journal_size[page] = self.journal_size.get(page, 0) + os.path.getsize(tmp)
+                self.journal_seq[page] = n
+        finally:
+            self.base_relay.delTemporaryFile(tmp)
+        index.update(changes)
+        return changes
+
+    def journalPending(self, page):
+        """
+        Tell whether the journal of a page has segments that have not been read yet.
+
+        *new in 0.7.12*
+        """
+        since = self.journal_seq.get(page, 0)
+        return any([ since < n for n, _ in self.journalSegments(page) ])
+
+    def appendJournal(self, page, index_update, tmp):
+        """
+        Push an index update as a new journal segment.
+
+        The lock should be acquired and the previous segments should be applied.
+
+        *new in 0.7.12*
+        """
+        segments = self.journalSegments(page)
+        n = max([ self.journal_seq.get(page, 0) ] + [ n for n, _ in segments ]) + 1
+        write_index(tmp, index_update, groupby=self.metadata_group_by,
+                compress=self.index_compression, compact=self.compact_index)
+        self.logger.debug("appending journal segment '%s' to index page '%s'", n, page)
+        segment = self.journalSegment(page, n)
+        self._force('push journal segment', page, self.base_relay._push, tmp, segment)
+        self._listed(segment)
+        self.journal_seq[page] = n
+        self.journal_size[page] = self.journal_size.get(page, 0) + os.path.getsize(tmp)
+
+    def journalFull(self, page):
+        """
+        Tell whether the journal of a page should be compacted.
+
+        *new in 0.7.12*
+        """
+        if self.max_journal_segments <= len(self.journalSegments(page)):
+            return True
+        return page in self.snapshot_size and \
+            self.snapshot_size[page] * self.max_journal_ratio < self.journal_size.get(page, 0)
+
+    def resetJournal(self, page, snapshot):
+        """
+        Delete the journal segments of a page, once a new snapshot has been pushed.
+
+        An empty segment is pushed first, so that the segment numbers keep
+        increasing.
+        The lock should be acquired.
+
+        Arguments:
+
+            page (str): page key/name.
+
+            snapshot (str): path to local copy of the new snapshot.
+
+        *new in 0.7.12*
+        """
+        self.snapshot_size[page] = os.path.getsize(snapshot)
+        self.journal_size[page] = 0
+        segments = self.journalSegments(page)
+        if not segments:
+            return
+        n = max(self.journal_seq.get(page, 0), segments[-1][0]) + 1
+        anchor = self.journalSegment(page, n)
+        self.base_relay.touch(anchor)
+        self._listed(anchor)
+        for _, segment in segments:
+            self.unlink(segment)
+        self.journal_seq[page] = n
+
     def hasIndex(self, page):
         persistent_index = self.persistentIndex(page)
         return self.base_relay.exists(persistent_index)
@@ -873,8 +1210,10 @@ class IndexRelay(AbstractIndexRelay):
         fd, tmp = tempfile.mkstemp()
         try:
             os.close(fd)
-            write_index(tmp, index, groupby=self.metadata_group_by, compress=True)
+            write_index(tmp, index, groupby=self.metadata_group_by,
+                    compress=self.index_compression, compact=self.compact_index)
             self._force('update page index', page, self.base_relay._push, tmp, index_location)
+            self.resetJournal(page, tmp)
         finally:
             os.unlink(tmp)
 
@@ -883,7 +1222,7 @@ class IndexRelay(AbstractIndexRelay):
             self.logger.warning("empty update index for page '%s'", page)
             return
         index_location = self.persistentIndex(page)
-        exists = index_location in [ f for f,_ in self.listing_cache ]
+        exists = index_location in self.listing_cache
         tmp = self.base_relay.newTemporaryFile()
         index_update = index
         upload_index = sync or not exists
@@ -891,22 +1230,36 @@ class IndexRelay(AbstractIndexRelay):
             if exists:
                 if page not in self.index or not self.index[page]:
                     self.remoteListing() # double check
-                    exists = index_location in [ f for f,_ in self.listing_cache ]
+                    exists = index_location in self.listing_cache
                     if exists:
                         raise RuntimeError("page '%s' exists but is empty", page)
                     else:
                         raise RuntimeError("page '%s' was deleted after it has been augmented", page)
                 index = self.index[page]
+                # new in 0.7.12: apply the journal segments first
+                if self.max_journal_segments:
+                    self.remoteListing()
+                self.replayJournal(page, index, self.journal_seq.get(page, 0))
                 index.update(index_update)
             if sync:
                 self.index[page] = index
             #
-            self.logger.debug("uploading index for page '%s'", page)
-            write_index(tmp, index, groupby=self.metadata_group_by, compress=True)
-            self._force('update page index', page, self.base_relay._push, tmp, index_location)
+            if exists and self.max_journal_segments:
+                self.appendJournal(page, index_update, tmp)
+                compact = self.journalFull(page)
+                if compact:
+                    self.logger.debug("compacting index journal for page '%s'", page)
+            else:
+                compact = True
+            if compact:
+                self.logger.debug("uploading index for page '%s'", page)
+                write_index(tmp, index, groupby=self.metadata_group_by,
+                        compress=self.index_compression, compact=self.compact_index)
+                self._force('update page index', page, self.base_relay._push, tmp, index_location)
+                self.resetJournal(page, tmp)
         #
         if True:#exists:
-            write_index(tmp, index_update)
+            write_index(tmp, index_update, compact=self.compact_index)
             update_location = self.updateIndex(page, mode='w')
             if self._timestamp_index:
                 self.logger.debug("uploading index update '%s' for page '%s'",
@@ -916,7 +1269,7 @@ class IndexRelay(AbstractIndexRelay):
         #
         self.remoteListing()
         if upload_index:
-            self.index_mtime[page] = [ mtime for name, mtime in self.listing_cache if name == index_location ][0]
+            self.index_mtime[page] = self.listing_cache.files[index_location]
 
     def setUpdateData(self, page, data):
         self.base_relay._push(data, self.updateData(page, mode='w'))
@@ -936,6 +1289,9 @@ class IndexRelay(AbstractIndexRelay):
             if location:
                 self.unlink(location)
             return
+        elif not location:
+            # no update on the relay, e.g. only journal segments were read
+            return
         #
         #if not location:
         #    # no update yet on the relay
@@ -943,7 +1299,7 @@ class IndexRelay(AbstractIndexRelay):
         #    location = self.updateIndex(page, mode='w')
         #
         tmp = self.base_relay.newTemporaryFile()
-        write_index(tmp, index, pullers)
+        write_index(tmp, index, pullers, compact=self.compact_index)
         self.logger.debug("uploading index update for page '%s'", page)
         self._force('push update index', page, self.base_relay._push, tmp, location)
         self.base_relay.delTemporaryFile(tmp)
@@ -990,10 +1346,166 @@ class TopDirectoriesIndex(IndexRelay):
     def allPages(self):
         self.refreshListing()
         locks_and_indices = self.listPages()
-        for entry, _ in self.listing_cache:
-            if self.base_relay._isLock(entry):
-                page = self.base_relay._fromLock(entry)
-                if page not in [ l for l, _ in self.listing_cache ]:
-                    locks_and_indices.append(page)
+        for page in self.listing_cache.locks:
+            if '/' not in page and page not in self.listing_cache:
+                locks_and_indices.append(page)
         return set(IndexRelay.allPages(self) + locks_and_indices)
 
+
+
+
+def _hash_bits(resource):
+    """
+    Leading bits of the MD5 digest of a resource path, as a string of '0' and '1'.
+    """
+    digest = hashlib.md5(asbytes(resource)).hexdigest()
+    return '{:032b}'.format(int(digest[:8], 16))
+
+
+class HashIndex(IndexRelay):
+    """
+    Index-based relay with balanced pages.
+
+    Resources are assigned to pages by the leading bits of the MD5 digest of their
+    path, so that pages do not depend on the directory structure.
+    A page is named after the bits that all its resources share, with prefix
+    `page_prefix`; the first page is `page_prefix` itself.
+
+    A page is split in two pages once it has more than `max_page_entries` entries
+    or its persistent index is larger than `max_index_size` bytes.
+    Splitting happens when a writer acquires the page lock, as long as no update is
+    pending for the page, and requires the locks of the two new pages as well.
+    The two new pages are pushed first, and the split page is deleted last.
+
+    As a consequence, the split map is defined by the page indices found on the
+    relay: a page is split if it has no persistent index and the name of another
+    page begins with its name.
+    All the clients therefore agree on the split map as soon as they list the relay.
+
+    Attributes:
+
+        max_page_entries (int): maximum number of entries per page.
+
+        max_index_size (int): maximum size of a persistent index in bytes.
+
+        page_prefix (str): prefix of the page names.
+
+    *new in 0.7.12*
+    """
+    def __init__(self, *args, **kwargs):
+        self.max_page_entries = kwargs.pop('max_page_entries', 100000)
+        self.max_index_size = kwargs.pop('max_index_size', 33554432) # 32MB
+        self.page_prefix = 'h'
+        self._split_map = None
+        IndexRelay.__init__(self, *args, **kwargs)
+
+    def splitMap(self):
+        """
+        Pages and split pages, as found in the listing cache.
+
+        Returns:
+
+            (set, set): names of the existing pages and of the split pages.
+        """
+        table = self._pageTable()
+        if self._split_map is None or self._split_map[0] is not table:
+            n = len(self.page_prefix)
+            pages = set([ page for page, files in table.items()
+                if files[0] and page.startswith(self.page_prefix) ])
+            prefixes = set([ page[:i] for page in pages for i in range(n, len(page)) ])
+            self._split_map = (table, (pages, prefixes - pages))
+        return self._split_map[1]
+
+    def page(self, resource):
+        _, split = self.splitMap()
+        page = self.page_prefix
+        if page in split:
+            bits = _hash_bits(resource)
+            for bit in bits:
+                page += bit
+                if page not in split:
+                    break
+        return page
+
+    def allPages(self):
+        self.refreshListing()
+        pages = self.listPages()
+        for page in self.listing_cache.locks:
+            if '/' not in page and page.startswith(self.page_prefix) and \
+                    not page[len(self.page_prefix):].strip('01') and \
+                    page not in self.listing_cache:
+                pages.append(page)
+        return set(IndexRelay.allPages(self) + pages)
+
+    def acquirePageLock(self, page, mode):
+        IndexRelay.acquirePageLock(self, page, mode)
+        self.refreshListing()
+        _, split = self.splitMap()
+        if page in split:
+            # another client has split the page
+            self.releasePageLock(page)
+            raise PostponeRequest("page '%s' has been split", page)
+        if mode == 'w' and self.pageFull(page) and self.splitPage(page):
+            self.releasePageLock(page)
+            raise PostponeRequest("page '%s' has been split", page)
+        return True
+
+    def pageFull(self, page):
+        """
+        Tell whether a page should be split, based on the loaded index only.
+        """
+        if page not in self.index:
+            return False
+        return self.max_page_entries < len(self.index[page]) or \
+            self.max_index_size < self.snapshot_size.get(page, 0)
+
+    def splitPage(self, page):
+        """
+        Split a page in two pages.
+
+        The lock should be acquired.
+
+        Returns:
+
+            bool: ``True`` if the page has been split.
+        """
+        depth = len(page) - len(self.page_prefix)
+        if 32 <= depth:
+            return False
+        _, updates = self.pageFiles(page)
+        if updates:
+            # the update should be consumed first
+            return False
+        children = (page + '0', page + '1')
+        locked = []
+        try:
+            for child in children:
+                if not self.tryAcquirePageLock(child, 'w'):
+                    self.logger.debug("cannot lock page '%s'; not splitting page '%s'", child, page)
+                    return False
+                locked.append(child)
+            index = self.getPageIndex(page)
+            halves = ({}, {})
+            for resource in index:
+                halves[int(_hash_bits(resource)[depth])][resource] = index[resource]
+            self.logger.info("splitting page '%s' (%s entries) into pages '%s' and '%s' (%s and %s entries)",
+                    page, len(index), children[0], children[1], len(halves[0]), len(halves[1]))
+            for child, half in zip(children, halves):
+                self.index.pop(child, None)
+                self.index_mtime.pop(child, None)
+                if half:
+                    self.setPageIndex(child, half)
+                elif self.persistentIndex(child) in self.listing_cache:
+                    # remnant of an interrupted split
+                    self.unlink(self.persistentIndex(child))
+            # the page is split once its index is deleted
+            self.unlink(self.persistentIndex(page))
+            for _, segment in self.journalSegments(page):
+                self.unlink(segment)
+            self.index.pop(page, None)
+            self.index_mtime.pop(page, None)
+            self.remoteListing()
+            return True
+        finally:
+            for child in locked:
+                self.releasePageLock(child)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Compact binary index format.
+
+A compact index file begins with :data:`compact_index_magic` followed by a version
+byte, so that readers can tell it from the text format.
+
+Version 1 layout (integers are big-endian uint32):
+
+* string table: number of strings, byte length of the table, and the strings
+  separated by NUL characters in UTF-8; the strings are the grouped metadata lines
+  (e.g. *pusher*, *placeholder*) shared by the resources;
+* blocks of at most `block_size` records, each made of the number of records,
+  the byte lengths of the path and metadata tables, the string index of each record
+  (``0xffffffff`` for missing metadata), and the paths and the metadata
+  separated by NUL characters in UTF-8;
+* an empty block;
+* pullers: number of pullers, byte length, and the names separated by NUL characters.
+
+Tables are decoded and split at once, so that reading does not involve per-record
+parsing.
+
+*new in 0.7.12*
+"""
+
+
+from escale.base.essential import asstr, asbytes
+import struct
+
+
+compact_index_magic = b'\x00escale-index\n'
+compact_index_version = 1
+
+_version = struct.Struct('>B')
+_table = struct.Struct('>II')
+_block = struct.Struct('>III')
+_missing = 0xffffffff
+
+default_block_size = 65536
+
+
+def is_compact_index(head):
+    """
+    Tell whether the first bytes of an index file are those of a compact index.
+    """
+    return head[:len(compact_index_magic)] == compact_index_magic
+
+
+def _pack_table(strings):
+    table = asbytes('\x00'.join(strings))
+    return [ _table.pack(len(strings), len(table)), table ]
+
+
+def _read_table(f):
+    n, size = _table.unpack(_read(f, _table.size))
+    if not n:
+        return []
+    return asstr(_read(f, size)).split('\x00')
+
+
+def _read(f, n):
+    data = f.read(n)
+    if len(data) < n:
+        raise ValueError('truncated compact index')
+    return data
+
+
+def write_compact_index(f, groups, pullers=[], block_size=default_block_size):
+    """
+    Write an index in the compact format.
+
+    Arguments:
+
+        f (file object): binary file open for writing.
+
+        groups (list): (group, metadata) pairs where group is the string shared
+            by the resources in the metadata ``dict``, as returned by :func:`read_index`
+            (``''`` or lines ending with a newline), and metadata has resource paths
+            as keys and metadata strings (or ``None``) as values.
+
+        pullers (list): puller names.
+
+        block_size (int): maximum number of records per block.
+    """
+    f.write(compact_index_magic + _version.pack(compact_index_version))
+    f.write(b''.join(_pack_table([ group for group, _ in groups ])))
+    paths, indices, mdata = [], [], []
+    def flush():
+        _paths = asbytes('\x00'.join(paths))
+        _mdata = asbytes('\x00'.join(mdata))
+        f.write(b''.join([ _block.pack(len(paths), len(_paths), len(_mdata)),
+            struct.pack('>{}I'.format(len(indices)), *indices), _paths, _mdata ]))
+        del paths[:], indices[:], mdata[:]
+    for index, (_, metadata) in enumerate(groups):
+        for resource in metadata:
+            m = metadata[resource]
+            paths.append(resource)
+            if m:
+                indices.append(index)
+                mdata.append(m if m.endswith('\n') else m + '\n')
+            else:
+                indices.append(_missing)
+            if block_size <= len(paths):
+                flush()
+    if paths:
+        flush()
+    f.write(_block.pack(0, 0, 0))
+    f.write(b''.join(_pack_table(pullers)))
+
+
+def read_compact_index(f):
+    """
+    Read an index in the compact format.
+
+    Arguments:
+
+        f (file object): binary file open for reading.
+
+    Returns:
+
+        (dict, list): metadata strings (or ``None``) for resource paths as keys,
+            and puller names, as returned by :func:`read_index`.
+    """
+    if not is_compact_index(_read(f, len(compact_index_magic))):
+        raise ValueError('not a compact index')
+    version, = _version.unpack(_read(f, _version.size))
+    if compact_index_version < version:
+        raise ValueError('unsupported compact index version: {}'.format(version))
+    groups = _read_table(f)
+    metadata = {}
+    while True:
+        n, paths_size, mdata_size = _block.unpack(_read(f, _block.size))
+        if not n:
+            break
+        indices = struct.unpack('>{}I'.format(n), _read(f, 4 * n))
+        paths = asstr(_read(f, paths_size)).split('\x00')
+        mdata = asstr(_read(f, mdata_size)).split('\x00') if mdata_size else []
+        if len(mdata) == n:
+            metadata.update(zip(paths, [ groups[index] + m
+                for index, m in zip(indices, mdata) ]))
+        else:
+            mdata = iter(mdata)
+            for path, index in zip(paths, indices):
+                if index == _missing:
+                    metadata[path] = None
+                else:
+                    metadata[path] = groups[index] + next(mdata)
+    pullers = _read_table(f)
+    return (metadata, pullers)
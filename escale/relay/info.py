@@ -20,6 +20,7 @@
 
 
 from escale.base.essential import asstr, basestring
+from escale.base.hashing import hash_file, read_blocks
 import os.path
 # former format
 import time
@@ -64,27 +65,35 @@ class LockInfo(object):
             return ''
 
 
-def parse_lock_file(file, target=None):
-    if target is None:
-        target = file
+def parse_lock(lines, target=None):
+    """
+    *new in 0.7.12*
+    """
     version = None
     owner = None
     mode = None
-    with open(file, 'r') as f:
-        line = f.readline()
-        if line.startswith('lock%'):
-            version = line[5:].rstrip() # 1.0
-            for line in f.readlines():
-                if line.startswith('owner:'):
-                    owner = line[6:].strip()
-                elif line.startswith('mode:'):
-                    mode = line[5:].strip()
-        else: # first format
-            if line:
-                owner = line
+    line = lines[0] if lines else ''
+    if line.startswith('lock%'):
+        version = line[5:].rstrip() # 1.0
+        for line in lines[1:]:
+            if line.startswith('owner:'):
+                owner = line[6:].strip()
+            elif line.startswith('mode:'):
+                mode = line[5:].strip()
+    else: # first format
+        if line:
+            owner = line
     return LockInfo(version, owner, target, mode)
 
 
+def parse_lock_file(file, target=None):
+    if target is None:
+        target = file
+    with open(file, 'r') as f:
+        lines = f.readlines()
+    return parse_lock(lines, target)
+
+
 former_timestamp_format = '%y%m%d_%H%M%S'
 
 
@@ -92,11 +101,14 @@ class Metadata(object):
 
     __slots__ = ['header', 'version', 'target', 'pusher',
             'timestamp', 'timestamp_format', 'checksum',
-            'parts', 'pullers',
+            'parts', 'partsize', 'delta', 'pullers',
             'ignored']
 
     def __init__(self, version=None, target=None, pusher=None, timestamp=None, timestamp_format=None,
-            checksum=None, parts=None, pullers=[], **ignored):
+            checksum=None, parts=None, partsize=None, delta=None, pullers=[], **ignored):
+        """
+        *new in 0.7.12:* partsize, delta
+        """
         self.header = 'placeholder'
         if pusher:
             pusher = asstr(pusher)
@@ -123,6 +135,12 @@ class Metadata(object):
         if parts:
             parts = int(parts)
         self.parts = parts
+        if partsize:
+            partsize = int(partsize)
+        self.partsize = partsize
+        # checksum of the version the delta applies to; the delta is stored as a
+        # hidden delta file, see :meth:`~escale.relay.relay.Relay.delta`
+        self.delta = delta
 
     def __repr__(self):
         if self.version:
@@ -137,6 +155,10 @@ class Metadata(object):
                 info.append(': '.join(('checksum', asstr(self.checksum))))
             if self.parts:
                 info.append(': '.join(('parts', str(self.parts))))
+            if self.partsize:
+                info.append(': '.join(('partsize', str(self.partsize))))
+            if self.delta:
+                info.append(': '.join(('delta', asstr(self.delta))))
             for k in self.ignored:
                 info.append(': '.join((k, self.ignored[k])))
             info.append('---pullers---')
@@ -181,8 +203,9 @@ class Metadata(object):
 
             checksum (str-like): checksum of file content (local).
 
-            hash_function (callable): hash function that can be applied to the
-                content of the `local_file` file if `checksum` is not defined.
+            hash_function (escale.base.hashing.Hash or callable): hash function that
+                can be applied to the content of the `local_file` file if `checksum` is
+                not defined; :class:`~escale.base.hashing.Hash` objects stream the file.
 
             remote (bool): if `True`, `fileModified` tells whether or not
                 the remote copy of the file is a modified version of the 
@@ -203,9 +226,7 @@ class Metadata(object):
         identical = None
         if self.checksum:
             if not checksum and file_available and hash_function is not None:
-                with open(local_file, 'rb') as f:
-                    content = f.read()
-                    checksum = hash_function(content)
+                checksum = hash_file(local_file, hash_function)
             if checksum:
                 identical = checksum == self.checksum
                 #if debug and not identical:
@@ -223,12 +244,10 @@ class Metadata(object):
                     msg = "the last modification times match but the checksums do not: file {}".format(self.target if self.target else local_file)
                     if debug:
                         debug(msg)
-                        if file_available:
-                            with open(local_file, 'rb') as f:
-                                content = f.read()
                         try:
-                            import struct
-                            cs = sum(struct.unpack('<'+'B'*len(content), content))
+                            cs = 0
+                            for block in read_blocks(local_file):
+                                cs += sum(bytearray(block))
                             debug((local_file, cs, checksum, self.checksum))
                         except (KeyboardInterrupt, SystemExit):
                             raise
@@ -271,7 +290,7 @@ def parse_metadata(lines, target=None, timestamp_format=None, log=None):
     # define a few helpers
     def invalid(line):
         return ValueError("invalid meta attribute: '{}'".format(line))
-    convert = {'timestamp': int, 'parts': int}
+    convert = {'timestamp': int, 'parts': int, 'partsize': int}
     # 'parts' can be converted in `Metadata` constructor; 'timestamp' cannot
     # parse
     meta = {}
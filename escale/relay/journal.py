@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.exceptions import ExpressInterrupt
+import time
+import calendar
+import random
+import threading
+
+
+change_journal_prefix = '.changes.'
+
+
+class ChangeJournal(object):
+    """
+    Feed of the changes made to a relay repository.
+
+    Each client appends to its own stream of journal files
+    ``.changes.<stream>.<seq>`` in the repository root.
+    A journal file lists the paths of the regular files that have been pushed,
+    pulled or deleted since the previous journal file of the same stream.
+    Sequence numbers start at 0 and increase by 1.
+
+    Readers keep track of the last sequence number they have seen in each stream,
+    and list again only the directories of the files that appear in the new journal
+    files. A missing journal file (e.g. deleted after `retention` seconds) is
+    considered a gap, and a full listing is required.
+
+    Attributes:
+
+        stream (str): name of the stream this client writes to; made unique
+            per instance.
+
+        full_listing_interval (float): maximum number of seconds between two full
+            listings.
+
+        retention (float): age in seconds beyond which journal files are deleted.
+
+        last_seen (dict): last sequence number read for each stream.
+
+    *new in 0.7.12*
+    """
+    def __init__(self, client, full_listing_interval=3600, retention=86400):
+        self.stream = '{}-{:08x}'.format(client or 'anonymous', random.getrandbits(32))
+        self.full_listing_interval = full_listing_interval
+        self.retention = retention
+        self.last_seen = {}
+        self._seq = 0
+        self._pending = []
+        self._last_full_listing = 0
+        self._lock = threading.Lock()
+
+    def record(self, remote_file):
+        """
+        Record a change to a regular file.
+
+        Thread-safe.
+        """
+        with self._lock:
+            self._pending.append(remote_file)
+
+    def flush(self, relay):
+        """
+        Write the recorded changes as a new journal file.
+
+        Arguments:
+
+            relay (Relay): connected relay.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            relay._push_bytes('\n'.join(self._pending).encode('utf-8'),
+                self.journalFile(self.stream, self._seq))
+            self._seq += 1
+            self._pending = []
+
+    def journalFile(self, stream, seq):
+        return '{}{}.{}'.format(change_journal_prefix, stream, seq)
+
+    def parse(self, filename):
+        """
+        Returns:
+
+            (str, int) or None: stream and sequence number, or ``None`` if
+                `filename` is not a journal file.
+        """
+        if not filename.startswith(change_journal_prefix):
+            return None
+        stream, _, seq = filename[len(change_journal_prefix):].rpartition('.')
+        try:
+            return stream, int(seq)
+        except ValueError:
+            return None
+
+    def _streams(self, root):
+        streams = {}
+        for filename, mtime in root:
+            entry = self.parse(filename)
+            if entry is not None:
+                stream, seq = entry
+                try:
+                    streams[stream][seq] = mtime
+                except KeyError:
+                    streams[stream] = {seq: mtime}
+        return streams
+
+    def fullListingDue(self):
+        return self.full_listing_interval is not None and \
+            self.full_listing_interval <= time.time() - self._last_full_listing
+
+    def reset(self, root):
+        """
+        Mark all the journal files in `root` as read, after a full listing.
+
+        Arguments:
+
+            root (iterable): (path, mtime) pairs for the files in the repository
+                root, listed before the full listing.
+        """
+        self.last_seen = { stream: max(seqs)
+            for stream, seqs in self._streams(root).items() }
+        self._last_full_listing = time.time()
+
+    def read(self, relay, root):
+        """
+        Read the new journal files.
+
+        Arguments:
+
+            relay (Relay): connected relay.
+
+            root (iterable): (path, mtime) pairs for the files in the repository root.
+
+        Returns:
+
+            set or None: paths of the changed regular files, or ``None`` if a full
+                listing is required.
+        """
+        changes, last_seen = set(), dict(self.last_seen)
+        for stream, seqs in self._streams(root).items():
+            last = last_seen.get(stream, -1)
+            new = sorted([ seq for seq in seqs if last < seq ])
+            if not new:
+                continue
+            if new[0] != last + 1 or new[-1] - new[0] + 1 != len(new):
+                # missing journal files
+                return None
+            for seq in new:
+                try:
+                    content = relay._get_bytes(self.journalFile(stream, seq)).decode('utf-8')
+                except ExpressInterrupt:
+                    raise
+                except Exception:
+                    # deleted in the meantime
+                    return None
+                changes.update([ path for path in content.splitlines() if path ])
+            last_seen[stream] = new[-1]
+        self.last_seen = last_seen
+        return changes
+
+    def prune(self, relay, root):
+        """
+        Delete the journal files older than `retention` seconds, in any stream.
+        """
+        if not self.retention:
+            return
+        now = time.time()
+        for stream, seqs in self._streams(root).items():
+            for seq, mtime in seqs.items():
+                if not mtime:
+                    continue
+                if isinstance(mtime, time.struct_time):
+                    mtime = calendar.timegm(mtime)
+                if self.retention < now - mtime:
+                    try:
+                        relay.unlink(self.journalFile(stream, seq))
+                    except ExpressInterrupt:
+                        raise
+                    except Exception:
+                        # already deleted by another client
+                        pass
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+class ListingCache(object):
+    """
+    Remote listing with every entry classified once.
+
+    Iterating over a listing cache yields (path, mtime) pairs, as the former
+    list-based listing cache did.
+
+    The views returned by the `list*` methods of :class:`~escale.relay.relay.Relay`
+    are maintained in the same pass: ready files are the regular files, split files
+    and delta files with no lock, transferred files are the placeholders (end-to-end)
+    or the regular files, placeholders and locks, and candidate corrupted files are
+    the locks.
+
+    Attributes:
+
+        files (dict): last modification times for all the listed paths as keys.
+
+        directories (dict): set of basenames for directory paths as keys
+            (``''`` for the repository root).
+
+        regular (dict): last modification times for the regular file paths as keys.
+
+        placeholders (dict): last modification times of the placeholders for
+            the corresponding regular file paths as keys.
+
+        locks (dict): last modification times of the locks for the corresponding
+            regular file paths as keys.
+
+        contents (dict): last modification times of the first parts of the split
+            files and of the delta files, for the corresponding regular file paths
+            as keys.
+
+        messages (dict): last modification times for the message paths as keys.
+
+        hidden (dict): last modification times for the other hidden file paths
+            as keys (e.g. index files).
+
+        ready (dict): last modification times for the paths of the regular files,
+            or of the files in `contents`, which are not locked.
+
+        placeholders_cached (bool): whether the placeholder modification times
+            have been copied into the relay's placeholder cache.
+
+        pages (any): page table of the index relay, if any;
+            reset whenever the listing changes.
+
+        tokens (dict or None): change tokens for directory paths as keys, as returned
+            by the incremental listing of the relay, if any.
+
+    *new in 0.7.12*
+    """
+    __slots__ = [ 'files', 'directories', 'regular', 'placeholders', 'locks', 'contents',
+        'messages', 'hidden', 'ready', 'pages', 'placeholders_cached', 'tokens', '_relay' ]
+
+    def __init__(self, entries, relay):
+        self._relay = relay
+        self.files = {}
+        self.directories = {}
+        self.regular = {}
+        self.placeholders = {}
+        self.locks = {}
+        self.contents = {}
+        self.messages = {}
+        self.hidden = {}
+        self.ready = {}
+        self.pages = None
+        self.placeholders_cached = False
+        self.tokens = None
+        for entry in entries:
+            if isinstance(entry, tuple):
+                path, mtime = entry
+            else:
+                path, mtime = entry, None
+            self.add(path, mtime)
+
+    def _kind(self, dirname, filename):
+        """
+        Returns:
+
+            (dict, str): category table and key.
+        """
+        relay = self._relay
+        if filename[0] != '.':
+            return self.regular, '/'.join((dirname, filename)) if dirname else filename
+        elif relay._isLock(filename):
+            table, filename = self.locks, relay._fromLock(filename)
+        elif relay._isPlaceholder(filename):
+            table, filename = self.placeholders, relay._fromPlaceholder(filename)
+        elif relay._isMessage(filename):
+            table = self.messages
+        elif relay._isContent(filename):
+            table, filename = self.contents, relay._fromContent(filename)
+        else:
+            table = self.hidden
+        return table, '/'.join((dirname, filename)) if dirname else filename
+
+    def _updateReady(self, key):
+        if key in self.locks:
+            self.ready.pop(key, None)
+        elif key in self.regular:
+            self.ready[key] = self.regular[key]
+        elif key in self.contents:
+            self.ready[key] = self.contents[key]
+        else:
+            self.ready.pop(key, None)
+
+    def add(self, path, mtime=None):
+        """
+        Add or update an entry.
+        """
+        dirname, _, filename = path.rpartition('/')
+        if not filename:
+            return
+        if path not in self.files:
+            try:
+                self.directories[dirname].add(filename)
+            except KeyError:
+                self.directories[dirname] = set([filename])
+        self.files[path] = mtime
+        table, key = self._kind(dirname, filename)
+        table[key] = mtime
+        if table is self.regular or table is self.locks or table is self.contents:
+            self._updateReady(key)
+        elif table is self.placeholders:
+            self.placeholders_cached = False
+        self.pages = None
+
+    def remove(self, path):
+        """
+        Remove an entry, if listed.
+        """
+        try:
+            del self.files[path]
+        except KeyError:
+            return
+        dirname, _, filename = path.rpartition('/')
+        files = self.directories[dirname]
+        files.remove(filename)
+        if not files:
+            del self.directories[dirname]
+        table, key = self._kind(dirname, filename)
+        table.pop(key, None)
+        if table is self.regular or table is self.locks or table is self.contents:
+            self._updateReady(key)
+        self.pages = None
+
+    def replaceDirectory(self, dirname, entries):
+        """
+        Replace the files listed in a directory (not recursive).
+
+        Arguments:
+
+            dirname (str): directory path (``''`` for the repository root).
+
+            entries (iterable): (path, mtime) pairs for the files in `dirname`.
+        """
+        for path in self.byDirectory(dirname):
+            self.remove(path)
+        for path, mtime in entries:
+            self.add(path, mtime)
+
+    def mtime(self, path, default=None):
+        """
+        Last modification time of a listed file, or `default` if not listed.
+        """
+        return self.files.get(path, default)
+
+    def byDirectory(self, dirname=''):
+        """
+        Paths of the files in a directory (not recursive).
+        """
+        dirname = dirname.rstrip('/')
+        files = self.directories.get(dirname, [])
+        if dirname:
+            return [ '/'.join((dirname, f)) for f in files ]
+        else:
+            return list(files)
+
+    def transferred(self, end2end=True):
+        """
+        Paths of the transferred regular files.
+
+        Arguments:
+
+            end2end (bool): if ``True``, list only the files which content is no
+                longer available, i.e. the placeholders.
+
+        Returns:
+
+            list: paths of regular files.
+        """
+        if end2end:
+            return list(self.placeholders)
+        else:
+            return list(self.regular) + list(self.placeholders) + list(self.locks) + \
+                list(self.contents)
+
+    def __contains__(self, path):
+        return path in self.files
+
+    def __iter__(self):
+        return iter(list(self.files.items()))
+
+    def __len__(self):
+        return len(self.files)
+
+    def __bool__(self):
+        return bool(self.files)
+
+    __nonzero__ = __bool__
+
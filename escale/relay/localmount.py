@@ -13,7 +13,9 @@
 
 from escale.base.essential import *
 from .relay import Relay
+from .multipart import FileSlice
 import os
+import shutil
 import time
 import itertools
 
@@ -59,10 +61,16 @@ class LocalMount(Relay):
 						if f.is_file():
 							# os.DirEntry caches the result of stat()
 							print(f.name)
+							try:
+								st = f.stat()
+							except OSError:
+								# e.g. lock released by another connection
+								# in the meantime; new in 0.7.12
+								continue
 							files.append((
 								os.path.relpath(asstr(f.path), self.repository),
-								f.stat().st_size,
-								f.stat().st_mtime,
+								st.st_size,
+								st.st_mtime,
 								))
 						elif recursive and f.is_dir(): # '.' and '..' are excluded by os.scandir
 							dirs.append(f.path)
@@ -90,6 +98,58 @@ class LocalMount(Relay):
 			files = zip(*[ _files[i] for i in ['name']+list(stats) ])
 		return files
 
+	def _listChanges(self, tokens, racy_delay=2):
+		"""
+		Change tokens are the modification times of the directories.
+
+		Directories modified less than `racy_delay` seconds before they are listed
+		will be listed again on the next pass.
+		"""
+		try:
+			os.scandir
+		except AttributeError: # Python < 3.5
+			raise NotImplementedError
+		now = time.time()
+		new_tokens, listings = {}, {}
+		directories = ['']
+		while directories:
+			relay_dir = directories.pop()
+			if relay_dir:
+				dirname = os.path.join(self.repository, relay_dir)
+			else:
+				dirname = self.repository
+			try:
+				# the token is read before the directory is listed
+				token = os.stat(dirname).st_mtime
+			except OSError:
+				# deleted in the meantime
+				continue
+			changed = tokens.get(relay_dir) != token
+			if now - racy_delay < token:
+				token = None
+			new_tokens[relay_dir] = token
+			files = []
+			try:
+				ls = os.scandir(dirname)
+				try:
+					for f in ls:
+						path = '/'.join((relay_dir, f.name)) if relay_dir else f.name
+						if f.is_dir():
+							directories.append(path)
+						elif changed and f.is_file():
+							files.append((asstr(path), f.stat().st_mtime))
+				finally:
+					try:
+						ls.close()
+					except AttributeError: # Python < 3.6
+						pass
+			except OSError:
+				del new_tokens[relay_dir]
+				continue
+			if changed:
+				listings[relay_dir] = files
+		return new_tokens, listings
+
 	def exists(self, relay_file, dirname=None):
 		path = [ self.repository ]
 		if dirname:
@@ -113,6 +173,38 @@ class LocalMount(Relay):
 				os.makedirs(dirname)
 		copyfile(src, local_file)
 
+	def _push_bytes(self, data, relay_dest, makedirs=True):
+		dirname, basename = os.path.split(relay_dest)
+		dest = os.path.join(self.repository, dirname)
+		if makedirs and not os.path.isdir(dest):
+			os.makedirs(dest)
+		with open(os.path.join(dest, basename), 'wb') as f:
+			f.write(data)
+
+	def _get_bytes(self, relay_file):
+		with open(os.path.join(self.repository, relay_file), 'rb') as f:
+			return f.read()
+
+	def _pushPart(self, local_file, offset, size, relay_dest, makedirs=True):
+		dirname, basename = os.path.split(relay_dest)
+		dest = os.path.join(self.repository, dirname)
+		if makedirs and not os.path.isdir(dest):
+			os.makedirs(dest)
+		with FileSlice(local_file, offset, size) as part:
+			with open(os.path.join(dest, basename), 'wb') as f:
+				shutil.copyfileobj(part, f)
+
+	def _getPart(self, relay_file, local_file, offset):
+		with open(os.path.join(self.repository, relay_file), 'rb') as part:
+			with open(local_file, 'r+b') as f:
+				f.seek(offset)
+				shutil.copyfileobj(part, f)
+
+	def _getRange(self, relay_file, f, offset):
+		with open(os.path.join(self.repository, relay_file), 'rb') as src:
+			src.seek(offset)
+			shutil.copyfileobj(src, f)
+
 	def unlink(self, relay_file):
 		os.unlink(os.path.join(self.repository, relay_file))
 
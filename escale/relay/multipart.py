@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION
+from escale.base.exceptions import ExpressInterrupt
+import threading
+import traceback
+
+if PYTHON_VERSION == 2:
+    import Queue as queue
+else:
+    import queue
+
+
+class FileSlice(object):
+    """
+    Read-only file object restricted to a range of bytes of a local file.
+
+    Can be passed to :meth:`ftplib.FTP.storbinary`, :func:`shutil.copyfileobj`
+    or as the body of a `requests` request, so that a part of a file is streamed
+    with no copy.
+
+    Attributes:
+
+        remaining (int): number of bytes left to read.
+
+    *new in 0.7.12*
+    """
+    __slots__ = [ '_file', 'remaining' ]
+
+    def __init__(self, path, offset, size):
+        self._file = open(path, 'rb')
+        self._file.seek(offset)
+        self.remaining = size
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or self.remaining < size:
+            size = self.remaining
+        data = self._file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def __len__(self):
+        return self.remaining
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PartPool(object):
+    """
+    Bounded pool of extra relay connections for concurrent part transfers.
+
+    Connections are made on demand by calling `make_relay`, and can be shared
+    between several relays, e.g. the transfer workers'.
+
+    Attributes:
+
+        size (int): maximum number of connections.
+
+        make_relay (callable): relay factory.
+
+        logger (Logger): logger.
+
+    *new in 0.7.12*
+    """
+    def __init__(self, size, make_relay, logger=None):
+        self.size = size
+        self.make_relay = make_relay
+        self.logger = logger
+        self.relays = []
+        self._idle = []
+        self._available = threading.Condition()
+
+    def acquire(self):
+        with self._available:
+            while not self._idle and self.size <= len(self.relays):
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            relay = self.make_relay()
+            self.relays.append(relay)
+        try:
+            relay.open()
+        except:
+            with self._available:
+                self.relays.remove(relay)
+                self._available.notify()
+            raise
+        return relay
+
+    def release(self, relay):
+        with self._available:
+            self._idle.append(relay)
+            self._available.notify()
+
+    def map(self, func, items):
+        """
+        Call ``func(relay, *item)`` for each item, concurrently.
+
+        The first exception raised, if any, is raised again once all the items
+        have been processed.
+        """
+        jobs = queue.Queue()
+        for item in items:
+            jobs.put(item)
+        errors = []
+        def work():
+            try:
+                relay = self.acquire()
+            except Exception as e:
+                errors.append(e)
+                return
+            try:
+                while not errors:
+                    try:
+                        item = jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    func(relay, *item)
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.debug(traceback.format_exc())
+                errors.append(e)
+            finally:
+                self.release(relay)
+        workers = [ threading.Thread(target=work)
+            for _ in range(min(self.size, len(items))) ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        with self._available:
+            relays, self.relays, self._idle = self.relays, [], []
+        for relay in relays:
+            try:
+                relay.close()
+            except ExpressInterrupt:
+                raise
+            except:
+                if self.logger is not None:
+                    self.logger.debug(traceback.format_exc())
+
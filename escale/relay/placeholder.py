@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION, asstr
+from .info import Metadata
+import os
+import time
+import json
+import threading
+
+if PYTHON_VERSION == 2:
+    import anydbm as dbm
+else:
+    import dbm
+
+
+placeholder_cache_prefix = 'ph'
+
+_metadata_fields = ('version', 'pusher', 'timestamp', 'timestamp_format', 'checksum',
+    'parts', 'partsize', 'delta', 'pullers', 'ignored')
+
+
+class PlaceholderCache(dict):
+    """
+    Placeholder cache, optionally backed by a dbm file.
+
+    Keys are regular file paths and values are (mtime, :class:`~escale.relay.info.Metadata`)
+    pairs, where mtime is the last modification time of the placeholder as found
+    in the remote listing. A cached :class:`~escale.relay.info.Metadata` is valid as long as
+    the placeholder is not modified.
+
+    The dbm file is read on the first call to :meth:`load`.
+    Modified entries are written to the dbm file on :meth:`flush` calls.
+    Entries with no metadata are not persisted.
+    The cache is shared by the transfer workers; modifications and flushes are
+    serialized.
+
+    Attributes:
+
+        location (str or None): path to dbm file.
+
+        dirty (set): modified keys not written to the dbm file yet.
+
+        loaded (bool): whether the dbm file has been read.
+
+    *new in 0.7.12*
+    """
+
+    def __init__(self, location=None):
+        dict.__init__(self)
+        if location:
+            location = os.path.expanduser(location)
+            dirname = os.path.dirname(location)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        self.location = location
+        self.dirty = set()
+        self.loaded = not location
+        self._lock = threading.Lock()
+
+    def __setitem__(self, path, entry):
+        with self._lock:
+            if dict.get(self, path) != entry:
+                dict.__setitem__(self, path, entry)
+                self.dirty.add(path)
+
+    def __delitem__(self, path):
+        with self._lock:
+            dict.__delitem__(self, path)
+            self.dirty.add(path)
+
+    def load(self):
+        """
+        Read the entries from the dbm file, if not already done.
+        """
+        with self._lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            try:
+                db = dbm.open(self.location, 'r')
+            except dbm.error:
+                # file does not exist yet
+                return
+            try:
+                for path in db.keys():
+                    mtime, meta = json.loads(asstr(db[path]))
+                    path = asstr(path)
+                    if isinstance(mtime, list):
+                        mtime = time.struct_time(mtime)
+                    if path not in self:
+                        ignored = meta.pop('ignored', None) or {}
+                        meta = Metadata(target=path, **meta)
+                        meta.ignored = ignored
+                        dict.__setitem__(self, path, (mtime, meta))
+            finally:
+                db.close()
+
+    def flush(self):
+        """
+        Write the modified entries to the dbm file.
+        """
+        if not self.location:
+            return
+        with self._lock:
+            if not self.dirty:
+                return
+            dirty, self.dirty = self.dirty, set()
+            try:
+                db = dbm.open(self.location, 'c')
+                try:
+                    for path in dirty:
+                        mtime, meta = self.get(path, (None, None))
+                        if mtime is None or meta is None:
+                            try:
+                                del db[path]
+                            except KeyError:
+                                pass
+                            continue
+                        if isinstance(mtime, time.struct_time):
+                            mtime = list(mtime)
+                        meta = { attr: getattr(meta, attr) for attr in _metadata_fields }
+                        if meta['checksum']:
+                            meta['checksum'] = asstr(meta['checksum'])
+                        db[path] = json.dumps([ mtime, meta ])
+                finally:
+                    db.close()
+            except:
+                # retry on next flush
+                self.dirty |= dirty
+                raise
+
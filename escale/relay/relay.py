@@ -20,10 +20,16 @@ import sys
 import time
 import calendar
 import tempfile
+import shutil
 import logging
 
 from escale.base.essential import *
 from .info import *
+from .listing import ListingCache
+from .journal import ChangeJournal
+from .placeholder import PlaceholderCache
+from .multipart import FileSlice
+from .resume import TransferJournal, CheckpointWriter, part_digest
 from escale.log import log_root
 from escale.base.exceptions import *
 
@@ -202,7 +208,8 @@ class AbstractRelay(Reporter):
         """
         raise NotImplementedError('abstract method')
 
-    def push(self, local_file, remote_dest, last_modified=None, checksum=None, blocking=True):
+    def push(self, local_file, remote_dest, last_modified=None, checksum=None, blocking=True,
+            delta=None):
         """
         Upload a file to the remote host.
 
@@ -219,11 +226,17 @@ class AbstractRelay(Reporter):
             blocking (bool): if target exists and is locked, whether should we block
                 until the lock is released or skip the file.
 
+            delta (str): if `local_file` is a delta file, checksum of the version
+                the delta applies to; a delta is not stored under the regular filename,
+                so that clients which do not support deltas do not download it.
+
         Returns:
 
             bool: True if successful, False if failed.
 
         *new in 0.5.1:* checksum
+
+        *new in 0.7.12:* delta
         """
         raise NotImplementedError('abstract method')
 
@@ -365,10 +378,49 @@ class Relay(AbstractRelay):
 
         _message_suffix (str): suffix for message files.
 
-        placeholder_cache (dict): dictionnary of cached placeholders.
+        placeholder_cache (PlaceholderCache): dictionnary of cached placeholders.
+
+        _part_prefix (str): prefix for part files.
+
+        _part_suffix (str): suffix for part files, followed by the part number.
+
+        _delta_prefix (str): prefix for delta files.
+
+        _delta_suffix (str): suffix for delta files.
+
+        part_size (int or None): files larger than `part_size` bytes are split into
+            parts of `part_size` bytes on :meth:`push`; all the parts are stored as
+            hidden part files, and no regular file is stored, so that clients which
+            do not support split files do not download them; deltas are similarly
+            stored as hidden delta files.
+
+        part_pool (PartPool or None): extra connections to transfer the parts
+            concurrently.
+
+        transfer_journal (TransferJournal or None): if defined, interrupted downloads
+            and interrupted uploads of files split into parts are resumed.
+
+        listing_cache (ListingCache): classified listing of the repository,
+            updated by :meth:`remoteListing`.
+
+        incremental_listing (int or None): if defined, :meth:`remoteListing` lists
+            again only the directories which change token has changed, and the
+            entire repository every `incremental_listing` seconds; requires
+            :meth:`_listChanges`.
+
+        change_journal (ChangeJournal or None): if defined, :meth:`push`, :meth:`pop`,
+            :meth:`get`, :meth:`delete` and :meth:`repair` record the modified files,
+            and :meth:`remoteListing` reads the change journal of the other clients
+            instead of listing the entire repository.
 
     *new in 0.5.1:* placeholder_cache
 
+    *new in 0.7.12:* listing_cache is a :class:`~escale.relay.listing.ListingCache`;
+    incremental_listing; change_journal; placeholder_cache is a
+    :class:`~escale.relay.placeholder.PlaceholderCache` and can be persistent;
+    _part_prefix, _part_suffix, part_size, part_pool, transfer_journal,
+    _delta_prefix, _delta_suffix
+
     *as of 0.7.6:* default lock_timeout is 3 days
 
     """
@@ -376,10 +428,14 @@ class Relay(AbstractRelay):
         '_placeholder_prefix', '_placeholder_suffix',
         '_lock_prefix', '_lock_suffix', 'lock_timeout',
         '_message_hash', '_message_prefix', '_message_suffix',
-        'placeholder_cache', 'listing_cache']
+        'placeholder_cache', 'listing_cache', 'incremental_listing', '_last_full_listing',
+        'change_journal', '_part_prefix', '_part_suffix', 'part_size', 'part_pool',
+        'transfer_journal', '_delta_prefix', '_delta_suffix']
 
     def __init__(self, client, address, repository, logger=None, ui_controller=None,
-            lock_timeout=True, timestamped_messages=False, **ignored):
+            lock_timeout=True, timestamped_messages=False, incremental_listing=False,
+            change_journal=False, placeholder_cache=None, part_size=None,
+            transfer_journal=None, **ignored):
         AbstractRelay.__init__(self, client, address, repository,
                 logger=logger, ui_controller=ui_controller)
         if self.logger is None:
@@ -404,8 +460,29 @@ class Relay(AbstractRelay):
             self._message_hash = message_hash
         else:
             self._message_hash = None
-        self.placeholder_cache = {}
+        self.placeholder_cache = PlaceholderCache(placeholder_cache)
+        self._part_prefix = '.'
+        self._part_suffix = '.part'
+        self._delta_prefix = '.'
+        self._delta_suffix = '.delta'
+        self.part_size = part_size
+        self.part_pool = None
+        if transfer_journal:
+            self.transfer_journal = TransferJournal(transfer_journal)
+        else:
+            self.transfer_journal = None
         self.listing_cache = None
+        if isinstance(incremental_listing, bool) and incremental_listing:
+            self.incremental_listing = 3600 # full listing interval in seconds
+        else:
+            self.incremental_listing = incremental_listing
+        self._last_full_listing = 0
+        if change_journal:
+            if isinstance(change_journal, bool):
+                change_journal = 3600 # full listing interval in seconds
+            self.change_journal = ChangeJournal(client, full_listing_interval=change_journal)
+        else:
+            self.change_journal = None
 
 
     def newTemporaryFile(self):
@@ -489,6 +566,59 @@ class Relay(AbstractRelay):
     def placeholder(self, path):
         return with_path(path, self._safePlaceholder)
 
+    def part(self, path, index):
+        """
+        Path to a part file.
+
+        Arguments:
+
+            path (str): path to a regular file.
+
+            index (int): part number, starting from 0.
+
+        *new in 0.7.12*
+        """
+        return with_path(path, lambda filename: '{}{}{}{}'.format(self._part_prefix,
+            filename, self._part_suffix, index))
+
+    def delta(self, path):
+        """
+        Path to a delta file.
+
+        Arguments:
+
+            path (str): path to a regular file.
+
+        *new in 0.7.12*
+        """
+        return with_path(path, lambda filename: '{}{}{}'.format(self._delta_prefix,
+            filename, self._delta_suffix))
+
+    def _isDelta(self, filename):
+        return filename.startswith(self._delta_prefix) \
+            and filename.endswith(self._delta_suffix)
+
+    def _isContent(self, filename):
+        """
+        Tell whether a hidden file holds the content of a regular file that is not
+        stored under the regular filename, i.e. the first part of a split file
+        or a delta file.
+
+        *new in 0.7.12*
+        """
+        return self._isDelta(filename) or (filename.startswith(self._part_prefix) \
+            and filename.endswith(self._part_suffix + '0'))
+
+    def _fromContent(self, filename):
+        """
+        *new in 0.7.12*
+        """
+        if self._isDelta(filename):
+            prefix, suffix = self._delta_prefix, self._delta_suffix
+        else:
+            prefix, suffix = self._part_prefix, self._part_suffix + '0'
+        return filename[len(prefix):len(filename)-len(suffix)]
+
     def lock(self, path):
         return with_path(path, self._safeLock)
 
@@ -599,8 +729,151 @@ class Relay(AbstractRelay):
         """
         raise NotImplementedError('abstract method')
 
+    def _listChanges(self, tokens):
+        """
+        List the directories which change token differs from a previous pass.
+
+        A change token is any value that changes whenever files are added to, replaced in
+        or removed from a directory, e.g. an entity tag or a modification time.
+
+        Arguments:
+
+            tokens (dict): change tokens from the previous pass,
+                for directory paths as keys (``''`` for the repository root).
+                An empty `tokens` requires all the directories to be listed.
+
+        Returns:
+
+            (dict, dict): change tokens for all the existing directories,
+                and lists of (path, mtime) pairs for the directories that have
+                been listed again (non-recursively) as keys.
+
+        *new in 0.7.12*
+        """
+        raise NotImplementedError('abstract method')
+
     def remoteListing(self):
-        self.listing_cache = list(self._list('', recursive=True, stats=('mtime',)))
+        journal = self.change_journal
+        if journal is not None:
+            root = list(self._list('', recursive=False, stats=('mtime',)))
+            if self.listing_cache is not None and not journal.fullListingDue() and \
+                    self._journalListing(root):
+                return
+            # the journal files in `root` predate the full listing
+            journal.reset(root)
+            journal.prune(self, root)
+        if self.incremental_listing:
+            try:
+                self._incrementalListing()
+            except NotImplementedError:
+                self.logger.debug('incremental listing not supported by the relay')
+                self.incremental_listing = None
+            else:
+                return
+        self.listing_cache = ListingCache(self._list('', recursive=True, stats=('mtime',)), self)
+
+    def _journalListing(self, root):
+        """
+        Update the listing cache with the changes recorded in the change journal.
+
+        Arguments:
+
+            root (list): (path, mtime) pairs for the files in the repository root.
+
+        Returns:
+
+            bool: ``False`` if a full listing is required.
+
+        *new in 0.7.12*
+        """
+        changes = self.change_journal.read(self, root)
+        if changes is None:
+            self.logger.debug('gap in the change journal')
+            return False
+        directories = set([ os.path.dirname(path) for path in changes ])
+        directories.discard('')
+        listings = {}
+        for dirname in directories:
+            try:
+                listings[dirname] = list(self._list(dirname, recursive=False, stats=('mtime',)))
+            except ExpressInterrupt:
+                raise
+            except Exception as e:
+                # e.g. deleted directory
+                self.logger.debug("cannot list directory '%s': %s", dirname, e)
+                return False
+        ls = self.listing_cache
+        ls.replaceDirectory('', root)
+        for dirname, entries in listings.items():
+            ls.replaceDirectory(dirname, entries)
+        if changes:
+            self.logger.debug('%s changes in the journal; %s directories listed again',
+                len(changes), len(directories))
+        return True
+
+    def flushChanges(self):
+        """
+        Write the recorded changes down to the change journal, if any.
+
+        *new in 0.7.12*
+        """
+        if self.change_journal is not None:
+            self.change_journal.flush(self)
+
+    def _recordChange(self, remote_file):
+        if self.change_journal is not None:
+            self.change_journal.record(remote_file)
+
+    def _incrementalListing(self):
+        ls = self.listing_cache
+        now = time.time()
+        if ls is None or ls.tokens is None or \
+                self.incremental_listing <= now - self._last_full_listing:
+            tokens, listings = self._listChanges({})
+            ls = ListingCache((), self)
+            self._last_full_listing = now
+        else:
+            tokens, listings = self._listChanges(ls.tokens)
+            # forget about deleted directories
+            for dirname in list(ls.directories):
+                if dirname not in tokens and dirname not in listings:
+                    ls.replaceDirectory(dirname, ())
+        for dirname, entries in listings.items():
+            ls.replaceDirectory(dirname, entries)
+        ls.tokens = tokens
+        self.listing_cache = ls
+        self.logger.debug('%s directories listed again out of %s', len(listings), len(tokens))
+
+    def _listing(self, remote_dir='', recursive=True):
+        """
+        Classified listing, either cached or listed anew for a specific directory.
+
+        *new in 0.7.12*
+        """
+        if remote_dir or (self.listing_cache is None):
+            return ListingCache(self._list(remote_dir, recursive=recursive, stats=('mtime',)),
+                    self)
+        else:
+            return self.listing_cache
+
+    def _cachePlaceholderTimes(self, ls):
+        if ls.placeholders_cached:
+            return
+        ls.placeholders_cached = True
+        self.placeholder_cache.load()
+        if ls is self.listing_cache:
+            # forget about the deleted placeholders
+            for regular_file in set(self.placeholder_cache) - set(ls.placeholders):
+                del self.placeholder_cache[regular_file]
+        for regular_file, mtime in ls.placeholders.items():
+            if mtime:
+                try:
+                    previous_mtime, meta = self.placeholder_cache[regular_file]
+                    if previous_mtime < mtime:
+                        meta = None
+                except KeyError:
+                    meta = None
+                self.placeholder_cache[regular_file] = (mtime, meta)
 
     def listReady(self, remote_dir='', recursive=True):
         """
@@ -608,36 +881,11 @@ class Relay(AbstractRelay):
 
         It caches last modification times of placeholders for future `getMetadata` calls.
         """
-        if remote_dir or (self.listing_cache is None):
-            ls = self._list(remote_dir, recursive=recursive, stats=('mtime',))
-        else:
-            ls = self.listing_cache
+        ls = self._listing(remote_dir, recursive)
         if not ls:
             return []
-        lock_files = []
-        regular_files = []
-        for file, mtime in ls:
-            filedir, filename = os.path.split(file)
-            if self._isLock(filename):
-                lock_files.append(file)
-            elif self._isPlaceholder(filename):
-                if mtime:
-                    filename = self._fromPlaceholder(filename)
-                    regular_file = '/'.join((filedir, filename)) if filedir else filename
-                    try:
-                        previous_mtime, meta = self.placeholder_cache[regular_file]
-                        if previous_mtime < mtime:
-                            meta = None
-                    except KeyError:
-                        meta = None
-                    self.placeholder_cache[regular_file] = (mtime, meta)
-            elif not filename.startswith('.'):#self._isMessage(filename):
-                lock_file = join(filedir, self._lock(filename))
-                regular_files.append((file, lock_file))
-        ready = [ regular_file
-                for regular_file, lock_file in regular_files
-                if lock_file not in lock_files ]
-        return ready
+        self._cachePlaceholderTimes(ls)
+        return list(ls.ready)
 
     def listCorrupted(self, remote_dir='', recursive=True):
         """
@@ -645,66 +893,30 @@ class Relay(AbstractRelay):
         """
         if not (self.client or self.lock_timeout):
             return []
-        if remote_dir or (self.listing_cache is None):
-            ls = self._list(remote_dir, recursive=recursive, stats=['mtime'])
-        else:
-            ls = self.listing_cache
+        ls = self._listing(remote_dir, recursive)
         locks = []
-        for file, mtime in ls:
-            if self.isLock(file):
-                lock = self.getLockInfo(join(remote_dir, self.fromLock(file)))
-                if lock.owner:
-                    if lock.owner == self.client:
-                        locks.append(lock)
-                elif mtime and self.lock_timeout:
-                    if isinstance(mtime, time.struct_time):
-                        # for backward compatibility
-                        mtime = calendar.timegm(mtime)
-                    if self.lock_timeout < time.time() - mtime:
-                        locks.append(lock)
+        for file, mtime in list(ls.locks.items()):
+            lock = self.getLockInfo(join(remote_dir, file))
+            if lock.owner:
+                if lock.owner == self.client:
+                    locks.append(lock)
+            elif mtime and self.lock_timeout:
+                if isinstance(mtime, time.struct_time):
+                    # for backward compatibility
+                    mtime = calendar.timegm(mtime)
+                if self.lock_timeout < time.time() - mtime:
+                    locks.append(lock)
         return locks
 
     def listTransferred(self, remote_dir='', end2end=True, recursive=True):
         """
         The default implementation manipulates placeholders and locks as individual files.
         """
-        if remote_dir or (self.listing_cache is None):
-            ls = self._list(remote_dir, recursive=recursive, stats=('mtime',))
-        else:
-            ls = self.listing_cache
+        ls = self._listing(remote_dir, recursive)
         if not ls:
             return []
-        regular_files = []
-        placeholders = []
-        others = []
-        for file, mtime in ls:
-            filedir, filename = os.path.split(file)
-            if self._isPlaceholder(filename):
-                filename = self._fromPlaceholder(filename)
-                regular_file = '/'.join((filedir, filename)) if filedir else filename
-                placeholders.append(regular_file)
-                if mtime:
-                    try:
-                        previous_mtime, meta = self.placeholder_cache[regular_file]
-                        if previous_mtime < mtime:
-                            meta = None
-                    except KeyError:
-                        meta = None
-                    self.placeholder_cache[regular_file] = (mtime, meta)
-            else:
-                others.append(file)
-        ls = others
-        if end2end:
-            return placeholders
-        else:
-            locks = []
-            others = []
-            for file in ls:
-                if self.isLock(file):
-                    locks.append(self.fromLock(file))
-                elif not file.startswith('.'):
-                    others.append(file)
-            return others + placeholders + locks
+        self._cachePlaceholderTimes(ls)
+        return ls.transferred(end2end)
 
     def size(self, remote_file):
         """
@@ -730,25 +942,14 @@ class Relay(AbstractRelay):
         .. warning:: this is different from Unix *touch* and overwrites
             existing files instead of updating the last access time attribute.
         """
-        #local_file = self.newTemporaryFile()
-        f, local_file = tempfile.mkstemp(text=True)
-        # f is an open file descriptor in 'w' mode and can be manipulated
-        # with os.write/os.close functions
-        try:
-            with os.fdopen(f, 'w') as f: # convert f into a file object
-                if content:
-                    if isinstance(content, list):
-                        nlines = len(content)
-                        for lineno, line in enumerate(content):
-                            f.write(asstr(line))
-                            if lineno + 1 < nlines:
-                                f.write('\n')
-                    else:
-                        f.write(asstr(content))
-            self._push(local_file, remote_file)
-        finally:
-            os.unlink(local_file)
-        #self.delTemporaryFile(local_file)
+        if content:
+            if isinstance(content, list):
+                content = '\n'.join([ asstr(line) for line in content ])
+            else:
+                content = asstr(content)
+        else:
+            content = ''
+        self._push_bytes(asbytes(content), remote_file)
 
     def unlink(self, remote_file):
         """
@@ -815,31 +1016,38 @@ class Relay(AbstractRelay):
         It should NOT raise any exception with missing locks, but return an empty LockInfo instead.
         """
         remote_lock = self.lock(remote_file)
-        fd, local_lock = tempfile.mkstemp()
-        os.close(fd)
         try:
-            self._get(remote_lock, local_lock)
+            content = self._get_bytes(remote_lock)
         except ExpressInterrupt:
             raise
         except:
             info = LockInfo()
         else:
-            info = parse_lock_file(local_lock, target=remote_file)
-        finally:
-            os.unlink(local_lock)
+            info = parse_lock(asstr(content).splitlines(True), target=remote_file)
         return info
 
     def getMetadata(self, remote_file, output_file=None, timestamp_format=None):
         """
         This method treats placeholders as files.
+
+        *new in 0.7.12:* placeholder presence is read from the listing cache, if any
         """
-        if self.hasPlaceholder(remote_file):
+        ls = self.listing_cache
+        if ls is None:
+            has_placeholder = self.hasPlaceholder(remote_file)
+        else:
+            # no round trip per file; the placeholders have been classified
+            # together with the listing
+            has_placeholder = remote_file in ls.placeholders
+        if has_placeholder:
             ts, meta = self.placeholder_cache.get(remote_file, (None, None))
-            if output_file is True or meta is None:
+            if output_file is True:
                 local_placeholder = self.newTemporaryFile()
             elif output_file:
                 local_placeholder = output_file
-            if meta is None:
+            if meta is None and not output_file:
+                meta = self.fetchMetadata(remote_file, timestamp_format)
+            elif meta is None:
                 remote_placeholder = self.placeholder(remote_file)
                 self._get(remote_placeholder, local_placeholder)
                 if ts or not output_file:
@@ -865,7 +1073,61 @@ class Relay(AbstractRelay):
                     pass
             return None
 
-    def updatePlaceholder(self, remote_file, last_modified=None, checksum=None):
+    def fetchMetadata(self, remote_file, timestamp_format=None):
+        """
+        Download and parse a placeholder, with no check for presence, and cache
+        the meta-information if the placeholder has been listed.
+
+        The placeholder cache can be shared with other relay connections,
+        e.g. to download placeholders in parallel.
+
+        Arguments:
+
+            remote_file (str): path to a regular file on the remote host.
+
+            timestamp_format (str or bool): see :meth:`getMetadata`.
+
+        Returns:
+
+            Metadata: meta-information.
+
+        *new in 0.7.12*
+        """
+        ts, _ = self.placeholder_cache.get(remote_file, (None, None))
+        content = self._get_bytes(self.placeholder(remote_file))
+        meta = parse_metadata(asstr(content).splitlines(), \
+                target=remote_file, \
+                log=self.logger.debug, \
+                timestamp_format=timestamp_format)
+        if ts:
+            self.placeholder_cache[remote_file] = (ts, meta)
+        return meta
+
+    def stalePlaceholders(self, remote_files):
+        """
+        Select the regular files which placeholders have been listed but are not
+        cached, or have been modified since they were cached.
+
+        Arguments:
+
+            remote_files (iterable): paths to regular files on the remote host.
+
+        Returns:
+
+            list: paths to regular files.
+
+        *new in 0.7.12*
+        """
+        cache = self.placeholder_cache
+        stale = []
+        for remote_file in remote_files:
+            ts, meta = cache.get(remote_file, (None, None))
+            if ts and meta is None:
+                stale.append(remote_file)
+        return stale
+
+    def updatePlaceholder(self, remote_file, last_modified=None, checksum=None, parts=None,
+            partsize=None, delta=None):
         """
         Update a placeholder when the corresponding file is pushed.
 
@@ -874,9 +1136,12 @@ class Relay(AbstractRelay):
         To pop or get a file, use :meth:`markAsRead` instead.
 
         *new in 0.5.1:* checksum
+
+        *new in 0.7.12:* parts, partsize, delta
         """
         meta = Metadata(pusher=self.client, target=remote_file,
-                timestamp=last_modified, checksum=checksum)
+                timestamp=last_modified, checksum=checksum, parts=parts, partsize=partsize,
+                delta=delta)
         self.touch(self.placeholder(remote_file), repr(meta))
 
     def releasePlace(self, remote_file, handle_missing=False):
@@ -939,13 +1204,363 @@ class Relay(AbstractRelay):
         """
         raise NotImplementedError('abstract method')
 
-    def push(self, local_file, remote_dest, last_modified=None, checksum=None, blocking=True):
+    def _push_bytes(self, data, remote_dest):
+        """
+        Send content to a file on the remote host.
+
+        Special files (locks, placeholders) are small and do not need to be written
+        on the local disk first.
+        The default implementation writes `data` to a temporary file and calls
+        :meth:`_push`.
+
+        Arguments:
+
+            data (bytes): file content.
+
+            remote_dest (str): path to a file on the remote host.
+
+        *new in 0.7.12*
+        """
+        fd, local_file = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self._push(local_file, remote_dest)
+        finally:
+            os.unlink(local_file)
+
+    def _get_bytes(self, remote_file):
+        """
+        Get the content of a file on the remote host, and do NOT delete the file.
+
+        The default implementation calls :meth:`_get` with a temporary file.
+
+        Arguments:
+
+            remote_file (str): path to a file on the remote host.
+
+        Returns:
+
+            bytes: file content.
+
+        *new in 0.7.12*
+        """
+        fd, local_file = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self._get(remote_file, local_file)
+            with open(local_file, 'rb') as f:
+                return f.read()
+        finally:
+            os.unlink(local_file)
+
+    def _pushPart(self, local_file, offset, size, remote_dest):
+        """
+        Send a range of bytes of a local file to a file on the remote host.
+
+        The default implementation copies the range to a temporary file and calls
+        :meth:`_push`.
+
+        Arguments:
+
+            local_file (str): path to a local file.
+
+            offset (int): first byte.
+
+            size (int): number of bytes.
+
+            remote_dest (str): path to a file on the remote host.
+
+        *new in 0.7.12*
+        """
+        fd, part_file = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with FileSlice(local_file, offset, size) as part:
+                    shutil.copyfileobj(part, f)
+            self._push(part_file, remote_dest)
+        finally:
+            os.unlink(part_file)
+
+    def _getPart(self, remote_file, local_file, offset):
+        """
+        Download a file into an existing local file, from a given offset, and do NOT
+        delete the file from the remote host.
+
+        The default implementation calls :meth:`_get` with a temporary file.
+
+        Arguments:
+
+            remote_file (str): path to a file on the remote host.
+
+            local_file (str): path to an existing local file.
+
+            offset (int): position in the local file.
+
+        *new in 0.7.12*
+        """
+        fd, part_file = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self._get(remote_file, part_file)
+            with open(part_file, 'rb') as part:
+                with open(local_file, 'r+b') as f:
+                    f.seek(offset)
+                    shutil.copyfileobj(part, f)
+        finally:
+            os.unlink(part_file)
+
+    def _getRange(self, remote_file, f, offset):
+        """
+        Download the content of a file on the remote host from a given offset on,
+        and do NOT delete the file.
+
+        Used to resume interrupted downloads. Not supported by default.
+
+        Arguments:
+
+            remote_file (str): path to a file on the remote host.
+
+            f (file object): writable file object.
+
+            offset (int): first byte.
+
+        *new in 0.7.12*
+        """
+        raise NotImplementedError
+
+    def _mapParts(self, func, items):
+        if self.part_pool is None or not items[1:]:
+            for item in items:
+                func(self, *item)
+        else:
+            self.part_pool.map(func, items)
+
+    def _pushParts(self, local_file, remote_dest, parts):
+        size = os.path.getsize(local_file)
+        journal = self.transfer_journal
+        done = {}
+        if journal is not None:
+            key = 'push:' + remote_dest
+            done = journal.begin(key, [size, self.part_size, parts])['parts']
+        items = []
+        for index in range(parts):
+            offset = index * self.part_size
+            length = min(self.part_size, size - offset)
+            digest = done.get(str(index))
+            if digest and digest == part_digest(local_file, offset, length):
+                # already sent
+                continue
+            remote_part = self.part(remote_dest, index)
+            items.append((local_file, offset, length, remote_part, index))
+        if len(items) < parts:
+            self.logger.debug("resuming upload of '%s' at part %s/%s", remote_dest,
+                parts - len(items) + 1, parts)
+        def push(relay, local_file, offset, length, remote_part, index):
+            relay._pushPart(local_file, offset, length, remote_part)
+            if journal is not None:
+                journal.checkpoint(key, part=index,
+                    digest=part_digest(local_file, offset, length))
+        self._mapParts(push, items)
+        if journal is not None:
+            journal.remove(key)
+
+    def _getParts(self, remote_file, local_dest, meta, unlink=True, done=(), record=None):
+        if not meta.partsize:
+            raise IOError("missing part size for file '{}'".format(remote_file))
+        dirname = os.path.dirname(local_dest)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        if not done:
+            open(local_dest, 'wb').close()
+        items = [ (self.part(remote_file, index), local_dest, index * meta.partsize, index)
+            for index in range(meta.parts) if str(index) not in done ]
+        def get(relay, remote_part, local_dest, offset, index):
+            relay._getPart(remote_part, local_dest, offset)
+            if record is not None:
+                record(index)
+        self._mapParts(get, items)
+        if unlink:
+            self._unlinkContent(self._contentFiles(remote_file, meta.parts))
+
+    def _resumableGet(self, remote_file, local_dest, meta, unlink=True):
+        """
+        Download a file through a staging file of the transfer journal, so that
+        the download can be resumed from the last checkpoint if interrupted.
+
+        Arguments:
+
+            remote_file (str): path to a file on the remote host.
+
+            local_dest (str): path to a local file.
+
+            meta (Metadata): meta-information of the remote file; identifies the version
+                of the file.
+
+            unlink (bool): delete the file from the remote host.
+
+        *new in 0.7.12*
+        """
+        journal = self.transfer_journal
+        key = 'pull:' + remote_file
+        version = [meta.timestamp, asstr(meta.checksum) if meta.checksum else None,
+            meta.parts, meta.partsize]
+        entry = journal.begin(key, version)
+        staging = journal.stagingFile(key)
+        if meta.parts and 1 < meta.parts:
+            if entry['parts']:
+                self.logger.debug("resuming download of '%s' (%s/%s parts)", remote_file,
+                    len(entry['parts']), meta.parts)
+            self._getParts(remote_file, staging, meta, unlink=False,
+                done=entry['parts'],
+                record=lambda index: journal.checkpoint(key, part=index, sync=staging))
+        else:
+            content, = self._contentFiles(remote_file, delta=meta.delta)
+            offset = entry['offset']
+            try:
+                with open(staging, 'r+b') as f:
+                    f.seek(offset)
+                    f.truncate()
+                    if offset:
+                        self.logger.debug("resuming download of '%s' at byte %s",
+                            remote_file, offset)
+                    self._getRange(content, CheckpointWriter(f, offset,
+                        lambda offset: journal.checkpoint(key, offset=offset),
+                        journal.checkpoint_interval), offset)
+            except NotImplementedError:
+                self._get(content, staging)
+        if unlink:
+            if meta.parts and 1 < meta.parts:
+                self._unlinkContent(self._contentFiles(remote_file, meta.parts))
+            else:
+                self.unlink(content)
+        journal.complete(key, local_dest)
+
+    def _contentFiles(self, remote_file, parts=None, delta=None):
+        """
+        Paths to the files that hold the content of a version of a file.
+
+        Arguments:
+
+            remote_file (str): path to a regular file on the remote host.
+
+            parts (int or None): number of parts, if the file is split.
+
+            delta (str or None): checksum of the version the delta applies to,
+                if the content is a delta.
+
+        Returns:
+
+            list: paths to files on the remote host.
+
+        *new in 0.7.12*
+        """
+        if parts and 1 < parts:
+            return [ self.part(remote_file, index) for index in range(parts) ]
+        elif delta:
+            return [ self.delta(remote_file) ]
+        else:
+            return [ remote_file ]
+
+    def _unlinkContent(self, remote_files):
+        for remote_file in remote_files:
+            try:
+                self.unlink(remote_file)
+            except ExpressInterrupt:
+                raise
+            except Exception:
+                # already deleted
+                pass
+
+    def _download(self, remote_file, local_dest, unlink=True, placeholder_content=None):
+        """
+        Download a file, either as a whole, in parts or through the transfer journal.
+
+        The download is resumable if the version of the file is known, from
+        the placeholder.
+
+        *new in 0.7.12*
+        """
+        if self.transfer_journal is not None:
+            if placeholder_content is not None:
+                meta = parse_metadata(asstr(placeholder_content).splitlines(),
+                        target=remote_file, log=self.logger.debug)
+            else:
+                meta = self.getMetadata(remote_file)
+            if meta is not None and (meta.timestamp or meta.checksum):
+                self._resumableGet(remote_file, local_dest, meta, unlink=unlink)
+                return
+        meta = self._contentMetadata(remote_file, placeholder_content)
+        if meta is not None and meta.parts and 1 < meta.parts:
+            self._getParts(remote_file, local_dest, meta, unlink=unlink)
+            return
+        if meta is not None:
+            remote_file = self.delta(remote_file)
+        if unlink:
+            self._pop(remote_file, local_dest)
+        else:
+            self._get(remote_file, local_dest)
+
+    def _contentMetadata(self, remote_file, placeholder_content=None):
+        """
+        Get the meta-information of a file if its content is not stored under the
+        regular filename, i.e. if the file is split into parts or is a delta.
+
+        The placeholder is not downloaded if the file is known to be stored as
+        a regular file, from the placeholder cache or from the listing cache.
+
+        Returns:
+
+            Metadata or None: meta-information, if the file is split or is a delta.
+
+        *new in 0.7.12*
+        """
+        if placeholder_content is not None:
+            meta = parse_metadata(asstr(placeholder_content).splitlines(),
+                    target=remote_file, log=self.logger.debug)
+        else:
+            _, meta = self.placeholder_cache.get(remote_file, (None, None))
+            if meta is None:
+                ls = self.listing_cache
+                if ls is not None and remote_file in ls.regular:
+                    return None
+                meta = self.getMetadata(remote_file)
+        if meta and ((meta.parts and 1 < meta.parts) or meta.delta):
+            return meta
+        return None
+
+    def push(self, local_file, remote_dest, last_modified=None, checksum=None, blocking=True,
+            delta=None):
         if not self.acquireLock(remote_dest, mode='w', blocking=blocking):
             return False
+        parts = None
+        if self.part_size and last_modified:
+            size = os.path.getsize(local_file)
+            if self.part_size < size:
+                parts = (size + self.part_size - 1) // self.part_size
+        # delete the content of the previous version that is not overwritten
+        stale = set()
+        _, previous = self.placeholder_cache.get(remote_dest, (None, None))
+        if previous is not None:
+            stale.update(self._contentFiles(remote_dest, previous.parts))
+        elif parts or delta:
+            ls = self.listing_cache
+            if ls is None or remote_dest in ls.regular:
+                # a previous version stored as a regular file would be pulled
+                # by the clients that do not support split or delta files
+                stale.add(remote_dest)
+        stale.difference_update(self._contentFiles(remote_dest, parts, delta))
+        self._unlinkContent(stale)
         if last_modified:
-            self.updatePlaceholder(remote_dest, last_modified=last_modified, checksum=checksum)
-        self._push(local_file, remote_dest)
+            self.updatePlaceholder(remote_dest, last_modified=last_modified, checksum=checksum,
+                    parts=parts, partsize=self.part_size if parts else None, delta=delta)
+        if parts:
+            self._pushParts(local_file, remote_dest, parts)
+        else:
+            content, = self._contentFiles(remote_dest, delta=delta)
+            self._push(local_file, content)
         self.releaseLock(remote_dest)
+        self._recordChange(remote_dest)
         return True
 
     def _pop(self, remote_file, local_dest, makedirs=True):
@@ -1003,55 +1618,53 @@ class Relay(AbstractRelay):
             has_placeholder = self.hasPlaceholder(remote_file)
             if has_placeholder and 1 < placeholder:
                 remote_placeholder = self.placeholder(remote_file)
-                local_placeholder = self.newTemporaryFile()
-                kwargs['local_placeholder'] = local_placeholder
-                self._get(remote_placeholder, local_placeholder)
-                with open(local_placeholder, 'r') as f:
-                    nreads = len(f.readlines()) - 1
+                content = self._get_bytes(remote_placeholder)
+                kwargs['placeholder_content'] = content
+                nreads = len(asstr(content).splitlines(True)) - 1
                 let = nreads < placeholder - 1
-        if let:
-            self._get(remote_file, local_dest)
-        else:
-            self._pop(remote_file, local_dest)
+        self._download(remote_file, local_dest, unlink=not let,
+                placeholder_content=kwargs.get('placeholder_content'))
         if placeholder:
             if has_placeholder:
                 self.markAsRead(remote_file, **kwargs)
-                if 1 < placeholder: # or similarly: if 'local_placeholder' in kwargs:
-                    self.delTemporaryFile(local_placeholder)
             else: # older-than-old style placeholding mechanism
                 # could have warned before getting the file
                 self.logger.warning("missing meta information for file: '%s'", remote_file)
                 # no modification time or checksum
                 self.updatePlaceholder(remote_file)
         self.releaseLock(remote_file)
+        self._recordChange(remote_file)
         return True
 
     def get(self, remote_file, local_dest, placeholder=True, blocking=True, **kwargs):
         # TODO: ensure that local_dest is a path to a file and not a directory
         if not self.acquireLock(remote_file, mode='r', blocking=blocking):
             return False
-        self._get(remote_file, local_dest)
+        self._download(remote_file, local_dest, unlink=False)
         if placeholder and self.hasPlaceholder(remote_file):
             self.markAsRead(remote_file, **kwargs)
         self.releaseLock(remote_file)
+        self._recordChange(remote_file)
         return True
 
-    def markAsRead(self, remote_file, local_placeholder=None):
+    def markAsRead(self, remote_file, local_placeholder=None, placeholder_content=None):
         """
         This method treats placeholders as files.
 
         Compatible with both old-style and new-style placeholders.
+
+        *new in 0.7.12:* placeholder_content
         """
         remote_placeholder = self.placeholder(remote_file)
-        get = not local_placeholder
-        if get:
-            local_placeholder = self.newTemporaryFile()
-            self._get(remote_placeholder, local_placeholder)
-            with open(local_placeholder, 'a') as f:
-                f.write('\n{}'.format(self.client))
-        self._push(local_placeholder, remote_placeholder)
-        if get:
-            self.delTemporaryFile(local_placeholder)
+        if local_placeholder:
+            self._push(local_placeholder, remote_placeholder)
+            return
+        if placeholder_content is None:
+            content = self._get_bytes(remote_placeholder)
+            content = asbytes(asstr(content) + '\n{}'.format(self.client))
+        else:
+            content = placeholder_content
+        self._push_bytes(content, remote_placeholder)
 
     def exists(self, filename, dirname=None):
         if not dirname:
@@ -1061,17 +1674,68 @@ class Relay(AbstractRelay):
     def delete(self, remote_file, blocking=True, **kwargs):
         if not self.acquireLock(remote_file, mode='r', blocking=blocking):
             return False
-        self.unlink(remote_file)
+        meta = self._contentMetadata(remote_file)
+        if meta is None:
+            self.unlink(remote_file)
+        else:
+            self._unlinkContent(self._contentFiles(remote_file, meta.parts, meta.delta))
         try:
             self.markAsRead(remote_file, **kwargs)
         except NotImplementedError:
             pass
         self.releaseLock(remote_file)
+        self._recordChange(remote_file)
+        return True
+
+    def rejectDelta(self, remote_file, blocking=False):
+        """
+        Delete a delta file and its placeholder, so that the pusher sends the full
+        file again.
+
+        Called by a puller which local copy is not the version the delta applies to.
+
+        *new in 0.7.12*
+        """
+        if not self.acquireLock(remote_file, mode='r', blocking=blocking):
+            return False
+        try:
+            meta = self._contentMetadata(remote_file)
+        except ExpressInterrupt:
+            raise
+        except Exception:
+            meta = None
+        if meta is None:
+            self._unlinkContent([remote_file])
+        else:
+            self._unlinkContent(self._contentFiles(remote_file, meta.parts, meta.delta))
+        self.releasePlace(remote_file, True)
+        try:
+            del self.placeholder_cache[remote_file]
+        except KeyError:
+            pass
+        self.releaseLock(remote_file)
+        self._recordChange(remote_file)
         return True
 
     def repair(self, lock, local_file, checksum=None):
         # TODO: use the checksum to resolve conflicting situations
         remote_file = lock.target
+        journal = self.transfer_journal
+        if lock.mode == 'w' and journal is not None and \
+                journal.get('push:' + remote_file) is not None:
+            # keep the parts already sent so that the upload can be resumed,
+            # except the first part, so that the file is not listed as ready
+            journal.discardPart('push:' + remote_file, 0)
+            self._unlinkContent([self.part(remote_file, 0)])
+        elif lock.mode != 'r':
+            try:
+                meta = self._contentMetadata(remote_file)
+            except ExpressInterrupt:
+                raise
+            except Exception:
+                meta = None
+            if meta is not None:
+                self._unlinkContent(self._contentFiles(remote_file, meta.parts, meta.delta))
         if lock.mode == 'w':
             if not local_file.exists():
                 self.logger.error("could not find local file")# '%s'", local_file)
@@ -1094,7 +1758,18 @@ class Relay(AbstractRelay):
                 #    local_size = local_file.size()
                 #    if local_size != remote_size:
                         local_file.delete()
-            if not self.exists(remote_file):
+            try:
+                meta = self._contentMetadata(remote_file)
+            except ExpressInterrupt:
+                raise
+            except Exception:
+                meta = None
+            if meta is None:
+                content = remote_file
+            else:
+                # split or delta file
+                content = self._contentFiles(remote_file, meta.parts, meta.delta)[0]
+            if not self.exists(content):
                         # delete the placeholder to request the file again
                         self.releasePlace(remote_file, True)
         else: # old-style lock?
@@ -1103,6 +1778,7 @@ class Relay(AbstractRelay):
             self.releasePlace(remote_file, True)
         # release the lock
         self.releaseLock(remote_file)
+        self._recordChange(remote_file)
 
 
 
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017, François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import PYTHON_VERSION, asstr, asbytes
+from .multipart import FileSlice
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+if PYTHON_VERSION == 2:
+    import anydbm as dbm
+else:
+    import dbm
+
+
+transfer_journal_prefix = 'tj'
+
+
+def _sync(path):
+    with open(path, 'r+b') as f:
+        os.fsync(f.fileno())
+
+
+def part_digest(local_file, offset, size):
+    """
+    SHA-256 digest of a range of bytes of a local file, as a hexadecimal string.
+
+    *new in 0.7.12*
+    """
+    h = hashlib.sha256()
+    with FileSlice(local_file, offset, size) as part:
+        while True:
+            data = part.read(1048576)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class CheckpointWriter(object):
+    """
+    Writable file object that makes the written data durable and records the offset
+    every `interval` bytes.
+
+    Attributes:
+
+        offset (int): position in the underlying file.
+
+        interval (int): number of bytes between two checkpoints.
+
+    *new in 0.7.12*
+    """
+    __slots__ = [ '_file', '_checkpoint', '_next', 'offset', 'interval' ]
+
+    def __init__(self, f, offset, checkpoint, interval):
+        self._file = f
+        self._checkpoint = checkpoint
+        self.offset = offset
+        self.interval = interval
+        self._next = offset + interval
+
+    def write(self, data):
+        self._file.write(data)
+        self.offset += len(data)
+        if self._next <= self.offset:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._checkpoint(self.offset)
+        self._next = self.offset + self.interval
+
+
+class TransferJournal(object):
+    """
+    Persistent record of the interrupted transfers, so that they can be resumed
+    after a restart.
+
+    Downloads are written to a staging file in the `staging` directory, and moved
+    to their destination once complete.
+    The offset up to which a staging file has been written down to disk is
+    recorded every `checkpoint_interval` bytes.
+    For files split into parts, the completed parts are recorded instead,
+    with a digest of their content for uploads.
+    Uploads of encrypted files are staged as well (see :meth:`stage`), as the
+    encrypted content differs on every encryption and the parts already sent
+    would not match their digest otherwise.
+
+    An entry is valid as long as the version of the file does not change.
+    For downloads, the version is made of the placeholder fields;
+    for uploads, the parts are verified again against their digest before
+    they are skipped.
+
+    Attributes:
+
+        location (str): path to dbm file.
+
+        staging (str): path to directory of staging files.
+
+        checkpoint_interval (int): number of bytes between two checkpoints.
+
+    *new in 0.7.12*
+    """
+    def __init__(self, location, checkpoint_interval=8388608):
+        location = os.path.expanduser(location)
+        self.location = location
+        self.staging = location + '.partial'
+        if not os.path.isdir(self.staging):
+            os.makedirs(self.staging)
+        self.checkpoint_interval = checkpoint_interval
+        self._entries = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        self._entries = {}
+        try:
+            db = dbm.open(self.location, 'r')
+        except dbm.error:
+            # file does not exist yet
+            return
+        try:
+            for key in db.keys():
+                self._entries[asstr(key)] = json.loads(asstr(db[key]))
+        finally:
+            db.close()
+
+    def _write(self, key):
+        db = dbm.open(self.location, 'c')
+        try:
+            try:
+                db[key] = json.dumps(self._entries[key])
+            except KeyError:
+                try:
+                    del db[key]
+                except KeyError:
+                    pass
+        finally:
+            db.close()
+
+    def get(self, key):
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            return self._entries.get(key)
+
+    def stagingFile(self, key):
+        return os.path.join(self.staging, hashlib.sha1(asbytes(key)).hexdigest())
+
+    def begin(self, key, version):
+        """
+        Get the entry for a transfer, or make a new one if the recorded
+        version differs.
+
+        Arguments:
+
+            key (str): ``'pull:'`` or ``'push:'`` followed by the path to the remote file.
+
+            version (list): version of the file.
+
+        Returns:
+
+            dict: entry with keys *'version'*, *'offset'* and *'parts'* (part numbers
+                as keys, and digests or ``None`` as values).
+        """
+        with self._lock:
+            entry = self.get(key)
+            staging = self.stagingFile(key)
+            if entry is None or entry['version'] != version or \
+                    (key.startswith('pull:') and not os.path.isfile(staging)):
+                entry = dict(version=version, offset=0, parts={})
+                self._entries[key] = entry
+                self._write(key)
+                if key.startswith('pull:'):
+                    open(staging, 'wb').close()
+            return entry
+
+    def checkpoint(self, key, offset=None, part=None, digest=None, sync=None):
+        """
+        Record the progress of a transfer.
+
+        Arguments:
+
+            key (str): transfer key.
+
+            offset (int): number of bytes written down to disk.
+
+            part (int): number of a completed part.
+
+            digest (str): digest of the completed part.
+
+            sync (str): path to a file to be written down to disk first.
+        """
+        if sync:
+            _sync(sync)
+        with self._lock:
+            entry = self.get(key)
+            if entry is None:
+                return
+            if offset is not None:
+                entry['offset'] = offset
+            if part is not None:
+                entry['parts'][str(part)] = digest
+            self._write(key)
+
+    def stage(self, key, version, write):
+        """
+        Get a staging file for an upload, so that an interrupted upload can be
+        resumed with the same content, e.g. the same encrypted content.
+
+        The staging file is written again if the version of the file differs from
+        the recorded version or if the staging file is incomplete.
+        It is deleted together with the entry on :meth:`remove`.
+
+        Arguments:
+
+            key (str): ``'stage:'`` followed by the path to the remote file.
+
+            version (list): version of the local file.
+
+            write (callable): takes the path to the staging file as input argument,
+                and writes the content to be uploaded into it.
+
+        Returns:
+
+            str: path to the staging file.
+        """
+        staging = self.stagingFile(key)
+        with self._lock:
+            entry = self.get(key)
+            if entry is not None and entry['version'] == version and \
+                    os.path.isfile(staging) and \
+                    entry['offset'] == os.path.getsize(staging):
+                return staging
+            self._entries[key] = dict(version=version, offset=None, parts={})
+            self._write(key)
+        write(staging)
+        self.checkpoint(key, offset=os.path.getsize(staging), sync=staging)
+        return staging
+
+    def discardPart(self, key, part):
+        """
+        Forget about a completed part, e.g. deleted from the relay host.
+        """
+        with self._lock:
+            entry = self.get(key)
+            if entry is not None and entry['parts'].pop(str(part), None) is not None:
+                self._write(key)
+
+    def complete(self, key, destination=None):
+        """
+        Move the staging file to its destination, if any, and delete the entry.
+
+        The staging file is first copied next to the destination, and then renamed,
+        so that the destination is never partially written.
+        """
+        staging = self.stagingFile(key)
+        if destination:
+            dirname = os.path.dirname(destination)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd, tmp = tempfile.mkstemp(dir=dirname or None, prefix='.')
+            os.close(fd)
+            try:
+                shutil.move(staging, tmp)
+                shutil.move(tmp, destination)
+            except:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+        self.remove(key)
+
+    def remove(self, key):
+        """
+        Delete an entry and its staging file.
+        """
+        with self._lock:
+            if self.get(key) is not None:
+                del self._entries[key]
+                self._write(key)
+        staging = self.stagingFile(key)
+        if os.path.exists(staging):
+            os.unlink(staging)
+
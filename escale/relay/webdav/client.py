@@ -28,6 +28,7 @@
 from escale.base.essential import asstr, quote_join, relpath
 from escale.base.exceptions import format_exc, QuotaExceeded, ExpressInterrupt, PostponeRequest
 from escale.base.ssl import *
+from escale.relay.multipart import FileSlice
 from collections import namedtuple
 import os.path
 import re
@@ -84,7 +85,7 @@ class UnexpectedResponse(Exception):
                 got, expected)
 
 
-File = namedtuple('File', ['name', 'size', 'mtime', 'ctime', 'contenttype'])
+File = namedtuple('File', ['name', 'size', 'mtime', 'ctime', 'contenttype', 'etag'])
 
 
 def _prop(elem, name, default=None):
@@ -105,6 +106,7 @@ def _elem2file(elem, basepath=None):
             _prop(elem, 'getlastmodified', ''),
             _prop(elem, 'creationdate', ''),
             _prop(elem, 'getcontenttype', ''),
+            _prop(elem, 'getetag', ''),
         )
 
 
@@ -288,24 +290,83 @@ class Client(object):
             dirname += '/'
         self.delete(dirname)
 
-    def upload(self, local_path, remote_path):
+    def upload(self, local_path, remote_path, offset=None, size=None):
+        """
+        *new in 0.7.12:* offset, size
+        """
         while True:
-            with open(local_path, 'rb') as f:
+            if offset is None:
+                f = open(local_path, 'rb')
+            else:
+                f = FileSlice(local_path, offset, size)
+            with f:
                 r = self.send('PUT', remote_path, (200, 201, 204, 400), data=f, \
                     retry_on_status_codes=(302, 413, 503, 504))
             if r.status_code != 400:
                 # 400 Bad Request is Yandesk speciality
                 break
 
-    def download(self, remote_path, local_path):
+    def download(self, remote_path, local_path, offset=None):
+        """
+        *new in 0.7.12:* offset
+        """
         r = self.send('GET', remote_path, (200,), context=True)
         try:
-            with open(local_path, 'wb') as f:
+            if offset is None:
+                f = open(local_path, 'wb')
+            else:
+                f = open(local_path, 'r+b')
+                f.seek(offset)
+            with f:
                 for chunk in r.iter_content(self.download_chunk_size):
                     f.write(chunk)
         finally:
             r.close()
 
+    def download_range(self, remote_path, f, start=0):
+        """
+        Download the content of a remote file from byte `start` on into file
+        object `f`.
+
+        If the server ignores the Range header, the first `start` bytes are skipped.
+
+        *new in 0.7.12*
+        """
+        headers = {'Range': 'bytes={}-'.format(start)} if start else None
+        r = self.send('GET', remote_path, (200, 206), headers=headers, context=True)
+        try:
+            skip = start if r.status_code == 200 else 0
+            for chunk in r.iter_content(self.download_chunk_size):
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk[skip:], 0
+                f.write(chunk)
+        finally:
+            r.close()
+
+    def upload_bytes(self, data, remote_path):
+        """
+        *new in 0.7.12*
+        """
+        while True:
+            r = self.send('PUT', remote_path, (200, 201, 204, 400), data=data, \
+                retry_on_status_codes=(302, 413, 503, 504))
+            if r.status_code != 400:
+                # 400 Bad Request is Yandesk speciality
+                break
+
+    def download_bytes(self, remote_path):
+        """
+        *new in 0.7.12*
+        """
+        r = self.send('GET', remote_path, (200,), context=True)
+        try:
+            return r.content
+        finally:
+            r.close()
+
     @_emulate_infinity
     def ls(self, remote_path, recursive=False):
         if recursive:
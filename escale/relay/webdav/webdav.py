@@ -56,6 +56,12 @@ class WebDAV(Relay, Client):
         retry_after (int): defines interval time between retries in seconds.
             Applies to connection failures (deprecated).
 
+        etag_propagation (bool): if ``True``, the server is known to update the
+            change tokens of all the parent collections whenever a file changes
+            (e.g. Nextcloud, ownCloud), and :meth:`_listChanges` does not explore
+            unchanged collections.
+
+    *new in 0.7.12:* etag_propagation
     """
 
     __protocol__ = ['webdav', 'http', 'https']
@@ -63,7 +69,7 @@ class WebDAV(Relay, Client):
     def __init__(self, client, address, repository, username=None, password=None,
         protocol=None, certificate=None, certfile=None, keyfile=None, \
         ssl_version=None, verify_ssl=None, max_retry=None, retry_after=None, \
-        config={}, **super_args):
+        etag_propagation=False, config={}, **super_args):
         Relay.__init__(self, client, address, repository, **super_args)
         if PYTHON_VERSION == 3: # deal with encoding issues with requests
             username = username.encode('utf-8').decode('unicode-escape')
@@ -113,6 +119,8 @@ class WebDAV(Relay, Client):
         self._used_space = None
         #
         self.quota_error = (32,)
+        #
+        self.etag_propagation = etag_propagation
 
     def open(self):
         # request credential
@@ -169,6 +177,50 @@ class WebDAV(Relay, Client):
         #print(('WebDAV._list: remote_dir, files', remote_dir, [ f[0] for f in files ]))
         return files
 
+    def _listChanges(self, tokens):
+        """
+        Change tokens are the entity tags of the collections, or their last
+        modification times if the server does not report entity tags.
+
+        A token covers the entries of the collection itself, but not necessarily
+        the content of its subcollections. As a consequence, all the collections
+        are explored and only those which token has changed are listed again.
+        If `etag_propagation` is ``True``, unchanged collections are not explored
+        further.
+        """
+        new_tokens, listings, unchanged = {'': None}, {}, set()
+        directories = [('', True)]
+        while directories:
+            remote_dir, changed = directories.pop()
+            files = []
+            for entry in self.ls(remote_dir):
+                if entry.contenttype:
+                    if changed:
+                        files.append((entry.name,
+                            time.strptime(entry.mtime[5:], '%d %b %Y %H:%M:%S GMT')))
+                else:
+                    token = entry.etag or entry.mtime or None
+                    new_tokens[entry.name] = token
+                    if token is not None and tokens.get(entry.name) == token:
+                        if self.etag_propagation:
+                            unchanged.add(entry.name)
+                        else:
+                            directories.append((entry.name, False))
+                    else:
+                        directories.append((entry.name, True))
+            if changed:
+                listings[remote_dir] = files
+        # carry over the tokens of the subdirectories in unchanged collections
+        for dirname, token in tokens.items():
+            if dirname in new_tokens:
+                continue
+            parent = dirname
+            while parent not in new_tokens:
+                parent = parent.rpartition('/')[0]
+            if parent in unchanged:
+                new_tokens[dirname] = token
+        return new_tokens, listings
+
     def _wait_on_error(self, func, *args, **kwargs):
         error_codes = kwargs.pop('error_codes', [423]+timeout_error_codes)
         clock = None
@@ -214,6 +266,38 @@ class WebDAV(Relay, Client):
                 os.makedirs(local_dir)
         self._wait_on_error(self.download, remote_file, local_file)
 
+    def _push_bytes(self, data, remote_file, makedirs=True):
+        if makedirs:
+            remote_dir = os.path.dirname(remote_file)
+            self.mkdirs(remote_dir)
+        try:
+            self.upload_bytes(data, remote_file)
+        except OSError as e:
+            if e.args and e.args[0] in self.quota_error:
+                raise QuotaExceeded
+            raise
+
+    def _get_bytes(self, remote_file):
+        return self._wait_on_error(self.download_bytes, remote_file)
+
+    def _pushPart(self, local_file, offset, size, remote_file, makedirs=True):
+        if makedirs:
+            remote_dir = os.path.dirname(remote_file)
+            self.mkdirs(remote_dir)
+        try:
+            self.upload(local_file, remote_file, offset, size)
+        except OSError as e:
+            if e.args and e.args[0] in self.quota_error:
+                raise QuotaExceeded
+            raise
+
+    def _getPart(self, remote_file, local_file, offset):
+        self._wait_on_error(self.download, remote_file, local_file, offset)
+
+    def _getRange(self, remote_file, f, offset):
+        # no retry here; an interrupted range is resumed from the last checkpoint
+        self.download_range(remote_file, f, offset)
+
     def unlink(self, remote_file):
         #print('deleting {}'.format(remote_file)) # debug
         # `Relay.delete` and `Client.delete` conflict together
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Access attributes modified concurrently by the client and ``escalectl access``.
+"""
+
+
+import pytest
+from escale.manager.access import AccessAttributes
+from escale.manager.state import StateStore, SQLiteAccessAttributes
+
+
+class Racy(object):
+    """
+    Run `race` when the persistent table is checked for the `n`-th time.
+    """
+    race, n = None, 0
+
+    def _signature(self):
+        if self.race is not None:
+            self.n -= 1
+            if self.n == 0:
+                race, self.race = self.race, None
+                race()
+        return super(Racy, self)._signature()
+
+
+class RacyAccessAttributes(Racy, AccessAttributes):
+    pass
+
+
+class RacySQLiteAccessAttributes(Racy, SQLiteAccessAttributes):
+    pass
+
+
+def _dbm(tmpdir):
+    location = str(tmpdir.join('am'))
+    return RacyAccessAttributes(location), AccessAttributes(location)
+
+
+def _sqlite(tmpdir):
+    location = str(tmpdir.join('st.sqlite'))
+    return RacySQLiteAccessAttributes(StateStore(location)), \
+        SQLiteAccessAttributes(StateStore(location))
+
+
+@pytest.mark.parametrize('make', [_dbm, _sqlite])
+def test_external_changes(tmpdir, make):
+    client, ctl = make(tmpdir)
+    client.setReadable('a')
+    assert ctl.getReadability('a') is True
+    ctl.setNotReadable('a')
+    assert client.getReadability('a') is False
+
+
+@pytest.mark.parametrize('make', [_dbm, _sqlite])
+def test_change_while_writing(tmpdir, make):
+    client, ctl = make(tmpdir)
+    client.setReadable('a')
+    # `escalectl access` writes after the client has written and before
+    # the client checks the persistent table again
+    client.race, client.n = lambda: ctl.setNotWritable('b'), 2
+    client.setReadable('c')
+    assert client.race is None
+    assert client.getWritability('b') is False
+    assert client.getReadability('c') is True
+    assert ctl.getReadability('c') is True
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Block signatures in the checksum caches.
+"""
+
+
+from escale.manager.cache import ChecksumCache
+from escale.manager.state import StateStore, SQLiteChecksumCache
+
+
+def test_sqlite_signatures(tmpdir):
+    store = StateStore(str(tmpdir.join('st.sqlite')))
+    cache = SQLiteChecksumCache(store)
+    assert cache.getSignature('a') is None
+    cache.setSignature('a', b'\x00signature')
+    assert cache.getSignature('a') == b'\x00signature'
+    cache.setSignature('a', None)
+    assert cache.getSignature('a') is None
+    cache.setSignature('b', b'other')
+    store.close()
+    # no separate signature file
+    assert not [ f for f in tmpdir.listdir() if f.basename.endswith('.signatures') ]
+    store = StateStore(str(tmpdir.join('st.sqlite')))
+    assert SQLiteChecksumCache(store).getSignature('b') == b'other'
+
+
+def test_migrate_signatures(tmpdir):
+    path = str(tmpdir.join('cs'))
+    cache = ChecksumCache(path)
+    cache['a'] = (1, 'checksum')
+    cache.flush()
+    cache.setSignature('a', b'signature')
+    store = StateStore(str(tmpdir.join('st.sqlite')))
+    assert store.migrate(checksums=path)
+    cache = SQLiteChecksumCache(store)
+    assert cache['a'] == (1, 'checksum')
+    assert cache.getSignature('a') == b'signature'
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Early rejection of the deltas.
+"""
+
+
+import os
+from escale.encryption.encryption import Plain
+from escale.manager.delta import Signature, make_delta, apply_delta
+
+
+block_size = 1024
+
+
+def make(tmpdir, base, content, **kwargs):
+    old, new = str(tmpdir.join('old')), str(tmpdir.join('new'))
+    delta, patched = str(tmpdir.join('delta')), str(tmpdir.join('patched'))
+    with open(old, 'wb') as f:
+        f.write(base)
+    with open(new, 'wb') as f:
+        f.write(content)
+    signature = Signature.compute(old, 'checksum', block_size)
+    if not make_delta(signature, new, Plain(), delta, **kwargs):
+        return False
+    apply_delta(old, delta, Plain(), patched)
+    with open(patched, 'rb') as f:
+        assert f.read() == content
+    return True
+
+
+def test_shifted_content(tmpdir):
+    base = os.urandom(100 * block_size)
+    assert make(tmpdir, base, b'abc' + base)
+    assert make(tmpdir, base, base[:5000] + b'abc' + base[5000:])
+
+
+def test_probe(tmpdir):
+    base = os.urandom(100 * block_size)
+    content = os.urandom(40 * block_size + 3) + base
+    # no block is found at a block boundary and no match within the first blocks
+    assert not make(tmpdir, base, content, probe_blocks=16)
+    assert make(tmpdir, base, content, probe_blocks=64)
+    assert not make(tmpdir, base, os.urandom(len(base)))
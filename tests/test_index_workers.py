@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Index-based synchronization with pages processed concurrently by transfer workers.
+"""
+
+
+import os
+import time
+import logging
+import pytest
+from escale.relay import by_protocol
+from escale.manager.index import IndexManager
+from escale.manager.access import AccessController
+
+
+def _client(name, path, relay_dir, index, **kwargs):
+    manager = IndexManager(by_protocol('file', index=index),
+        repository=AccessController(name, path=path),
+        address=relay_dir, directory='rep', clientname=name.upper(),
+        logger=logging.getLogger(name), checksum_cache={}, config={},
+        transferworkers=3, **kwargs)
+    manager.relay.open()
+    return manager
+
+
+def _files(path):
+    return sorted([ os.path.relpath(os.path.join(d, f), path)
+        for d, _, fs in os.walk(path) for f in fs ])
+
+
+def _sync(pusher, puller):
+    pusher.remoteListing()
+    pusher.upload()
+    puller.remoteListing()
+    puller.download()
+
+
+@pytest.mark.parametrize('index', [True, 'topdir', 'hash:4'])
+def test_index_workers(tmpdir, index):
+    a, b, relay_dir = [ str(tmpdir.mkdir(d)) for d in ('a', 'b', 'relay') ]
+    os.makedirs(os.path.join(relay_dir, 'rep'))
+    for d in ('sub', 'sub2'):
+        os.makedirs(os.path.join(a, d))
+    for i in range(30):
+        with open(os.path.join(a, ('sub', 'sub2', '')[i % 3], 'f%d.txt' % i), 'w') as f:
+            f.write('x' * (i + 1))
+    pusher = _client('a', a, relay_dir, index)
+    puller = _client('b', b, relay_dir, index, count=1)
+    try:
+        assert pusher.transfer_pool is not None
+        # hash-based pages are split over several rounds
+        for _ in range(4):
+            _sync(pusher, puller)
+            # update timestamps have a resolution of one second
+            time.sleep(1.1)
+        assert _files(b) == _files(a)
+        with open(os.path.join(a, 'sub2', 'f1.txt'), 'w') as f:
+            f.write('modified')
+        _sync(pusher, puller)
+        for f in _files(a):
+            with open(os.path.join(a, f)) as fa, open(os.path.join(b, f)) as fb:
+                assert fa.read() == fb.read(), f
+    finally:
+        for manager in (pusher, puller):
+            if manager.transfer_pool is not None:
+                manager.transfer_pool.close()
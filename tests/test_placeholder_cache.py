@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Persistence of the placeholder cache.
+"""
+
+
+import time
+import pytest
+from escale.relay import placeholder
+from escale.relay.info import Metadata
+from escale.relay.placeholder import PlaceholderCache
+
+
+def test_failed_flush(tmpdir, monkeypatch):
+    location = str(tmpdir.join('ph'))
+    cache = PlaceholderCache(location)
+    cache.load()
+    mtime = time.gmtime()
+    cache['a'] = (mtime, Metadata(target='a', pusher='A'))
+    def fail(*args):
+        raise IOError('disk full')
+    monkeypatch.setattr(placeholder.dbm, 'open', fail)
+    with pytest.raises(IOError):
+        cache.flush()
+    assert cache.dirty == set(['a'])
+    monkeypatch.undo()
+    cache.flush()
+    assert not cache.dirty
+    reloaded = PlaceholderCache(location)
+    reloaded.load()
+    assert reloaded['a'][1].pusher == 'A'
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Placeholder presence is read from the listing cache.
+"""
+
+
+import os
+import time
+from escale.relay.localmount import LocalMount
+
+
+def test_get_metadata_from_listing(tmpdir, monkeypatch):
+    relay_dir = str(tmpdir.mkdir('relay'))
+    os.makedirs(os.path.join(relay_dir, 'rep', 'sub'))
+    local_file = str(tmpdir.join('f.txt'))
+    with open(local_file, 'w') as f:
+        f.write('content')
+    relay = LocalMount('A', relay_dir, 'rep')
+    relay.open()
+    assert relay.push(local_file, 'sub/f.txt', last_modified=int(time.time()))
+    relay.remoteListing()
+    def round_trip(*args, **kwargs):
+        raise AssertionError('unexpected remote listing')
+    monkeypatch.setattr(relay, 'hasPlaceholder', round_trip)
+    monkeypatch.setattr(relay, 'exists', round_trip)
+    meta = relay.getMetadata('sub/f.txt')
+    assert meta is not None and meta.pusher == 'A'
+    assert relay.getMetadata('sub/g.txt') is None
+    # with no listing, the relay is asked
+    monkeypatch.undo()
+    relay.listing_cache = None
+    assert relay.getMetadata('sub/f.txt') is not None
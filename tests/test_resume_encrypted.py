@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Interrupted uploads of encrypted files are resumed.
+"""
+
+
+import os
+import time
+import logging
+from escale.encryption.encryption import Cipher
+from escale.manager.manager import Manager
+from escale.manager.access import AccessController
+from escale.relay.localmount import LocalMount
+
+
+class SaltedCipher(Cipher):
+    """
+    The encrypted content differs on every encryption, as with Fernet or Blowfish.
+    """
+    def _encrypt(self, data):
+        salt = bytearray(os.urandom(1))
+        return bytes(salt + bytearray(b ^ salt[0] for b in bytearray(data)))
+
+    def _decrypt(self, data):
+        data = bytearray(data)
+        return bytes(bytearray(b ^ data[0] for b in data[1:]))
+
+
+def manager(tmpdir, name):
+    repository = str(tmpdir.mkdir(name))
+    return Manager(LocalMount, repository=AccessController(name, path=repository),
+        clientname=name, address=str(tmpdir.join('relay')), directory='rep',
+        encryption=SaltedCipher(None), partsize=(1000, None), count=1,
+        resumabletransfers=str(tmpdir.join(name + '.tj')), checksum_cache={},
+        logger=logging.getLogger(name)), repository
+
+
+def test_resume_encrypted_upload(tmpdir, monkeypatch):
+    os.makedirs(str(tmpdir.join('relay', 'rep')))
+    pusher, a = manager(tmpdir, 'A')
+    puller, b = manager(tmpdir, 'B')
+    data = os.urandom(3500)
+    with open(os.path.join(a, 'f'), 'wb') as f:
+        f.write(data)
+    push_part = LocalMount._pushPart
+    sent = []
+    def interrupted(relay, local_file, offset, *args):
+        if len(sent) == 3:
+            raise IOError('interrupted')
+        sent.append(offset)
+        push_part(relay, local_file, offset, *args)
+    monkeypatch.setattr(LocalMount, '_pushPart', interrupted)
+    pusher.remoteListing()
+    try:
+        pusher.upload()
+    except IOError:
+        pass
+    assert sent == [0, 1000, 2000]
+    monkeypatch.undo()
+    # restart
+    pusher.remoteListing()
+    pusher.sanityChecks()
+    del sent[:]
+    def counted(relay, local_file, offset, *args):
+        sent.append(offset)
+        push_part(relay, local_file, offset, *args)
+    monkeypatch.setattr(LocalMount, '_pushPart', counted)
+    pusher.remoteListing()
+    assert pusher.upload()
+    # the first part is sent again, as it is deleted on recovery
+    assert sent == [0, 3000]
+    assert not os.listdir(str(tmpdir.join('A.tj.partial')))
+    puller.remoteListing()
+    assert puller.download()
+    with open(os.path.join(b, 'f'), 'rb') as f:
+        assert f.read() == data
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Split files and delta files are stored under hidden names only.
+"""
+
+
+import os
+import time
+from escale.relay.localmount import LocalMount
+
+
+def relay_files(relay_dir):
+    return sorted(os.listdir(os.path.join(relay_dir, 'rep')))
+
+
+def make_file(tmpdir, name, size):
+    local_file = str(tmpdir.join(name))
+    with open(local_file, 'wb') as f:
+        f.write(os.urandom(size))
+    return local_file
+
+
+def test_split_file(tmpdir):
+    relay_dir = str(tmpdir.mkdir('relay'))
+    os.makedirs(os.path.join(relay_dir, 'rep'))
+    pusher = LocalMount('A', relay_dir, 'rep', part_size=1000)
+    puller = LocalMount('B', relay_dir, 'rep', part_size=1000)
+    local_file = make_file(tmpdir, 'f', 2500)
+    assert pusher.push(local_file, 'f', last_modified=int(time.time()))
+    # clients that do not support split files find no regular file to download
+    assert relay_files(relay_dir) == ['.f.part0', '.f.part1', '.f.part2', '.f.placeholder']
+    puller.remoteListing()
+    assert puller.listReady() == ['f']
+    dest = str(tmpdir.join('g'))
+    assert puller.pop('f', dest)
+    with open(local_file, 'rb') as f, open(dest, 'rb') as g:
+        assert f.read() == g.read()
+    assert relay_files(relay_dir) == ['.f.placeholder']
+
+
+def test_stale_content(tmpdir):
+    relay_dir = str(tmpdir.mkdir('relay'))
+    os.makedirs(os.path.join(relay_dir, 'rep'))
+    pusher = LocalMount('A', relay_dir, 'rep', part_size=1000)
+    t = int(time.time())
+    # a pending regular file is replaced by a split file
+    assert pusher.push(make_file(tmpdir, 'small', 500), 'f', last_modified=t)
+    pusher.remoteListing()
+    assert pusher.push(make_file(tmpdir, 'large', 1500), 'f', last_modified=t + 1)
+    assert relay_files(relay_dir) == ['.f.part0', '.f.part1', '.f.placeholder']
+    # and the other way round, as the previous version is known
+    pusher.remoteListing()
+    pusher.listTransferred()
+    assert pusher.getMetadata('f').parts == 2
+    assert pusher.push(make_file(tmpdir, 'small2', 500), 'f', last_modified=t + 2)
+    assert relay_files(relay_dir) == ['.f.placeholder', 'f']
+
+
+def test_delta_file(tmpdir):
+    relay_dir = str(tmpdir.mkdir('relay'))
+    os.makedirs(os.path.join(relay_dir, 'rep'))
+    pusher = LocalMount('A', relay_dir, 'rep')
+    puller = LocalMount('B', relay_dir, 'rep')
+    t = int(time.time())
+    assert pusher.push(make_file(tmpdir, 'v1', 500), 'f', last_modified=t, checksum='v1')
+    pusher.remoteListing()
+    delta_file = make_file(tmpdir, 'delta', 100)
+    assert pusher.push(delta_file, 'f', last_modified=t + 1, checksum='v2', delta='v1')
+    # the pending regular file is replaced, and clients that do not support deltas
+    # find no regular file to download
+    assert relay_files(relay_dir) == ['.f.delta', '.f.placeholder']
+    puller.remoteListing()
+    assert puller.listReady() == ['f']
+    assert puller.getMetadata('f').delta == 'v1'
+    dest = str(tmpdir.join('g'))
+    assert puller.pop('f', dest)
+    with open(delta_file, 'rb') as f, open(dest, 'rb') as g:
+        assert f.read() == g.read()
+    assert relay_files(relay_dir) == ['.f.placeholder']
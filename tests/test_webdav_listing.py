@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Incremental listing of WebDAV servers that do or do not propagate entity tags.
+"""
+
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('OpenSSL')
+
+from escale.relay.webdav.client import File
+from escale.relay.webdav.webdav import WebDAV
+
+
+mtime = 'Mon, 16 Oct 2017 10:00:00 GMT'
+
+
+def directory(name, etag):
+    return File(name, 0, mtime, mtime, '', etag)
+
+
+def regular_file(name):
+    return File(name, 1, mtime, mtime, 'application/octet-stream', '')
+
+
+class Server(object):
+    """
+    Collections as in depth-1 PROPFIND responses; entity tags are not propagated.
+    """
+    def __init__(self):
+        self.etags = {'a': '1', 'a/b': '1'}
+        self.files = {'': [], 'a': [], 'a/b': ['a/b/f']}
+
+    def ls(self, remote_dir, recursive=False):
+        entries = [ regular_file(f) for f in self.files[remote_dir] ]
+        for d, etag in self.etags.items():
+            if d.rpartition('/')[0] == remote_dir:
+                entries.append(directory(d, etag))
+        return entries
+
+
+def webdav(etag_propagation):
+    relay = WebDAV('A', 'example.org', 'rep', username='u', password='p',
+        protocol='https', etag_propagation=etag_propagation)
+    server = Server()
+    relay.ls = server.ls
+    return relay, server
+
+
+def test_changes_below_unchanged_collections():
+    relay, server = webdav(False)
+    tokens, listings = relay._listChanges({})
+    assert sorted(listings) == ['', 'a', 'a/b']
+    server.files['a/b'].append('a/b/.g.lock')
+    server.etags['a/b'] = '2'
+    tokens, listings = relay._listChanges(tokens)
+    assert sorted(listings) == ['', 'a/b']
+    assert [ f for f, _ in listings['a/b'] ] == ['a/b/f', 'a/b/.g.lock']
+
+
+def test_etag_propagation():
+    relay, server = webdav(True)
+    tokens, _ = relay._listChanges({})
+    server.etags['a/b'] = '2'
+    tokens, listings = relay._listChanges(tokens)
+    # the server failed to propagate the change to 'a'
+    assert sorted(listings) == ['']
+    assert tokens['a/b'] == '1'